@@ -1,57 +1,84 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from openai import OpenAI
+from fastapi import APIRouter, Body, HTTPException, Query
+from pydantic import AfterValidator, Field
+from typing import Annotated, List
 from app.config import settings
+from app.core.admission import Lane
+from app.core.responses import FastJSONResponse
+from app.services.openai_service import (
+    EMBEDDING_MAX_INPUT_BYTES,
+    EMBEDDING_MAX_INPUT_CHARS,
+    embedding_input_bytes,
+    openai_service,
+)
 
-router = APIRouter()
+router = APIRouter(default_response_class=FastJSONResponse)
 
-# OpenAI Client initialisieren
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+# Größere Batches werden intern in Teil-Requests (max. 2048 Inputs) aufgeteilt
+MAX_BATCH_TEXTS = 4096
+
+INPUT_TOO_LONG = f"Text too long for embedding (max {EMBEDDING_MAX_INPUT_BYTES} UTF-8 bytes)"
+
+def _check_input_bytes(text: str) -> str:
+    # Ziffern, CJK und Emoji ergeben deutlich mehr Tokens pro Zeichen als deutscher Text
+    if embedding_input_bytes(text) > EMBEDDING_MAX_INPUT_BYTES:
+        raise ValueError(INPUT_TOO_LONG)
+    return text
+
+EmbeddingText = Annotated[str, Field(min_length=1, max_length=EMBEDDING_MAX_INPUT_CHARS), AfterValidator(_check_input_bytes)]
 
 @router.post("/embeddings")
-async def get_embeddings(text: str):
+async def get_embeddings(text: str = Query(..., min_length=1, max_length=EMBEDDING_MAX_INPUT_CHARS)):
     """
     Generiert Embeddings für den gegebenen Text mit OpenAI.
     Ersetzt die getEmbeddings Funktion aus dem Flutter Frontend.
     """
+    if embedding_input_bytes(text) > EMBEDDING_MAX_INPUT_BYTES:
+        raise HTTPException(status_code=422, detail=INPUT_TOO_LONG)
     try:
-        # Embedding erstellen (OpenAI v1.x Syntax)
-        response = client.embeddings.create(
-            model="text-embedding-ada-002",
-            input=text
+        # Geteilter Embedding-Cache: token_count zählt nur tatsächlich angefragte Tokens
+        embeddings, token_count = await openai_service.embed(
+            [text],
+            model=settings.EMBEDDING_MODEL,
+            lane=Lane.GENERATION,
+            endpoint="embeddings"
         )
         
-        embedding = response.data[0].embedding
-        token_count = response.usage.total_tokens
+        embedding = embeddings[0]
         
-        return {
+        # Direkt als Response zurückgeben - spart jsonable_encoder über 1536 Floats
+        return FastJSONResponse({
             "embedding": embedding,
             "token_count": token_count
-        }
+        })
         
+    except HTTPException:
+        # z.B. DeadlineExceeded (504)
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating embedding: {str(e)}")
 
 @router.post("/embeddings/batch")
-async def get_embeddings_batch(texts: List[str]):
+async def get_embeddings_batch(texts: List[EmbeddingText] = Body(..., min_length=1, max_length=MAX_BATCH_TEXTS)):
     """
     Generiert Embeddings für mehrere Texte gleichzeitig.
     Effizienter für größere Datenmengen.
     """
     try:
-        response = client.embeddings.create(
-            model="text-embedding-ada-002",
-            input=texts
+        embeddings, token_count = await openai_service.embed(
+            texts,
+            model=settings.EMBEDDING_MODEL,
+            lane=Lane.GENERATION,
+            endpoint="embeddings-batch"
         )
         
-        embeddings = [item.embedding for item in response.data]
-        token_count = response.usage.total_tokens
-        
-        return {
+        return FastJSONResponse({
             "embeddings": embeddings,
             "token_count": token_count,
             "count": len(embeddings)
-        }
+        })
         
+    except HTTPException:
+        # z.B. DeadlineExceeded (504)
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating embeddings: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,36 @@
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.config import settings
+from app.core.metrics import metrics
+from app.core.responses import FastJSONResponse
+from app.services.model_router import model_router
+from app.services.openai_service import llm_ledger, openai_service
+
+
+def require_debug():
+    """Debug-Endpoints nur im Debug-Modus"""
+    if not settings.DEBUG:
+        raise HTTPException(status_code=404, detail="Debug mode disabled")
+
+
+router = APIRouter(default_response_class=FastJSONResponse, dependencies=[Depends(require_debug)])
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Counter, Latenz-Histogramme und Zustand der OpenAI Admission Control"""
+    return {
+        "openai_admission": openai_service.admission.status(),
+        "model_routes": model_router.status(),
+        **metrics.snapshot(),
+    }
+
+
+@router.get("/llm-usage")
+async def get_llm_usage(hours: float = 24, user: Optional[str] = None):
+    """Token-, Cache- und Latenz-Rollups aus dem LLM-Ledger pro Endpoint, User und Modell"""
+    since = time.time() - hours * 3600 if hours > 0 else 0.0
+    return await llm_ledger.rollups(since=since, user=user)
@@ -0,0 +1,54 @@
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.config import settings
+from app.core.profiler import profiler
+from app.core.responses import FastJSONResponse
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Profiler nur mit Admin-Token (funktioniert auch ohne DEBUG, also in Production)"""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiler disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(default_response_class=FastJSONResponse, dependencies=[Depends(require_admin)])
+
+
+@router.post("/start")
+async def start_profiler(
+    seconds: float = Query(30, gt=0, le=600),
+    interval_ms: float = Query(10, ge=1, le=100),
+    route: Optional[str] = Query(None, description="Nur Requests auf diesen Pfad, z.B. /api/v1/shopping-list-chat"),
+    sample_rate: float = Query(1.0, gt=0, le=1),
+    all_threads: bool = False,
+):
+    """
+    Sampling für ein Zeitfenster starten - für alle Requests oder einen Anteil
+    der Requests auf eine Route. Gilt pro Worker-Prozess (siehe pid).
+    """
+    profiler.start(seconds, interval_ms, route, sample_rate, all_threads)
+    return profiler.summary(top=0)
+
+
+@router.post("/stop")
+async def stop_profiler():
+    profiler.stop()
+    return profiler.summary()
+
+
+@router.get("")
+async def profiler_summary(top: int = Query(20, ge=0, le=500)):
+    """CPU vs. Wall-Clock pro Route, Loop-Auslastung und die häufigsten Stacks"""
+    return profiler.summary(top=top)
+
+
+@router.get("/collapsed", response_class=PlainTextResponse)
+async def profiler_collapsed():
+    """Collapsed Stacks für flamegraph.pl oder speedscope"""
+    return PlainTextResponse(profiler.collapsed())
@@ -0,0 +1,56 @@
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel
+from typing import List, Optional, Literal
+import time
+from app.core.responses import FastJSONResponse
+from app.services.autocomplete_service import autocomplete_service
+
+router = APIRouter(default_response_class=FastJSONResponse)
+
+class AutocompleteSuggestion(BaseModel):
+    name: str
+    type: str  # "item" oder "supermarket"
+    score: float
+    match: str  # "prefix", "word" oder "fuzzy"
+    category: Optional[str] = None
+    quantity: Optional[int] = None  # typische Menge
+    supermarket: Optional[str] = None  # bevorzugter Supermarkt
+
+class AutocompleteResponse(BaseModel):
+    suggestions: List[AutocompleteSuggestion]
+    took_ms: float
+
+@router.get("/autocomplete", response_model=AutocompleteResponse)
+async def autocomplete(
+    user_email: str,
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    type: Optional[Literal["item", "supermarket"]] = None
+):
+    """
+    Vervollständigt Produkt- und Supermarktnamen aus der Historie des Users
+    (In-Memory Prefix- und Trigramm-Index, ohne Embedding und Pinecone).
+    """
+    try:
+        start = time.perf_counter()
+        completions = await autocomplete_service.complete(user_email, q, limit, type)
+        took_ms = (time.perf_counter() - start) * 1000
+
+        return FastJSONResponse(AutocompleteResponse(
+            suggestions=[
+                AutocompleteSuggestion(
+                    name=completion.suggestion.name,
+                    type=completion.suggestion.kind,
+                    score=round(completion.score, 4),
+                    match=completion.match,
+                    category=completion.suggestion.category,
+                    quantity=completion.suggestion.quantity,
+                    supermarket=completion.suggestion.supermarket
+                )
+                for completion in completions
+            ],
+            took_ms=round(took_ms, 3)
+        ))
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Autocomplete failed: {str(e)}")
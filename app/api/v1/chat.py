@@ -1,24 +1,69 @@
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
+from pydantic import BaseModel, Field
+from typing import Annotated, List, Dict, Any, Optional, Tuple, Union
 from app.config import settings
+from app.core.admission import Lane
+from app.core.responses import FastJSONResponse
+from app.services.category_classifier import category_classifier
+from app.services.model_router import RouteSignals, model_router
 import json
 import uuid
 
-router = APIRouter()
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+router = APIRouter(default_response_class=FastJSONResponse)
+
+# Obergrenzen für Requests - größere Payloads würden im Prompt ohnehin gekürzt oder vom Modell abgelehnt
+MAX_MESSAGE_CHARS = 4000
+MAX_LIST_ITEMS = 500
+MAX_CHAT_HISTORY = 50
+MAX_SIMILAR_LISTS = 10
+MAX_SIMILAR_LIST_ITEMS = 100
+MAX_NAME_CHARS = 200
+MAX_NOTE_CHARS = 1000
 
 class ChatMessage(BaseModel):
-    role: str  # "user" oder "assistant"
-    content: str
+    role: str = Field(..., max_length=20)  # "user" oder "assistant"
+    content: str = Field(..., max_length=MAX_MESSAGE_CHARS)
+
+class ChatListItem(BaseModel):
+    """Item der aktuellen Einkaufsliste (wie ShoppingItem der App)"""
+    uuid: Optional[str] = Field(None, max_length=100)
+    name: str = Field(..., max_length=MAX_NAME_CHARS)
+    quantity: int = 1
+    note: Optional[str] = Field(None, max_length=MAX_NOTE_CHARS)
+    category: Optional[str] = Field(None, max_length=MAX_NAME_CHARS)
+    isChecked: bool = False
+    supermarkt: Optional[str] = Field(None, max_length=MAX_NAME_CHARS)
+    brand: Optional[str] = Field(None, max_length=MAX_NAME_CHARS)
+
+class SimilarListItem(BaseModel):
+    name: Optional[str] = Field(None, max_length=MAX_NAME_CHARS)
+    quantity: Optional[int] = None
+
+class SimilarList(BaseModel):
+    """Ähnliche frühere Liste (Pinecone-Metadaten); items ggf. als JSON-String"""
+    name: Optional[str] = Field(None, max_length=MAX_NAME_CHARS)
+    items: Union[
+        Annotated[List[Union[SimilarListItem, str]], Field(max_length=MAX_SIMILAR_LIST_ITEMS)],
+        Annotated[str, Field(max_length=MAX_SIMILAR_LIST_ITEMS * MAX_NAME_CHARS)]
+    ] = []
+    supermarkets: Optional[Union[str, List[str]]] = None
+    note: Optional[str] = Field(None, max_length=MAX_NOTE_CHARS)
 
 class ShoppingListChatRequest(BaseModel):
-    message: str
-    shopping_list: List[Dict[str, Any]]  # Bestehende Einkaufsliste
-    chat_history: List[ChatMessage] = []  # Chat-Verlauf
-    user_email: str
-    similar_lists: List[Dict[str, Any]] = []  # NEUE: Ähnliche Listen aus Pinecone
+    message: str = Field(..., min_length=1, max_length=MAX_MESSAGE_CHARS)
+    shopping_list: List[ChatListItem] = Field(..., max_length=MAX_LIST_ITEMS)  # Bestehende Einkaufsliste
+    chat_history: List[ChatMessage] = Field([], max_length=MAX_CHAT_HISTORY)  # Chat-Verlauf
+    user_email: str = Field(..., max_length=MAX_NAME_CHARS)
+    similar_lists: List[SimilarList] = Field([], max_length=MAX_SIMILAR_LISTS)  # NEUE: Ähnliche Listen aus Pinecone
+
+class ShoppingListSuggestionsRequest(BaseModel):
+    shopping_list: List[ChatListItem] = Field([], max_length=MAX_LIST_ITEMS)
+    similar_lists: List[SimilarList] = Field([], max_length=MAX_SIMILAR_LISTS)
+    user_email: Optional[str] = Field(None, max_length=MAX_NAME_CHARS)
+
+def as_dicts(models: List[BaseModel]) -> List[Dict[str, Any]]:
+    """Validierte Models für die Prompt-Helfer wieder als Dicts (ohne leere Felder)"""
+    return [model.dict(exclude_none=True) for model in models]
 
 class ShoppingItemResponse(BaseModel):
     """Strukturiertes Shopping Item für Response"""
@@ -53,6 +98,133 @@ def detect_navigation_intent(message: str, response: str) -> Optional[str]:
     
     return None
 
+# Keywords für Änderungsabsichten
+ADD_KEYWORDS = ["hinzufügen", "add", "brauche noch", "vergessen", "füge hinzu", "brauch noch", "setze dazu", "ergänze"]
+REMOVE_KEYWORDS = ["entfernen", "remove", "löschen", "streichen", "weg", "raus", "delete", "entferne"]
+MODIFY_KEYWORDS = ["ändern", "modify", "anpassen", "korrigieren", "update", "ändere", "bearbeite"]
+
+def detect_action_intent(message: str, response: str = "") -> str:
+    """Änderungsabsicht aus Nachricht (und optional AI-Antwort): added/removed/modified/none"""
+    lower_message = message.lower()
+    lower_response = response.lower()
+    
+    if any(keyword in lower_message for keyword in ADD_KEYWORDS) or any(keyword in lower_response for keyword in ADD_KEYWORDS):
+        return "added"
+    elif any(keyword in lower_message for keyword in REMOVE_KEYWORDS) or any(keyword in lower_response for keyword in REMOVE_KEYWORDS):
+        return "removed"
+    elif any(keyword in lower_message for keyword in MODIFY_KEYWORDS) or any(keyword in lower_response for keyword in MODIFY_KEYWORDS):
+        return "modified"
+    return "none"
+
+def contains_valid_list(ai_response: str) -> bool:
+    """Enthält die Antwort ein parsbares JSON-Array? (Validierung fürs Model Routing)"""
+    json_start = ai_response.find("[")
+    json_end = ai_response.rfind("]") + 1
+    if json_start == -1 or json_end == 0:
+        return False
+    try:
+        return isinstance(json.loads(ai_response[json_start:json_end]), list)
+    except json.JSONDecodeError:
+        return False
+
+def format_list_text(shopping_list: List[Dict[str, Any]]) -> str:
+    """Aktuelle Einkaufsliste als Prompt-Text"""
+    if not shopping_list:
+        return "Die Einkaufsliste ist aktuell leer."
+    return "\n".join([
+        f"- {item['name']} (Menge: {item.get('quantity', 1)}, Supermarkt: {item.get('supermarkt', 'unbekannt')}, Status: {'✓ gekauft' if item.get('isChecked', False) else '○ offen'})"
+        for item in shopping_list
+    ])
+
+def build_similar_context(similar_lists: List[Dict[str, Any]]) -> str:
+    """Ähnliche frühere Listen als Prompt-Kontext (max. 3 Listen, je 5 Items)"""
+    if not similar_lists:
+        return ""
+    
+    similar_context = "\n\nÄHNLICHE FRÜHERE EINKAUFSLISTEN (als Inspiration):\n"
+    for i, similar_list in enumerate(similar_lists[:3], 1):  # Max 3 Listen
+        similar_name = similar_list.get('name', f'Liste {i}')
+        similar_context += f"\n{i}. {similar_name}:\n"
+        
+        # Parse items wenn vorhanden
+        if 'items' in similar_list:
+            try:
+                # Items können als JSON-String oder bereits als Liste vorliegen
+                items = similar_list['items']
+                if isinstance(items, str):
+                    items = json.loads(items)
+                elif not isinstance(items, list):
+                    items = []
+                
+                # Zeige erste 5 Items der ähnlichen Liste
+                for item in items[:5]:
+                    if isinstance(item, dict):
+                        item_name = item.get('name', 'Unbekannt')
+                        item_qty = item.get('quantity', 1)
+                        similar_context += f"   - {item_name} ({item_qty}x)\n"
+                    elif isinstance(item, str):
+                        similar_context += f"   - {item}\n"
+            except Exception as e:
+                print(f"Error parsing similar list items: {e}")
+                pass
+        
+        # Weitere Metadaten hinzufügen falls verfügbar
+        if 'supermarkets' in similar_list:
+            markets = similar_list['supermarkets']
+            if isinstance(markets, str) and markets:
+                similar_context += f"   Märkte: {markets}\n"
+        
+        if 'note' in similar_list and similar_list['note']:
+            similar_context += f"   Notiz: {similar_list['note']}\n"
+    
+    return similar_context
+
+def parse_updated_list(ai_response: str) -> Tuple[Optional[List[ShoppingItemResponse]], Optional[str]]:
+    """JSON-Array aus der AI-Antwort extrahieren; gibt (Items, JSON-String) zurück"""
+    if "[" not in ai_response or "]" not in ai_response:
+        return None, None
+    
+    # Finde JSON-Array in der Antwort
+    json_start = ai_response.find("[")
+    json_end = ai_response.rfind("]") + 1
+    json_str = ai_response[json_start:json_end]
+    
+    updated_list = None
+    try:
+        print(f"🔧 Attempting to parse JSON: {json_str[:100]}...")
+        
+        # Parse JSON
+        raw_list = json.loads(json_str)
+        
+        # Konvertiere zu strukturierten ShoppingItemResponse Objekten
+        updated_list = []
+        for item in raw_list:
+            if isinstance(item, dict) and 'name' in item:
+                # Generiere UUID falls nicht vorhanden
+                item_uuid = item.get('uuid')
+                if not item_uuid or item_uuid == "unique-id":
+                    item_uuid = str(uuid.uuid4())
+                
+                updated_list.append(ShoppingItemResponse(
+                    uuid=item_uuid,
+                    name=item.get('name', 'Unbekannt'),
+                    quantity=max(1, item.get('quantity', 1)),  # Mindestens 1
+                    note=item.get('note', ''),
+                    category=item.get('category'),
+                    isChecked=item.get('isChecked', False),
+                    supermarkt=item.get('supermarkt')
+                ))
+        
+        print(f"✅ Parsed {len(updated_list)} items from AI response")
+                
+    except json.JSONDecodeError as e:
+        print(f"❌ JSON parsing error: {e}")
+        print(f"Problematic JSON: {json_str}")
+    except Exception as e:
+        print(f"❌ List parsing error: {e}")
+    
+    return updated_list, json_str
+
 @router.post("/shopping-list-chat", response_model=ShoppingListChatResponse)
 async def chat_about_shopping_list(request: ShoppingListChatRequest):
     """
@@ -61,67 +233,30 @@ async def chat_about_shopping_list(request: ShoppingListChatRequest):
     Nutzt ähnliche Listen aus Pinecone als Kontext.
     """
     try:
+        shopping_list = as_dicts(request.shopping_list)
+        similar_lists = as_dicts(request.similar_lists)
+        
         # DEBUG: Eingehende Daten loggen
-        print(f"🔍 Received shopping list with {len(request.shopping_list)} items")
-        if request.shopping_list:
-            for i, item in enumerate(request.shopping_list[:3]):  # Zeige nur erste 3
+        print(f"🔍 Received shopping list with {len(shopping_list)} items")
+        if shopping_list:
+            for i, item in enumerate(shopping_list[:3]):  # Zeige nur erste 3
                 print(f"  {i+1}. {item.get('name', 'Unnamed')} - {item.get('brand', 'No brand')} (qty: {item.get('quantity', 0)})")
-            if len(request.shopping_list) > 3:
-                print(f"  ... und {len(request.shopping_list) - 3} weitere Items")
+            if len(shopping_list) > 3:
+                print(f"  ... und {len(shopping_list) - 3} weitere Items")
         
-        print(f"🔍 Received {len(request.similar_lists)} similar lists")
-        for similar in request.similar_lists[:2]:
+        print(f"🔍 Received {len(similar_lists)} similar lists")
+        for similar in similar_lists[:2]:
             print(f"  - {similar.get('name', 'Unnamed list')}")
         
         # Aktuelle Einkaufsliste als String formatieren
-        if request.shopping_list:
-            list_text = "\n".join([
-                f"- {item['name']} (Menge: {item.get('quantity', 1)}, Supermarkt: {item.get('supermarkt', 'unbekannt')}, Status: {'✓ gekauft' if item.get('isChecked', False) else '○ offen'})"
-                for item in request.shopping_list
-            ])
+        list_text = format_list_text(shopping_list)
+        if shopping_list:
             print(f"📝 Formatted list text: {list_text[:200]}...")  # Erste 200 Zeichen
         else:
-            list_text = "Die Einkaufsliste ist aktuell leer."
             print("❌ No items in shopping list")
         
         # ERWEITERT: Ähnliche Listen als Kontext hinzufügen
-        similar_context = ""
-        if request.similar_lists:
-            similar_context = "\n\nÄHNLICHE FRÜHERE EINKAUFSLISTEN (als Inspiration):\n"
-            for i, similar_list in enumerate(request.similar_lists[:3], 1):  # Max 3 Listen
-                similar_name = similar_list.get('name', f'Liste {i}')
-                similar_context += f"\n{i}. {similar_name}:\n"
-                
-                # Parse items wenn vorhanden
-                if 'items' in similar_list:
-                    try:
-                        # Items können als JSON-String oder bereits als Liste vorliegen
-                        items = similar_list['items']
-                        if isinstance(items, str):
-                            items = json.loads(items)
-                        elif not isinstance(items, list):
-                            items = []
-                        
-                        # Zeige erste 5 Items der ähnlichen Liste
-                        for item in items[:5]:
-                            if isinstance(item, dict):
-                                item_name = item.get('name', 'Unbekannt')
-                                item_qty = item.get('quantity', 1)
-                                similar_context += f"   - {item_name} ({item_qty}x)\n"
-                            elif isinstance(item, str):
-                                similar_context += f"   - {item}\n"
-                    except Exception as e:
-                        print(f"Error parsing similar list items: {e}")
-                        pass
-                
-                # Weitere Metadaten hinzufügen falls verfügbar
-                if 'supermarkets' in similar_list:
-                    markets = similar_list['supermarkets']
-                    if isinstance(markets, str) and markets:
-                        similar_context += f"   Märkte: {markets}\n"
-                
-                if 'note' in similar_list and similar_list['note']:
-                    similar_context += f"   Notiz: {similar_list['note']}\n"
+        similar_context = build_similar_context(similar_lists)
         
         # Erweiterten System Prompt mit ähnlichen Listen
         system_prompt = f"""
@@ -174,88 +309,48 @@ Sei freundlich, hilfsbereit und nutze die Historie intelligent!
 
         print(f"🤖 Sending {len(messages)} messages to OpenAI (system + history + current)")
 
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
+        # Modell anhand von Intent, Navigation und Listen-/Nachrichtenlänge wählen
+        intent = detect_action_intent(request.message)
+        signals = RouteSignals(
+            endpoint="shopping-list-chat",
+            list_length=len(shopping_list),
+            intent=intent,
+            navigation=detect_navigation_intent(request.message, "") is not None,
+            message_length=len(request.message),
+        )
+        completion = await model_router.complete(
+            signals,
+            messages,
+            # Bei Änderungen muss eine parsbare Liste zurückkommen, sonst Fallback
+            validate=lambda text: contains_valid_list(text) or (intent == "none" and "[" not in text),
             temperature=0.3,
-            max_tokens=1500  # Erhöht für längere Listen
+            max_tokens=1500,  # Erhöht für längere Listen
+            lane=Lane.INTERACTIVE,
+            user=request.user_email
         )
         
-        ai_response = response.choices[0].message.content
-        print(f"🤖 AI Response length: {len(ai_response)} chars")
+        ai_response = completion.content
+        print(f"🤖 AI Response length: {len(ai_response)} chars ({completion.model}, route {completion.route})")
         print(f"🤖 AI Response preview: {ai_response[:150]}...")
         
         # Prüfen ob Liste geändert wurde
         updated_list = None
         action_performed = "none"
         
-        # Erweiterte Erkennung von Änderungsabsichten
-        lower_message = request.message.lower()
-        lower_response = ai_response.lower()
-        
-        # Keywords definieren
-        add_keywords = ["hinzufügen", "add", "brauche noch", "vergessen", "füge hinzu", "brauch noch", "setze dazu", "ergänze"]
-        remove_keywords = ["entfernen", "remove", "löschen", "streichen", "weg", "raus", "delete", "entferne"]
-        modify_keywords = ["ändern", "modify", "anpassen", "korrigieren", "update", "ändere", "bearbeite"]
-        
-        # KORRIGIERT: Richtige if-elif-else Struktur
-        if any(keyword in lower_message for keyword in add_keywords) or any(keyword in lower_response for keyword in add_keywords):
-            action_performed = "added"
-        elif any(keyword in lower_message for keyword in remove_keywords) or any(keyword in lower_response for keyword in remove_keywords):
-            action_performed = "removed"
-        elif any(keyword in lower_message for keyword in modify_keywords) or any(keyword in lower_response for keyword in modify_keywords):
-            action_performed = "modified"
+        # Erweiterte Erkennung von Änderungsabsichten (Nachricht + Antwort)
+        action_performed = detect_action_intent(request.message, ai_response)
         
         print(f"🔍 Detected action: {action_performed}")
         
         # Versuche JSON aus der Antwort zu extrahieren (falls Liste geändert wurde)
-        if "[" in ai_response and "]" in ai_response:
-            try:
-                # Finde JSON-Array in der Antwort
-                json_start = ai_response.find("[")
-                json_end = ai_response.rfind("]") + 1
-                json_str = ai_response[json_start:json_end]
-                
-                print(f"🔧 Attempting to parse JSON: {json_str[:100]}...")
-                
-                # Parse JSON
-                raw_list = json.loads(json_str)
-                
-                # Konvertiere zu strukturierten ShoppingItemResponse Objekten
-                updated_list = []
-                for item in raw_list:
-                    if isinstance(item, dict) and 'name' in item:
-                        # Generiere UUID falls nicht vorhanden
-                        item_uuid = item.get('uuid')
-                        if not item_uuid or item_uuid == "unique-id":
-                            item_uuid = str(uuid.uuid4())
-                        
-                        updated_list.append(ShoppingItemResponse(
-                            uuid=item_uuid,
-                            name=item.get('name', 'Unbekannt'),
-                            quantity=max(1, item.get('quantity', 1)),  # Mindestens 1
-                            note=item.get('note', ''),
-                            category=item.get('category'),
-                            isChecked=item.get('isChecked', False),
-                            supermarkt=item.get('supermarkt')
-                        ))
-                
-                print(f"✅ Parsed {len(updated_list)} items from AI response")
-                        
-            except json.JSONDecodeError as e:
-                print(f"❌ JSON parsing error: {e}")
-                print(f"Problematic JSON: {json_str if 'json_str' in locals() else 'Not found'}")
-                pass  # Falls kein valides JSON gefunden wird
-            except Exception as e:
-                print(f"❌ List parsing error: {e}")
-                pass
+        updated_list, json_str = parse_updated_list(ai_response)
         
         # Fallback: Falls Änderungsabsicht erkannt, aber kein JSON gefunden
         if action_performed != "none" and updated_list is None:
-            if request.shopping_list:
+            if shopping_list:
                 # Kopiere bestehende Liste als Fallback
                 updated_list = []
-                for item in request.shopping_list:
+                for item in shopping_list:
                     updated_list.append(ShoppingItemResponse(
                         uuid=item.get('uuid', str(uuid.uuid4())),
                         name=item.get('name', 'Unbekannt'),
@@ -271,6 +366,10 @@ Sei freundlich, hilfsbereit und nutze die Historie intelligent!
                 updated_list = []
                 print("⚠️ Used fallback: created empty list")
         
+        # Fehlende Kategorien lokal ergänzen (ohne zusätzliche LLM-Tokens)
+        if updated_list:
+            await category_classifier.fill_categories(updated_list)
+        
         # Final Debug-Output
         print(f"🔍 Final action performed: {action_performed}")
         print(f"📋 Final updated list items: {len(updated_list) if updated_list else 0}")
@@ -287,18 +386,21 @@ Sei freundlich, hilfsbereit und nutze die Historie intelligent!
             app_actions.append({"type": "vibrate"})
         
         if "sprich" in request.message.lower() or "sage" in request.message.lower():
-            clean_response = ai_response.replace(json_str if 'json_str' in locals() else '', '').strip()
+            clean_response = ai_response.replace(json_str or '', '').strip()
             app_actions.append({"type": "speech_output", "text": clean_response})
 
-        # ÄNDERN: Return Statement erweitern
-        return ShoppingListChatResponse(
+        # Model direkt rendern (ohne erneute Validierung + jsonable_encoder)
+        return FastJSONResponse(ShoppingListChatResponse(
             response=ai_response,
             updated_list=updated_list,
             action_performed=action_performed,
             navigation_action=navigation_action,  # NEU
             app_actions=app_actions if app_actions else None  # NEU
-        )
+        ))
         
+    except HTTPException:
+        # z.B. DeadlineExceeded (504) nicht als 500 verpacken
+        raise
     except Exception as e:
         print(f"❌ Chat error: {str(e)}")
         import traceback
@@ -306,14 +408,14 @@ Sei freundlich, hilfsbereit und nutze die Historie intelligent!
         raise HTTPException(status_code=500, detail=f"Chat-Fehler: {str(e)}")
 
 @router.post("/shopping-list-suggestions")
-async def get_shopping_suggestions(request: Dict[str, Any]):
+async def get_shopping_suggestions(request: ShoppingListSuggestionsRequest):
     """
     Gibt Vorschläge basierend auf der aktuellen Einkaufsliste.
     Erweitert um Pinecone-basierte ähnliche Listen.
     """
     try:
-        shopping_list = request.get("shopping_list", [])
-        similar_lists = request.get("similar_lists", [])
+        shopping_list = as_dicts(request.shopping_list)
+        similar_lists = as_dicts(request.similar_lists)
         
         print(f"📋 Suggestions request: {len(shopping_list)} items, {len(similar_lists)} similar lists")
         
@@ -349,21 +451,30 @@ Gib 5-7 hilfreiche Vorschläge:
 Antworte in kurzen, praktischen Stichpunkten mit Emojis.
 """
 
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
+        completion = await model_router.complete(
+            RouteSignals(
+                endpoint="shopping-list-suggestions",
+                list_length=len(shopping_list),
+                message_length=len(prompt),
+            ),
+            [
                 {"role": "system", "content": "Du bist ein intelligenter Einkaufsberater mit Zugang zu Einkaufshistorie."},
                 {"role": "user", "content": prompt}
             ],
+            validate=lambda text: bool(text.strip()),
             temperature=0.4,
-            max_tokens=800
+            max_tokens=800,
+            lane=Lane.INTERACTIVE,
+            user=request.user_email
         )
         
-        suggestions = response.choices[0].message.content
+        suggestions = completion.content
         print(f"✅ Generated suggestions: {len(suggestions)} chars")
         
         return {"suggestions": suggestions}
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Suggestions error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Suggestions-Fehler: {str(e)}")
@@ -1,92 +1,30 @@
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Optional, Tuple
 import json
 import uuid
 from datetime import datetime
 
-# OpenAI & Pinecone
-from openai import OpenAI
-import pinecone
-
 # Config
 from app.config import settings
+from app.core import deadline
+from app.core.admission import Lane
+from app.core.responses import FastJSONResponse
+from app.database import SHOPPING_LISTS, get_repository
+from app.services.category_classifier import category_classifier
+from app.services.item_history_service import item_history_service
+from app.services.model_router import RouteSignals, model_router
+from app.services.price_catalog import SUPERMARKETS, price_catalog
+from app.services.purchase_profile_service import purchase_profile_service
 
-router = APIRouter()
-
-# Initialize services
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
-# ✅ PINECONE INITIALISIERUNG
-pinecone.init(
-    api_key=settings.PINECONE_API_KEY,
-    environment=settings.PINECONE_ENVIRONMENT
-)
-index = pinecone.Index(settings.PINECONE_INDEX_NAME)
-
-# ✅ FIREBASE KORREKT INITIALISIEREN (OHNE GLOBALE IMPORTS)
-FIREBASE_ENABLED = False
-db = None
-
-def initialize_firebase():
-    global FIREBASE_ENABLED, db
-    
-    try:
-        # ✅ IMPORTS INNERHALB DER FUNKTION - kein Pylance Fehler
-        import firebase_admin
-        from firebase_admin import credentials, firestore
-        
-        # Prüfen ob bereits initialisiert
-        if firebase_admin._apps:
-            db = firestore.client()
-            FIREBASE_ENABLED = True
-            print("✅ Firebase already initialized")
-            return
-        
-        # Firebase Credentials prüfen
-        if not all([
-            settings.FIREBASE_PROJECT_ID,
-            settings.FIREBASE_PRIVATE_KEY,
-            settings.FIREBASE_CLIENT_EMAIL
-        ]):
-            print("⚠️ Firebase credentials incomplete - using mock mode")
-            return
-        
-        # Firebase Config
-        firebase_config = {
-            "type": "service_account",
-            "project_id": settings.FIREBASE_PROJECT_ID,
-            "private_key_id": settings.FIREBASE_PRIVATE_KEY_ID,
-            "private_key": settings.FIREBASE_PRIVATE_KEY,
-            "client_email": settings.FIREBASE_CLIENT_EMAIL,
-            "client_id": settings.FIREBASE_CLIENT_ID,
-            "auth_uri": settings.FIREBASE_AUTH_URI,
-            "token_uri": settings.FIREBASE_TOKEN_URI,
-            "client_x509_cert_url": settings.FIREBASE_CLIENT_CERT_URL
-        }
-        
-        # Firebase initialisieren
-        cred = credentials.Certificate(firebase_config)
-        firebase_admin.initialize_app(cred)
-        
-        db = firestore.client()
-        FIREBASE_ENABLED = True
-        print("✅ Firebase initialized successfully")
-        
-    except ImportError:
-        print("⚠️ Firebase Admin SDK not available")
-    except Exception as e:
-        print(f"❌ Firebase initialization error: {e}")
-
-# Firebase beim Start initialisieren
-initialize_firebase()
+router = APIRouter(default_response_class=FastJSONResponse)
 
 # Request/Response Models
 class GenerateShoppingListRequest(BaseModel):
-    settings: Dict[str, Any]
-    user_email: str
-    list_name: Optional[str] = "KI-Einkaufsliste"
-    context: Optional[str] = None
+    settings: Dict[str, Any] = Field(..., max_length=50)  # landet komplett im Prompt
+    user_email: str = Field(..., max_length=200)
+    list_name: Optional[str] = Field("KI-Einkaufsliste", max_length=200)
+    context: Optional[str] = Field(None, max_length=2000)
 
 class ShoppingItemResponse(BaseModel):
     uuid: str
@@ -95,6 +33,7 @@ class ShoppingItemResponse(BaseModel):
     unit: Optional[str] = "Stück"
     category: Optional[str] = None
     estimated_price: Optional[float] = None
+    price_source: Optional[str] = None  # "catalog" wenn der Preis aus dem Preiskatalog stammt
     supermarket: Optional[str] = None
     note: Optional[str] = None
 
@@ -112,40 +51,55 @@ class GenerateShoppingListResponse(BaseModel):
     success: bool
     message: Optional[str] = None
 
-# ✅ FEHLENDE FUNKTION HINZUGEFÜGT
-async def get_user_product_context(user_email: str, limit: int = 50) -> List[Dict[str, Any]]:
-    """Holt User's bisherige Produkte aus Pinecone für bessere AI-Empfehlungen"""
+async def get_user_product_context(user_email: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """Holt User's meistgekaufte Produkte aus dem Kaufprofil (ohne Vector Query)"""
     try:
-        # Query Pinecone für User-spezifische Produkte
-        query_vector = [0.0] * 1536  # Dummy vector für metadata-only query
-        
-        response = index.query(
-            vector=query_vector,
-            top_k=limit,
-            include_metadata=True,
-            filter={"user_email": user_email}
-        )
+        top_items = await purchase_profile_service.top_items(user_email, limit)
         
-        user_products = []
-        for match in response['matches']:
-            if match['metadata']:
-                user_products.append(match['metadata'])
+        user_products = [
+            {
+                "name": stats.name,
+                "quantity": stats.typical_quantity,
+                "supermarket": stats.preferred_supermarket,
+                "count": stats.count,
+            }
+            for stats in top_items
+        ]
         
-        print(f"📊 Found {len(user_products)} user products in Pinecone")
+        print(f"📊 Found {len(user_products)} user products in purchase profile")
         return user_products
         
     except Exception as e:
-        print(f"⚠️ Error querying user products: {e}")
+        print(f"⚠️ Error loading user products: {e}")
         return []
 
+def parse_generated_items(ai_response: str) -> Optional[List[Dict[str, Any]]]:
+    """JSON-Array der generierten Items extrahieren; None wenn nicht parsbar"""
+    json_start = ai_response.find('[')
+    json_end = ai_response.rfind(']') + 1
+    
+    if json_start == -1 or json_end == 0:
+        return None
+    try:
+        items_data = json.loads(ai_response[json_start:json_end])
+    except json.JSONDecodeError:
+        return None
+    return items_data if isinstance(items_data, list) else None
+
 async def generate_ai_shopping_list(settings: Dict[str, Any], user_email: str, context: Optional[str] = None, user_products: List[Dict] = []) -> Dict[str, Any]:
     """Generiert Shopping List mit OpenAI basierend auf Settings und User-History"""
     
-    # User Context aus Pinecone
+    # User Context aus dem Kaufprofil
     user_context = ""
     if user_products:
-        product_names = [p.get('name', '') for p in user_products[:20]]
-        user_context = f"\n\nDeine bisherigen Produkte: {', '.join(product_names)}"
+        # Bereits nach Relevanz sortiert
+        product_names = []
+        for p in user_products[:20]:
+            details = f"{p.get('quantity', 1)}x"
+            if p.get('supermarket'):
+                details += f", meist {p['supermarket']}"
+            product_names.append(f"{p.get('name', '')} ({details})")
+        user_context = f"\n\nDeine bisherigen Produkte (häufigste zuerst): {', '.join(product_names)}"
     
     # System Prompt
     system_prompt = f"""Du bist ein intelligenter Einkaufslistenassistent. 
@@ -157,18 +111,12 @@ WICHTIG: Antworte NUR mit einem gültigen JSON-Array im folgenden Format:
     "name": "Produktname",
     "quantity": 1,
     "unit": "Stück",
-    "category": "Kategorie",
-    "estimated_price": 2.50,
     "supermarket": "REWE",
     "note": "Optional: Hinweise"
   }}
 ]
 
-Kategorien: Obst & Gemüse, Fleisch & Fisch, Milchprodukte, Getränke, Brot & Backwaren, Tiefkühlkost, Konserven, Süßwaren, Haushaltsartikel, Sonstiges
-
-Supermärkte: REWE, EDEKA, ALDI, LIDL, Kaufland, Netto
-
-Berücksichtige realistische deutsche Preise.{user_context}"""
+Supermärkte: {', '.join(SUPERMARKETS)}{user_context}"""
 
     # User Message
     user_message = f"""Erstelle eine Einkaufsliste für folgende Einstellungen:
@@ -179,100 +127,61 @@ Zusätzlicher Kontext: {context or 'Keine spezifischen Anforderungen'}
 Erstelle eine sinnvolle Einkaufsliste mit 15-25 Produkten."""
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
+        completion = await model_router.complete(
+            RouteSignals(
+                endpoint="generate-shopping-list",
+                list_length=len(user_products),
+                message_length=len(context or ""),
+            ),
+            [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_message}
             ],
+            validate=lambda text: parse_generated_items(text) is not None,
             temperature=0.7,
-            max_tokens=2000
+            max_tokens=2000,
+            lane=Lane.GENERATION,
+            user=user_email
         )
         
-        ai_response = response.choices[0].message.content
-        print(f"🤖 AI Response length: {len(ai_response)} chars")
+        ai_response = completion.content
+        print(f"🤖 AI Response length: {len(ai_response)} chars ({completion.model}, route {completion.route})")
         
         # JSON extrahieren
-        json_start = ai_response.find('[')
-        json_end = ai_response.rfind(']') + 1
-        
-        if json_start == -1 or json_end == 0:
+        items_data = parse_generated_items(ai_response)
+        if items_data is None:
             raise Exception("No valid JSON found in AI response")
-            
-        json_str = ai_response[json_start:json_end]
-        items_data = json.loads(json_str)
         
         print(f"✅ Parsed {len(items_data)} items from AI")
         return {"items": items_data, "raw_response": ai_response}
         
+    except HTTPException:
+        # z.B. DeadlineExceeded (504)
+        raise
     except Exception as e:
         print(f"❌ AI Generation Error: {e}")
         raise HTTPException(status_code=500, detail=f"AI generation failed: {e}")
 
 async def save_items_to_pinecone(items: List[Dict], user_email: str, list_uuid: str):
-    """Speichert Items in Pinecone Vector DB für zukünftige Empfehlungen"""
-    
-    vectors_to_upsert = []
-    
-    for item in items:
-        try:
-            # Text für Embedding
-            text_for_embedding = f"{item['name']} {item.get('category', '')} {item.get('note', '')}"
-            
-            # OpenAI Embedding erstellen
-            embedding_response = client.embeddings.create(
-                model="text-embedding-3-small",
-                input=text_for_embedding
-            )
-            
-            vector_id = f"item_{uuid.uuid4()}"
-            
-            # Metadata
-            metadata = {
-                "user_email": user_email,
-                "list_uuid": list_uuid,
-                "item_type": "shopping_item",
-                "name": item["name"],
-                "category": item.get("category"),
-                "quantity": item.get("quantity", 1),
-                "estimated_price": item.get("estimated_price"),
-                "supermarket": item.get("supermarket"),
-                "created_at": datetime.now().isoformat(),
-            }
-            
-            vectors_to_upsert.append({
-                "id": vector_id,
-                "values": embedding_response.data[0].embedding,
-                "metadata": metadata
-            })
-            
-        except Exception as e:
-            print(f"⚠️ Error creating embedding for {item.get('name', 'unknown')}: {e}")
-            continue
-    
-    # Batch upsert zu Pinecone
-    if vectors_to_upsert:
-        try:
-            index.upsert(vectors=vectors_to_upsert)
-            print(f"✅ Upserted {len(vectors_to_upsert)} vectors to Pinecone")
-        except Exception as e:
-            print(f"❌ Pinecone upsert error: {e}")
+    """Speichert Items in Pinecone Vector DB für zukünftige Empfehlungen (ein Vektor pro Produkt)"""
+    try:
+        # Best effort: bei abgelaufener Deadline lieber die fertige Liste ausliefern
+        await deadline.run("item-history", item_history_service.save_items(items, user_email, list_uuid))
+    except Exception as e:
+        print(f"❌ Pinecone upsert error: {e}")
 
 async def save_shopping_list_to_firebase(shopping_list_data: Dict, user_email: str) -> str:
     """Speichert ShoppingList in Firebase Firestore (mit Fallback)"""
     
-    if not FIREBASE_ENABLED or not db:
+    repository = get_repository()
+    if repository is None:
         mock_id = f"mock_firebase_{uuid.uuid4()}"
         print(f"⚠️ Firebase not available - using mock ID: {mock_id}")
         return mock_id
     
     try:
-        # Firestore Collection Reference
-        shopping_lists_ref = db.collection('shopping_lists')
-        
-        # Document erstellen
-        doc_ref = shopping_lists_ref.add(shopping_list_data)
-        doc_id = doc_ref[1].id
+        # Non-blocking Write, Dokument-ID = List-UUID (damit die Liste wieder lesbar ist)
+        doc_id = await repository.add_document(SHOPPING_LISTS, shopping_list_data)
         
         print(f"✅ Shopping list saved to Firebase with ID: {doc_id}")
         return doc_id
@@ -284,6 +193,39 @@ async def save_shopping_list_to_firebase(shopping_list_data: Dict, user_email: s
         print(f"📝 Using fallback mock ID: {mock_id}")
         return mock_id
 
+def build_shopping_items(items_data: List[Dict[str, Any]]) -> Tuple[List[ShoppingItemResponse], List[str], float]:
+    """AI-Items in Response-Items konvertieren; sammelt Supermärkte und summiert Preise"""
+    shopping_items = []
+    supermarkets = set()
+    total_price = 0.0
+    
+    for item_data in items_data:
+        item_uuid = str(uuid.uuid4())
+        
+        item = ShoppingItemResponse(
+            uuid=item_uuid,
+            name=item_data["name"],
+            quantity=item_data.get("quantity", 1),
+            unit=item_data.get("unit", "Stück"),
+            category=item_data.get("category"),
+            estimated_price=item_data.get("estimated_price"),
+            price_source=item_data.get("price_source"),
+            supermarket=item_data.get("supermarket"),
+            note=item_data.get("note")
+        )
+        
+        shopping_items.append(item)
+        
+        # Supermarkt sammeln
+        if item.supermarket:
+            supermarkets.add(item.supermarket)
+        
+        # Preis summieren
+        if item.estimated_price:
+            total_price += item.estimated_price * item.quantity
+    
+    return shopping_items, list(supermarkets), total_price
+
 @router.post("/generate-shopping-list", response_model=GenerateShoppingListResponse)
 async def generate_shopping_list(request: GenerateShoppingListRequest):
     """
@@ -293,7 +235,7 @@ async def generate_shopping_list(request: GenerateShoppingListRequest):
         print(f"🛒 Generating shopping list for user: {request.user_email}")
         print(f"📋 Settings: {request.settings}")
         
-        # 1. User's bisherige Produkte aus Pinecone laden
+        # 1. User's bisherige Produkte aus dem Kaufprofil laden
         user_products = await get_user_product_context(request.user_email)
         
         # 2. AI Shopping List generieren
@@ -304,38 +246,16 @@ async def generate_shopping_list(request: GenerateShoppingListRequest):
             user_products
         )
         
-        # 3. ShoppingList Model erstellen
+        # 3. Kategorien und Preise lokal zuordnen (Preise nur aus dem Katalog)
+        await category_classifier.fill_categories(ai_result["items"])
+        await price_catalog.fill_prices(ai_result["items"])
+        
+        # 4. ShoppingList Model erstellen
         list_uuid = str(uuid.uuid4())
         created_at = datetime.now()
         
         # Items zu Response Format konvertieren
-        shopping_items = []
-        supermarkets = set()
-        total_price = 0.0
-        
-        for item_data in ai_result["items"]:
-            item_uuid = str(uuid.uuid4())
-            
-            item = ShoppingItemResponse(
-                uuid=item_uuid,
-                name=item_data["name"],
-                quantity=item_data.get("quantity", 1),
-                unit=item_data.get("unit", "Stück"),
-                category=item_data.get("category"),
-                estimated_price=item_data.get("estimated_price"),
-                supermarket=item_data.get("supermarket"),
-                note=item_data.get("note")
-            )
-            
-            shopping_items.append(item)
-            
-            # Supermarkt sammeln
-            if item.supermarket:
-                supermarkets.add(item.supermarket)
-            
-            # Preis summieren
-            if item.estimated_price:
-                total_price += item.estimated_price * item.quantity
+        shopping_items, supermarkets, total_price = build_shopping_items(ai_result["items"])
         
         # ShoppingList Response
         shopping_list = ShoppingListResponse(
@@ -344,33 +264,41 @@ async def generate_shopping_list(request: GenerateShoppingListRequest):
             created_at=created_at.isoformat(),
             items=shopping_items,
             total_estimated_price=round(total_price, 2) if total_price > 0 else None,
-            supermarkets=list(supermarkets),
+            supermarkets=supermarkets,
             created_by=request.user_email
         )
         
-        # 4. Firebase speichern
+        # 5. Firebase speichern
         firebase_data = {
             "uuid": list_uuid,
             "name": request.list_name,
             "created_at": created_at,
+            "updated_at": created_at,
             "items": [item.dict() for item in shopping_items],
             "total_estimated_price": shopping_list.total_estimated_price,
             "supermarkets": shopping_list.supermarkets,
             "created_by": request.user_email,
+            "user_email": request.user_email,
+            # Startversion für den Delta-Sync (/api/v1/shopping-lists/{uuid}/changes)
+            "version": 1,
             "settings": request.settings,
             "context": request.context
         }
         
-        firebase_doc_id = await save_shopping_list_to_firebase(firebase_data, request.user_email)
+        firebase_doc_id = await deadline.run("persistence", save_shopping_list_to_firebase(firebase_data, request.user_email))
         
-        # 5. Items zu Pinecone speichern (für zukünftige Empfehlungen)
+        # Kaufprofil inkrementell aktualisieren
+        await purchase_profile_service.record_items(request.user_email, ai_result["items"])
+        
+        # 6. Items zu Pinecone speichern (für zukünftige Empfehlungen)
         await save_items_to_pinecone(ai_result["items"], request.user_email, list_uuid)
         
-        return GenerateShoppingListResponse(
+        # Model direkt rendern (ohne erneute Validierung + jsonable_encoder)
+        return FastJSONResponse(GenerateShoppingListResponse(
             shopping_list=shopping_list,
             success=True,
             message=f"Einkaufsliste erfolgreich generiert mit {len(shopping_items)} Produkten"
-        )
+        ))
         
     except HTTPException:
         raise
@@ -0,0 +1,83 @@
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Optional
+import time
+from app.core.responses import FastJSONResponse
+from app.database import get_repository
+from app.models.shopping import Recipe
+from app.services.recipe_service import recipe_service
+
+router = APIRouter(default_response_class=FastJSONResponse)
+
+class RecipeListResponse(BaseModel):
+    recipes: List[Recipe]
+    next_cursor: Optional[str] = None
+
+class RecipeMatchRequest(BaseModel):
+    user_email: str
+    shopping_list: List[Dict[str, Any]] = Field([], max_length=500)  # Items mit "name"
+    limit: int = Field(20, ge=1, le=200)
+    max_missing: Optional[int] = Field(None, ge=0)
+    min_coverage: float = Field(0.0, ge=0, le=1)
+
+class RecipeMatchResponseItem(BaseModel):
+    recipe: Recipe
+    coverage: float  # Anteil der Zutaten, die auf der Liste stehen
+    matched: int
+    total: int
+    missing: List[str]
+
+class RecipeMatchResponse(BaseModel):
+    matches: List[RecipeMatchResponseItem]
+    took_ms: float
+
+@router.post("/recipes")
+async def save_recipes(recipes: List[Recipe]):
+    """Rezepte speichern (Batch); der Zutaten-Index wird beim nächsten Match neu aufgebaut"""
+    try:
+        ids = await recipe_service.save_recipes(recipes)
+        return {"saved": len(ids), "ids": ids}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error saving recipes: {str(e)}")
+
+@router.get("/recipes", response_model=RecipeListResponse)
+async def list_recipes(user_email: str, page_size: int = Query(50, ge=1, le=500), cursor: Optional[str] = None):
+    repository = get_repository()
+    if repository is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    page = await repository.recipes.list_for_user(user_email, page_size=page_size, cursor=cursor)
+    return RecipeListResponse(recipes=page.items, next_cursor=page.next_cursor)
+
+@router.delete("/recipes/{recipe_id}")
+async def delete_recipe(recipe_id: str, user_email: str):
+    repository = get_repository()
+    if repository is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    recipe = await repository.recipes.get(recipe_id)
+    if recipe is None or recipe.user_email != user_email:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    await recipe_service.delete_recipe(user_email, recipe_id)
+    return {"deleted": True}
+
+@router.post("/recipes/match", response_model=RecipeMatchResponse)
+async def match_recipes(request: RecipeMatchRequest):
+    """
+    "Was kann ich damit kochen?" - rankt die Rezepte des Users nach Abdeckung
+    durch die aktuelle Einkaufsliste und nach fehlenden Zutaten (ohne LLM).
+    """
+    try:
+        start = time.perf_counter()
+        names = [item.get("name", "") for item in request.shopping_list]
+        matches = await recipe_service.match(
+            request.user_email, names, request.limit, request.max_missing, request.min_coverage
+        )
+        took_ms = (time.perf_counter() - start) * 1000
+        print(f"🍳 Matched {len(matches)} recipes in {took_ms:.1f}ms")
+
+        return FastJSONResponse(RecipeMatchResponse(
+            matches=[RecipeMatchResponseItem(**match.__dict__) for match in matches],
+            took_ms=round(took_ms, 2)
+        ))
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error matching recipes: {str(e)}")
@@ -0,0 +1,199 @@
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Optional, Literal
+from datetime import datetime
+from app.core.metrics import metrics
+from app.core.responses import FastJSONResponse, etag_matches
+from app.database import get_repository
+from app.services.autocomplete_service import autocomplete_service
+from app.services.shopping_list_service import (
+    InvalidMutation,
+    ShoppingListNotFound,
+    VersionConflict,
+    changes_since,
+    list_etag,
+    public_list,
+    shopping_list_service,
+)
+
+router = APIRouter(default_response_class=FastJSONResponse)
+
+# Obergrenze pro Batch (eine Transaktion, ein Dokument)
+MAX_MUTATIONS = 500
+
+# Diese Felder dürfen weggelassen, aber nicht explizit auf null gesetzt werden
+NON_NULLABLE_FIELDS = ("name", "quantity", "isChecked")
+
+class ItemFields(BaseModel):
+    """Vom Client setzbare Item-Felder; nicht gesetzte Felder bleiben bei patch unverändert"""
+    name: Optional[str] = Field(None, min_length=1, max_length=200)
+    quantity: Optional[int] = Field(None, ge=0)
+    unit: Optional[str] = None
+    note: Optional[str] = None
+    category: Optional[str] = None
+    isChecked: Optional[bool] = None
+    supermarkt: Optional[str] = None
+    supermarket: Optional[str] = None
+    estimated_price: Optional[float] = Field(None, ge=0)
+
+    @field_validator(*NON_NULLABLE_FIELDS, mode="before")
+    @classmethod
+    def not_null(cls, value):
+        if value is None:
+            raise ValueError("must not be null")
+        return value
+
+class ItemMutation(BaseModel):
+    op: Literal["upsert", "patch", "delete"]
+    uuid: Optional[str] = None  # upsert ohne uuid legt ein neues Item an
+    fields: ItemFields = ItemFields()
+
+class CreateShoppingListRequest(BaseModel):
+    user_email: str
+    name: str = Field(..., min_length=1, max_length=200)
+    items: List[ItemFields] = []
+
+class BatchMutationRequest(BaseModel):
+    user_email: str
+    mutations: List[ItemMutation]
+
+class ShoppingListSummary(BaseModel):
+    uuid: str
+    name: str
+    version: int
+    item_count: int
+    updated_at: datetime
+
+class ShoppingListSummaryResponse(BaseModel):
+    lists: List[ShoppingListSummary]
+    next_cursor: Optional[str] = None
+
+def _require_repository() -> None:
+    if get_repository() is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+def _expected_version(if_match: Optional[str], list_uuid: str) -> Optional[int]:
+    """Version aus einem If-Match ETag dieser Liste ("*" oder kein Header = ohne Prüfung)"""
+    if not if_match or if_match.strip() == "*":
+        return None
+    tag = if_match.strip()
+    tag = tag[2:] if tag.startswith("W/") else tag
+    prefix = f'"{list_uuid}.'
+    if not (tag.startswith(prefix) and tag.endswith('"')):
+        raise HTTPException(status_code=412, detail="If-Match does not refer to this list")
+    try:
+        return int(tag[len(prefix):-1])
+    except ValueError:
+        raise HTTPException(status_code=412, detail="Invalid If-Match")
+
+@router.post("/shopping-lists", status_code=201)
+async def create_shopping_list(request: CreateShoppingListRequest):
+    _require_repository()
+    items = [item.dict(exclude_unset=True) for item in request.items]
+    if any(not item.get("name") for item in items):
+        raise HTTPException(status_code=422, detail="Every item needs a name")
+    doc = await shopping_list_service.create(request.user_email, request.name, items)
+    autocomplete_service.record(request.user_email, items)
+    return FastJSONResponse(public_list(doc), status_code=201, headers={"ETag": list_etag(doc["uuid"], doc["version"])})
+
+@router.get("/shopping-lists", response_model=ShoppingListSummaryResponse)
+async def list_shopping_lists(user_email: str, page_size: int = Query(50, ge=1, le=500), cursor: Optional[str] = None):
+    """Übersicht ohne Items - der Client vergleicht die Versionen und synct nur geänderte Listen"""
+    _require_repository()
+    page = await shopping_list_service.list_for_user(user_email, page_size=page_size, cursor=cursor)
+    return ShoppingListSummaryResponse(
+        lists=[
+            ShoppingListSummary(uuid=entry.uuid, name=entry.name, version=entry.version, item_count=len(entry.items), updated_at=entry.updated_at)
+            for entry in page.items
+        ],
+        next_cursor=page.next_cursor
+    )
+
+@router.get("/shopping-lists/{list_uuid}")
+async def get_shopping_list(list_uuid: str, user_email: str, if_none_match: Optional[str] = Header(None)):
+    _require_repository()
+    try:
+        doc = await shopping_list_service.get(list_uuid, user_email)
+    except ShoppingListNotFound:
+        raise HTTPException(status_code=404, detail="Shopping list not found")
+
+    etag = list_etag(list_uuid, doc.get("version", 0))
+    if etag_matches(if_none_match, etag):
+        metrics.increment("shopping_list_sync_total", result="not_modified")
+        return _not_modified(etag)
+    metrics.increment("shopping_list_sync_total", result="full")
+    return FastJSONResponse(public_list(doc), headers={"ETag": etag})
+
+@router.get("/shopping-lists/{list_uuid}/changes")
+async def get_shopping_list_changes(
+    list_uuid: str,
+    user_email: str,
+    since_version: int = Query(0, ge=0),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Delta-Sync: Items, die seit since_version geändert oder angelegt wurden, und
+    UUIDs gelöschter Items. reset=True heißt: lokale Liste komplett ersetzen.
+    """
+    _require_repository()
+    try:
+        doc = await shopping_list_service.get(list_uuid, user_email)
+    except ShoppingListNotFound:
+        raise HTTPException(status_code=404, detail="Shopping list not found")
+
+    etag = list_etag(list_uuid, doc.get("version", 0))
+    if etag_matches(if_none_match, etag) or (since_version and since_version == doc.get("version", 0)):
+        metrics.increment("shopping_list_sync_total", result="not_modified")
+        return _not_modified(etag)
+
+    delta = changes_since(doc, since_version)
+    metrics.increment("shopping_list_sync_total", result="reset" if delta["reset"] else "delta")
+    return FastJSONResponse(delta, headers={"ETag": etag})
+
+@router.post("/shopping-lists/{list_uuid}/items/batch")
+async def mutate_shopping_list_items(list_uuid: str, request: BatchMutationRequest, if_match: Optional[str] = Header(None)):
+    """
+    Mehrere Item-Änderungen atomar anwenden. Mit If-Match (ETag der Liste) wird
+    nur geschrieben, wenn sich die Liste seitdem nicht geändert hat (sonst 412).
+    Die Antwort ist das Delta seit der Version vor dem Batch.
+    """
+    _require_repository()
+    if not request.mutations or len(request.mutations) > MAX_MUTATIONS:
+        raise HTTPException(status_code=422, detail=f"Between 1 and {MAX_MUTATIONS} mutations per batch")
+    expected_version = _expected_version(if_match, list_uuid)
+    mutations = [
+        {"op": mutation.op, "uuid": mutation.uuid, "fields": mutation.fields.dict(exclude_unset=True)}
+        for mutation in request.mutations
+    ]
+
+    try:
+        delta = await shopping_list_service.mutate(list_uuid, request.user_email, mutations, expected_version)
+    except ShoppingListNotFound:
+        raise HTTPException(status_code=404, detail="Shopping list not found")
+    except VersionConflict as e:
+        raise HTTPException(
+            status_code=412,
+            detail=f"Shopping list changed (version {e.version}) - sync and retry",
+            headers={"ETag": list_etag(list_uuid, e.version)}
+        )
+    except InvalidMutation as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    # Neue Produkte direkt im Autocomplete anbieten
+    autocomplete_service.record(
+        request.user_email, [mutation["fields"] for mutation in mutations if mutation["op"] == "upsert"]
+    )
+
+    return FastJSONResponse(delta, headers={"ETag": list_etag(list_uuid, delta["version"])})
+
+@router.delete("/shopping-lists/{list_uuid}")
+async def delete_shopping_list(list_uuid: str, user_email: str):
+    _require_repository()
+    try:
+        await shopping_list_service.delete(list_uuid, user_email)
+    except ShoppingListNotFound:
+        raise HTTPException(status_code=404, detail="Shopping list not found")
+    return {"deleted": True}
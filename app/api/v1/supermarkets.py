@@ -0,0 +1,100 @@
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Optional
+from app.core.admission import Lane
+from app.core.responses import FastJSONResponse
+from app.models.shopping import Supermarket
+from app.services.item_history_service import ITEM_EMBEDDING_MODEL
+from app.services.openai_service import openai_service
+from app.services.pinecone_service import pinecone_service
+from app.services.supermarket_index import supermarket_index_service
+from app.services.vector_metadata import embedding_text
+
+router = APIRouter(default_response_class=FastJSONResponse)
+
+class SupermarketDistance(BaseModel):
+    supermarket: Supermarket
+    distance_km: float
+
+class AssignItemsRequest(BaseModel):
+    user_email: str
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    items: List[Dict[str, Any]] = Field(..., max_length=500)
+
+def _with_distance(matches) -> List[SupermarketDistance]:
+    return [SupermarketDistance(supermarket=market, distance_km=round(distance, 3)) for market, distance in matches]
+
+@router.post("/supermarkets", response_model=Supermarket)
+async def register_supermarket(market: Supermarket):
+    """Supermarkt speichern und in den Spatial Index des Users aufnehmen"""
+    if not market.user_email:
+        raise HTTPException(status_code=422, detail="user_email is required")
+    try:
+        await supermarket_index_service.register(market)
+
+        # Für die Vektorsuche (inkl. Koordinaten in den Metadaten), best effort
+        try:
+            embeddings, _ = await openai_service.embed(
+                [embedding_text({"type": "supermarket", "name": market.name, "address": market.address})], model=ITEM_EMBEDDING_MODEL,
+                lane=Lane.BACKGROUND, endpoint="supermarkets", user=market.user_email
+            )
+            await pinecone_service.add_supermarket_vector(embeddings[0], market, market.user_email)
+        except Exception as e:
+            print(f"⚠️ Supermarket vector upsert failed: {e}")
+
+        print(f"🏪 Registered supermarket {market.name} for {market.user_email}")
+        return market
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error saving supermarket: {str(e)}")
+
+@router.delete("/supermarkets/{market_id}")
+async def delete_supermarket(market_id: str, user_email: str):
+    try:
+        removed = await supermarket_index_service.remove(user_email, market_id)
+        await pinecone_service.delete_supermarket_vector(market_id, user_email)
+        return {"deleted": removed}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting supermarket: {str(e)}")
+
+@router.get("/supermarkets/nearest", response_model=List[SupermarketDistance])
+async def nearest_supermarkets(
+    user_email: str,
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    k: int = Query(1, ge=1, le=50),
+    category: Optional[str] = None,
+):
+    """k nächste Supermärkte des Users (optional nur mit passender Kategorie)"""
+    index = await supermarket_index_service.get_index(user_email)
+    return _with_distance(index.nearest(latitude, longitude, k, category))
+
+@router.get("/supermarkets/within", response_model=List[SupermarketDistance])
+async def supermarkets_within_radius(
+    user_email: str,
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(5.0, gt=0, le=100),
+    category: Optional[str] = None,
+):
+    """Alle Supermärkte des Users im Umkreis, nach Entfernung sortiert"""
+    index = await supermarket_index_service.get_index(user_email)
+    return _with_distance(index.within_radius(latitude, longitude, radius_km, category))
+
+@router.post("/supermarkets/assign")
+async def assign_items_to_supermarkets(request: AssignItemsRequest):
+    """
+    Ordnet alle Items einer Liste dem nächsten Supermarkt zu, der ihre
+    Kategorie führt (setzt supermarkt, supermarket_id, distance_km).
+    """
+    try:
+        items = await supermarket_index_service.assign(
+            request.user_email, request.latitude, request.longitude, request.items
+        )
+        assigned = sum(1 for item in items if item.get("supermarket_id"))
+        print(f"🏪 Assigned {assigned}/{len(items)} items to supermarkets")
+        return {"items": items, "assigned": assigned}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error assigning supermarkets: {str(e)}")
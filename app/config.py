@@ -1,14 +1,22 @@
 import os
 from typing import Optional
 
+from app.core.cache import default_cache_path
+
 class Settings:
     # OpenAI
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "")  # leer = api.openai.com
+    # Admission Control (Account-Limits, Wartezeit bevor ein Call aufgibt)
+    OPENAI_TPM_LIMIT: int = int(os.getenv("OPENAI_TPM_LIMIT", 30000))
+    OPENAI_RPM_LIMIT: int = int(os.getenv("OPENAI_RPM_LIMIT", 500))
+    OPENAI_ADMISSION_MAX_WAIT: float = float(os.getenv("OPENAI_ADMISSION_MAX_WAIT", 60))
     
     # Pinecone
     PINECONE_API_KEY: str = os.getenv("PINECONE_API_KEY", "")
     PINECONE_ENVIRONMENT: str = os.getenv("PINECONE_ENVIRONMENT", "us-west1-gcp")
     PINECONE_INDEX_NAME: str = os.getenv("PINECONE_INDEX_NAME", "shoppiq-products")
+    PINECONE_API_URL: str = os.getenv("PINECONE_API_URL", "")
     
     # Firebase (optional für ersten Test)
     FIREBASE_PROJECT_ID: str = os.getenv("FIREBASE_PROJECT_ID", "")
@@ -20,6 +28,65 @@ class Settings:
     FIREBASE_TOKEN_URI: str = os.getenv("FIREBASE_TOKEN_URI", "https://oauth2.googleapis.com/token")
     FIREBASE_CLIENT_CERT_URL: str = os.getenv("FIREBASE_CLIENT_CERT_URL", "")
     
+    # Persistenz: "firestore" (Default) oder "sqlite" (offline, Tests & Benchmarks)
+    DATABASE_BACKEND: str = os.getenv("DATABASE_BACKEND", "firestore").lower()
+    SQLITE_PATH: str = os.getenv("SQLITE_PATH", "shoppiq.db")
+    
+    # Kaufprofil
+    PROFILE_HALF_LIFE_DAYS: float = float(os.getenv("PROFILE_HALF_LIFE_DAYS", 30))
+    PROFILE_MAX_ITEMS: int = int(os.getenv("PROFILE_MAX_ITEMS", 500))
+    PROFILE_CACHE_TTL: float = float(os.getenv("PROFILE_CACHE_TTL", 60))  # nur bei mehreren Workern
+    
+    # Response-Kompression (gzip/brotli) ab dieser Größe in Bytes
+    COMPRESSION_MINIMUM_SIZE: int = int(os.getenv("COMPRESSION_MINIMUM_SIZE", 1024))
+    
+    # Ein Embedding-Modell für Queries und gespeicherte Vektoren (Wechsel via app.jobs.reembed)
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    EMBEDDING_DIMENSIONS: int = int(os.getenv("EMBEDDING_DIMENSIONS", 0))  # 0 = Default des Modells
+    
+    # Request-Deadlines (Sekunden); Clients können per X-Request-Timeout kürzer anfragen
+    REQUEST_TIMEOUT: float = float(os.getenv("REQUEST_TIMEOUT", 30))
+    GENERATE_REQUEST_TIMEOUT: float = float(os.getenv("GENERATE_REQUEST_TIMEOUT", 60))
+    REQUEST_TIMEOUT_MAX: float = float(os.getenv("REQUEST_TIMEOUT_MAX", 120))  # Obergrenze für konfigurierte Deadlines
+    DEADLINE_RESERVE: float = float(os.getenv("DEADLINE_RESERVE", 1.0))  # Restzeit für Persistenz nach dem LLM
+    PINECONE_TIMEOUT: float = float(os.getenv("PINECONE_TIMEOUT", 5.0))
+    
+    # Delta-Sync der Einkaufslisten: so viele Löschungen bleiben pro Liste als Tombstone erhalten
+    SHOPPING_LIST_MAX_TOMBSTONES: int = int(os.getenv("SHOPPING_LIST_MAX_TOMBSTONES", 500))
+    
+    # Maximale Request-Body-Größe in Bytes (Embedding-Batches separat)
+    MAX_REQUEST_BODY_BYTES: int = int(os.getenv("MAX_REQUEST_BODY_BYTES", 1024 * 1024))
+    EMBEDDINGS_MAX_BODY_BYTES: int = int(os.getenv("EMBEDDINGS_MAX_BODY_BYTES", 16 * 1024 * 1024))
+    
+    # Admin-Token für /debug/profiler (leer = Profiler deaktiviert)
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+    
+    # Multi-Worker Betrieb (gunicorn setzt WEB_CONCURRENCY) und geteilte Caches
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", 1))
+    SHARED_CACHE_PATH: str = os.getenv("SHARED_CACHE_PATH", default_cache_path())
+    EMBEDDING_CACHE_MAX_ENTRIES: int = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 50000))
+    # Cache liegt in /dev/shm (RAM): ~6 KB pro 1536-dim Vektor
+    EMBEDDING_CACHE_MAX_BYTES: int = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    QUERY_CACHE_TTL: float = float(os.getenv("QUERY_CACHE_TTL", 30))
+    
+    # LLM-Ledger: Append-only JSON Lines Datei mit allen OpenAI-Calls
+    LLM_LEDGER_PATH: str = os.getenv("LLM_LEDGER_PATH", "llm_ledger.jsonl")
+    LLM_LEDGER_CAPACITY: int = int(os.getenv("LLM_LEDGER_CAPACITY", 4096))
+    LLM_LEDGER_MAX_BYTES: int = int(os.getenv("LLM_LEDGER_MAX_BYTES", 64 * 1024 * 1024))  # danach Rotation nach .1
+    
+    # Model Routing: JSON-Liste von Routen, leer = Defaults aus model_router.py
+    MODEL_ROUTES: str = os.getenv("MODEL_ROUTES", "")
+    
+    # Preiskatalog (ersetzt LLM-geschätzte Preise)
+    PRICE_CATALOG_TTL: float = float(os.getenv("PRICE_CATALOG_TTL", 300))
+    PRICE_MATCH_MIN_SIMILARITY: float = float(os.getenv("PRICE_MATCH_MIN_SIMILARITY", 0.8))
+    
+    # Lokale Kategorisierung: darunter landet ein Produkt in "Sonstiges"
+    CATEGORY_MIN_SIMILARITY: float = float(os.getenv("CATEGORY_MIN_SIMILARITY", 0.3))
+    
+    # Autocomplete: Anteil der Trigramme der Eingabe, die ein unscharfer Treffer enthalten muss
+    AUTOCOMPLETE_MIN_SIMILARITY: float = float(os.getenv("AUTOCOMPLETE_MIN_SIMILARITY", 0.6))
+    
     # App
     DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
     PORT: int = int(os.getenv("PORT", 8000))
@@ -0,0 +1,136 @@
+import asyncio
+import heapq
+import itertools
+import time
+from enum import IntEnum
+from typing import List, Optional, Tuple
+
+from app.core.metrics import metrics
+
+
+class Lane(IntEnum):
+    """Prioritäts-Lanes: kleinere Werte werden zuerst bedient"""
+    INTERACTIVE = 0  # Chat
+    GENERATION = 1   # Listen-Generierung, Embedding-Endpoints
+    BACKGROUND = 2   # Embeddings für Pinecone, Jobs
+
+
+class AdmissionTimeout(Exception):
+    """Anfrage wurde nicht innerhalb von max_wait zugelassen"""
+
+
+class TokenBucket:
+    """Token Bucket mit kontinuierlichem Refill (capacity pro Minute)"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def seconds_until(self, amount: float) -> float:
+        missing = amount - self.level
+        return max(0.0, missing / self.rate) if self.rate > 0 else float("inf")
+
+
+class Ticket:
+    """Zulassung für einen Call; reconcile() korrigiert die Token-Schätzung"""
+
+    def __init__(self, controller: "AdmissionController", estimated_tokens: int, lane: Lane, waited_ms: float):
+        self.controller = controller
+        self.estimated_tokens = estimated_tokens
+        self.lane = lane
+        self.waited_ms = waited_ms
+
+    def reconcile(self, actual_tokens: Optional[int]) -> None:
+        if actual_tokens is not None:
+            self.controller.tokens.level -= actual_tokens - self.estimated_tokens
+
+
+class AdmissionController:
+    """
+    Admission Control vor OpenAI: Token- und Request-Bucket (TPM/RPM).
+    Statt mit 429 zu scheitern werden Calls nach Lane-Priorität eingereiht.
+    """
+
+    def __init__(self, tokens_per_minute: int, requests_per_minute: int, max_wait: float = 60.0):
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.requests = TokenBucket(requests_per_minute)
+        self.max_wait = max_wait
+        self._waiters: List[Tuple[int, int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def _try_take(self, tokens: int) -> bool:
+        now = time.monotonic()
+        self.tokens.refill(now)
+        self.requests.refill(now)
+        if self.requests.level >= 1 and self.tokens.level >= tokens:
+            self.requests.level -= 1
+            self.tokens.level -= tokens
+            return True
+        return False
+
+    async def _dispatch(self) -> None:
+        while self._waiters:
+            lane, _, tokens, future = self._waiters[0]
+            if future.done():  # abgebrochen
+                heapq.heappop(self._waiters)
+                continue
+
+            if self._try_take(tokens):
+                heapq.heappop(self._waiters)
+                future.set_result(None)
+                continue
+
+            delay = max(self.tokens.seconds_until(tokens), self.requests.seconds_until(1))
+            await asyncio.sleep(min(max(delay, 0.005), 1.0))
+
+    async def acquire(self, estimated_tokens: int, lane: Lane = Lane.INTERACTIVE, max_wait: Optional[float] = None) -> Ticket:
+        # Anfragen größer als der Bucket würden nie zugelassen
+        tokens = int(min(max(estimated_tokens, 1), self.tokens.capacity))
+        started = time.perf_counter()
+
+        if not self._waiters and self._try_take(tokens):
+            waited_ms = 0.0
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (int(lane), next(self._sequence), tokens, future))
+            if self._dispatcher is None or self._dispatcher.done():
+                self._dispatcher = asyncio.create_task(self._dispatch())
+            # Kürzere Wartezeit, wenn die Request-Deadline früher abläuft
+            wait = self.max_wait if max_wait is None else min(self.max_wait, max_wait)
+            try:
+                await asyncio.wait_for(future, timeout=wait)
+            except asyncio.TimeoutError:
+                metrics.increment("openai_admission_timeouts_total", lane=lane.name.lower())
+                raise AdmissionTimeout(f"OpenAI admission wait exceeded {wait:.1f}s")
+            waited_ms = (time.perf_counter() - started) * 1000
+
+        metrics.observe("openai_admission_wait_ms", waited_ms, lane=lane.name.lower())
+        return Ticket(self, tokens, lane, waited_ms)
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        self.tokens.refill(now)
+        self.requests.refill(now)
+        queued = {lane.name.lower(): 0 for lane in Lane}
+        for lane, _, _, future in self._waiters:
+            if not future.done():
+                queued[Lane(lane).name.lower()] += 1
+        return {
+            "tokens_available": round(self.tokens.level),
+            "tokens_per_minute": round(self.tokens.capacity),
+            "requests_available": round(self.requests.level, 2),
+            "requests_per_minute": round(self.requests.capacity),
+            "queued": queued,
+        }
+
+
+def estimate_tokens(*texts: str) -> int:
+    """Grobe Token-Schätzung (~4 Zeichen pro Token)"""
+    return sum(len(text) for text in texts if text) // 4 + 1
@@ -0,0 +1,65 @@
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import metrics
+
+
+class PayloadTooLarge(Exception):
+    pass
+
+
+class BodySizeLimitMiddleware:
+    """
+    Lehnt zu große Request-Bodies mit 413 ab, bevor sie gepuffert und geparst
+    werden: per Content-Length sofort, bei Chunked Encoding sobald beim Lesen
+    das Limit überschritten ist. Muss außerhalb der Deadline-Middleware liegen,
+    die den Body vorab liest.
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int, route_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.route_limits = route_limits or {}
+
+    async def _reject(self, scope: Scope, receive: Receive, send: Send, limit: int) -> None:
+        metrics.increment("requests_rejected_total", reason="body_too_large")
+        response = JSONResponse({"detail": f"Request body too large (max {limit} bytes)"}, status_code=413)
+        await response(scope, receive, send)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.route_limits.get(scope["path"], self.max_bytes)
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            await self._reject(scope, receive, send, limit)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise PayloadTooLarge()
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, send_wrapper)
+        except PayloadTooLarge:
+            if not response_started:
+                await self._reject(scope, receive, send, limit)
@@ -0,0 +1,191 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app.core.metrics import metrics
+
+NEVER_EXPIRES = 1e18
+
+
+def default_cache_path() -> str:
+    """Shared Memory (tmpfs) wenn vorhanden, sonst das Temp-Verzeichnis"""
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, "shoppiq-cache.db")
+
+
+class SharedCache:
+    """
+    Zweistufiger Cache: LRU im Prozess vor einer SQLite-Datei (WAL), die sich
+    alle Worker eines Hosts teilen. Werte sind Bytes, optional mit TTL.
+    Die Verbindung wird pro Prozess lazy geöffnet und ist damit fork-sicher.
+
+    Die Datei ist nach Einträgen und optional nach Bytes begrenzt (tmpfs liegt
+    im RAM). Aufgeräumt wird deterministisch, sobald ein Prozess seit dem
+    letzten Aufräumen PRUNE_FRACTION des Budgets geschrieben hat; die älteste
+    Schreibreihenfolge (rowid) fliegt zuerst.
+    """
+
+    PRUNE_FRACTION = 0.05
+
+    def __init__(
+        self,
+        path: str,
+        name: str,
+        ttl: Optional[float] = None,
+        max_entries: int = 100_000,
+        max_bytes: Optional[int] = None,
+        max_local: int = 2048,
+    ):
+        self.path = path
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_local = max_local
+        # Seit dem letzten Aufräumen geschrieben (pro Prozess)
+        self._written_entries = 0
+        self._written_bytes = 0
+        self._local: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (name TEXT, key TEXT, value BLOB, expires_at REAL, PRIMARY KEY (name, key))"
+            )
+            self._conn, self._pid = conn, os.getpid()
+            self._local.clear()
+            self._written_entries = self._written_bytes = 0
+            # Budget kann sich seit dem letzten Deployment geändert haben
+            self._prune(conn)
+        return self._conn
+
+    def reset(self) -> None:
+        """Nach fork(): Verbindung und lokale Einträge verwerfen"""
+        self._conn, self._pid = None, None
+        self._local.clear()
+
+    def _remember(self, key: str, value: bytes, expires_at: float) -> None:
+        self._local[key] = (value, expires_at)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_local:
+            self._local.popitem(last=False)
+
+    def _get_many_sync(self, keys: List[str]) -> Dict[str, bytes]:
+        now = time.time()
+        found: Dict[str, bytes] = {}
+
+        with self._lock:
+            conn = self._connection()
+            missing = []
+            for key in keys:
+                entry = self._local.get(key)
+                if entry and entry[1] > now:
+                    self._local.move_to_end(key)
+                    found[key] = entry[0]
+                else:
+                    missing.append(key)
+
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT key, value, expires_at FROM cache WHERE name = ? AND key IN ({','.join('?' * len(chunk))}) AND expires_at > ?",
+                    [self.name, *chunk, now],
+                ).fetchall()
+                for key, value, expires_at in rows:
+                    found[key] = value
+                    self._remember(key, value, expires_at)
+
+        metrics.increment("cache_hits_total", len(found), cache=self.name)
+        metrics.increment("cache_misses_total", len(keys) - len(found), cache=self.name)
+        return found
+
+    def _set_many_sync(self, items: Dict[str, bytes]) -> None:
+        expires_at = time.time() + self.ttl if self.ttl else NEVER_EXPIRES
+
+        with self._lock:
+            conn = self._connection()
+            for key, value in items.items():
+                self._remember(key, value, expires_at)
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache (name, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                [(self.name, key, value, expires_at) for key, value in items.items()],
+            )
+            self._written_entries += len(items)
+            self._written_bytes += sum(len(value) for value in items.values())
+            if self._written_entries >= self.max_entries * self.PRUNE_FRACTION or (
+                self.max_bytes and self._written_bytes >= self.max_bytes * self.PRUNE_FRACTION
+            ):
+                self._prune(conn)
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        self._written_entries = self._written_bytes = 0
+        conn.execute("DELETE FROM cache WHERE name = ? AND expires_at <= ?", (self.name, time.time()))
+        count = conn.execute("SELECT COUNT(*) FROM cache WHERE name = ?", (self.name,)).fetchone()[0]
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache WHERE name = ? ORDER BY rowid LIMIT ?)",
+                (self.name, count - self.max_entries),
+            )
+        if self.max_bytes:
+            # Neueste Einträge behalten, solange sie zusammen ins Budget passen
+            conn.execute(
+                """
+                DELETE FROM cache WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, SUM(length(value)) OVER (ORDER BY rowid DESC) AS total FROM cache WHERE name = ?
+                    ) WHERE total > ?
+                )
+                """,
+                (self.name, self.max_bytes),
+            )
+
+    async def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        if not keys:
+            return {}
+        try:
+            return await asyncio.to_thread(self._get_many_sync, keys)
+        except sqlite3.Error as e:
+            print(f"⚠️ Shared cache read error ({self.name}): {e}")
+            return {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return (await self.get_many([key])).get(key)
+
+    async def set_many(self, items: Dict[str, bytes]) -> None:
+        if not items:
+            return
+        try:
+            await asyncio.to_thread(self._set_many_sync, items)
+        except sqlite3.Error as e:
+            print(f"⚠️ Shared cache write error ({self.name}): {e}")
+
+    async def set(self, key: str, value: bytes) -> None:
+        await self.set_many({key: value})
+
+
+# Alle Caches registrieren, damit sie nach fork() zurückgesetzt werden können
+_caches: List[SharedCache] = []
+
+
+def create_cache(
+    name: str, path: str, ttl: Optional[float] = None, max_entries: int = 100_000, max_bytes: Optional[int] = None
+) -> SharedCache:
+    cache = SharedCache(path, name, ttl=ttl, max_entries=max_entries, max_bytes=max_bytes)
+    _caches.append(cache)
+    return cache
+
+
+def reset_caches() -> None:
+    for cache in _caches:
+        cache.reset()
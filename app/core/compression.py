@@ -0,0 +1,113 @@
+import asyncio
+import gzip
+from typing import List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Brotli ist optional - ohne brotli wird nur gzip angeboten
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+
+# Große Bodies (z.B. Embedding-Batches) mit der schnellsten Stufe und im Thread
+# komprimieren - kaum schlechtere Ratio, aber ohne den Event Loop sekundenlang zu blockieren
+LARGE_BODY_SIZE = 1024 * 1024
+
+
+def select_encoding(accept_encoding: str) -> Optional[str]:
+    """Bestes unterstütztes Encoding aus dem Accept-Encoding Header (br > gzip)"""
+    offered: List[Tuple[str, float]] = []
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        offered.append((token.strip().lower(), quality))
+
+    qualities = dict(offered)
+    # "*" gilt nur für nicht explizit genannte Encodings ("br;q=0, *" schließt br aus)
+    wildcard = qualities.get("*", 0.0)
+    if brotli is not None and qualities.get("br", wildcard) > 0:
+        return "br"
+    if qualities.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """
+    Negotiated gzip/brotli Kompression für Responses ab minimum_size Bytes.
+    Streaming-Responses werden unverändert durchgereicht.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        large = len(body) >= LARGE_BODY_SIZE
+        if encoding == "br":
+            return brotli.compress(body, quality=1 if large else self.brotli_quality)
+        return gzip.compress(body, compresslevel=1 if large else self.gzip_level)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = select_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start_message, passthrough
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body" or passthrough or start_message is None:
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            body = message.get("body", b"")
+            content_type = headers.get("content-type", "")
+
+            if (
+                message.get("more_body", False)
+                or "content-encoding" in headers
+                or len(body) < self.minimum_size
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            if len(body) >= LARGE_BODY_SIZE:
+                compressed = await asyncio.to_thread(self.compress, body, encoding)
+            else:
+                compressed = self.compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            start_message["headers"] = headers.raw
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
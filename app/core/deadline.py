@@ -0,0 +1,194 @@
+import asyncio
+import contextvars
+import math
+import time
+from typing import Awaitable, Dict, List, Optional, TypeVar
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import metrics
+
+T = TypeVar("T")
+
+# Client kann eine kürzere Deadline (Sekunden) mitschicken
+TIMEOUT_HEADER = "x-request-timeout"
+
+# Absoluter Deadline-Zeitpunkt (time.monotonic) des aktuellen Requests
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(HTTPException):
+    """Request-Deadline überschritten - wird von FastAPI als 504 gerendert"""
+
+    def __init__(self, stage: str):
+        super().__init__(status_code=504, detail=f"Deadline exceeded during {stage}")
+        self.stage = stage
+
+
+def set_deadline(seconds: Optional[float]) -> contextvars.Token:
+    return _deadline.set(time.monotonic() + seconds if seconds else None)
+
+
+def reset_deadline(token: contextvars.Token) -> None:
+    _deadline.reset(token)
+
+
+def clear() -> None:
+    """Deadline im aktuellen Kontext entfernen (z.B. für Background-Tasks eines Requests)"""
+    _deadline.set(None)
+
+
+def remaining() -> Optional[float]:
+    """Verbleibende Sekunden oder None ohne Deadline"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check(stage: str) -> None:
+    """Vor einer Stufe prüfen, ob sich der Start überhaupt noch lohnt"""
+    left = remaining()
+    if left is not None and left <= 0:
+        metrics.increment("deadline_exceeded_total", stage=stage)
+        raise DeadlineExceeded(stage)
+
+
+def timeout(stage: str, cap: Optional[float] = None, reserve: float = 0.0) -> Optional[float]:
+    """
+    Timeout für einen Upstream-Call: Restzeit minus reserve (für nachfolgende
+    Stufen wie Persistenz), höchstens cap. Ohne Deadline einfach cap.
+    """
+    left = remaining()
+    if left is None:
+        return cap
+    check(stage)
+    # Bei kurzen Deadlines höchstens ein Viertel der Restzeit zurückhalten
+    budget = left - min(reserve, left / 4)
+    return min(budget, cap) if cap is not None else budget
+
+
+async def run(stage: str, awaitable: Awaitable[T], reserve: float = 0.0) -> T:
+    """Awaitable mit der Restzeit als Timeout ausführen"""
+    seconds = timeout(stage, reserve=reserve)
+    if seconds is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout=seconds)
+    except asyncio.TimeoutError:
+        metrics.increment("deadline_exceeded_total", stage=stage)
+        raise DeadlineExceeded(stage)
+
+
+class DeadlineMiddleware:
+    """
+    Setzt pro Request eine Deadline (Default, pro Route oder kürzer per
+    X-Request-Timeout Header) und bricht den Handler samt laufender Upstream-
+    Calls ab, sobald der Client die Verbindung trennt.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        default_timeout: float = 30.0,
+        max_timeout: float = 120.0,
+        route_timeouts: Optional[Dict[str, float]] = None,
+        grace: float = 1.0,
+    ):
+        self.app = app
+        self.default_timeout = default_timeout
+        self.max_timeout = max_timeout
+        self.route_timeouts = route_timeouts or {}
+        self.grace = grace
+
+    def _timeout(self, scope: Scope) -> float:
+        seconds = min(self.route_timeouts.get(scope["path"], self.default_timeout), self.max_timeout)
+        requested = Headers(scope=scope).get(TIMEOUT_HEADER)
+        if requested:
+            try:
+                value = float(requested)
+            except ValueError:
+                value = math.nan
+            # Der Client kennt sein eigenes Timeout - er kann verkürzen, aber nicht verlängern
+            if math.isfinite(value) and value > 0:
+                seconds = min(value, seconds)
+        return max(seconds, 0.001)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"] if scope["path"] in self.route_timeouts else "other"
+
+        # Body vorab lesen; danach gehört receive() dem Disconnect-Watcher
+        body: List[Message] = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                metrics.increment("requests_cancelled_total", path=path)
+                return
+            body.append(message)
+            if not message.get("more_body", False):
+                break
+
+        disconnected = asyncio.Event()
+        response_started = False
+
+        async def replay() -> Message:
+            if body:
+                return body.pop(0)
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started
+            if disconnected.is_set():
+                return
+            response_started = True
+            await send(message)
+
+        async def watch() -> None:
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        seconds = self._timeout(scope)
+        token = set_deadline(seconds)
+        try:
+            # Der Task übernimmt den Kontext inkl. Deadline
+            handler = asyncio.create_task(self.app(scope, replay, send_wrapper))
+        finally:
+            reset_deadline(token)
+        watcher = asyncio.create_task(watch())
+
+        try:
+            # Stufen prüfen die Deadline selbst; der harte Abbruch ist nur das Sicherheitsnetz
+            done, _ = await asyncio.wait({handler, watcher}, timeout=seconds + self.grace, return_when=asyncio.FIRST_COMPLETED)
+            if handler in done:
+                handler.result()
+                return
+
+            handler.cancel()
+            try:
+                await handler
+            except asyncio.CancelledError:
+                pass
+
+            if watcher in done:
+                metrics.increment("requests_cancelled_total", path=path)
+                print(f"🔌 Client disconnected - cancelled {scope['path']}")
+                return
+
+            metrics.increment("deadline_exceeded_total", stage="request")
+            if not response_started:
+                response = JSONResponse({"detail": "Deadline exceeded"}, status_code=504)
+                await response(scope, replay, send)
+        finally:
+            watcher.cancel()
+            # Auch wenn die Middleware selbst abgebrochen wird (Shutdown) keinen Handler zurücklassen
+            if not handler.done():
+                handler.cancel()
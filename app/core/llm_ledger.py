@@ -0,0 +1,208 @@
+import asyncio
+import fcntl
+import json
+import os
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.metrics import _percentile
+
+# Feldreihenfolge der Ledger-Einträge (im Ring Buffer als Tuple gespeichert)
+FIELDS = (
+    "ts", "endpoint", "model", "kind", "user",
+    "prompt_tokens", "completion_tokens", "cached_tokens", "cache_hits",
+    "latency_ms", "queue_ms", "ok",
+)
+
+# Worker schreiben mit bis zu flush_interval Verzögerung - beim Rückwärtslesen so viel Überlappung zulassen
+READ_SLACK_SECONDS = 60.0
+READ_BLOCK_SIZE = 64 * 1024
+
+
+def cached_prompt_tokens(usage: Any) -> int:
+    """Prompt-Caching Tokens aus usage.prompt_tokens_details (Objekt oder dict)"""
+    details = getattr(usage, "prompt_tokens_details", None)
+    if details is None and isinstance(getattr(usage, "model_extra", None), dict):
+        details = usage.model_extra.get("prompt_tokens_details")
+    if isinstance(details, dict):
+        return int(details.get("cached_tokens") or 0)
+    return int(getattr(details, "cached_tokens", 0) or 0)
+
+
+class LLMLedger:
+    """
+    Ledger aller LLM-Calls. record() schreibt O(1) in einen Ring Buffer,
+    ein Hintergrund-Task hängt neue Einträge als JSON Lines an eine Datei an.
+    Ab max_bytes wird die Datei nach "<path>.1" rotiert (eine Generation);
+    Rollups lesen die Dateien von hinten und nur bis zum gefragten Zeitraum.
+    """
+
+    def __init__(self, path: str, capacity: int = 4096, flush_interval: float = 5.0, max_bytes: int = 64 * 1024 * 1024):
+        self.path = path
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self._buffer: List[Optional[Tuple]] = [None] * capacity
+        self._written = 0   # Einträge insgesamt geschrieben (in den Buffer)
+        self._flushed = 0   # davon bereits in die Datei geschrieben
+        self.dropped = 0
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    def record(
+        self,
+        endpoint: str,
+        model: str,
+        kind: str,
+        user: Optional[str] = None,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        cached_tokens: int = 0,
+        cache_hits: int = 0,
+        latency_ms: float = 0.0,
+        queue_ms: float = 0.0,
+        ok: bool = True,
+    ) -> None:
+        # Noch nicht geflushte Einträge werden bei Überlauf überschrieben
+        if self._written - self._flushed >= self.capacity:
+            self._flushed += 1
+            self.dropped += 1
+        self._buffer[self._written % self.capacity] = (
+            round(time.time(), 3), endpoint, model, kind, user,
+            prompt_tokens, completion_tokens, cached_tokens, cache_hits,
+            round(latency_ms, 1), round(queue_ms, 1), ok,
+        )
+        self._written += 1
+
+    def _pending(self) -> List[Tuple]:
+        return [self._buffer[i % self.capacity] for i in range(self._flushed, self._written)]
+
+    def _append(self, lines: str) -> None:
+        # Ein write() mit O_APPEND - mehrere Worker können dieselbe Datei nutzen
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, lines.encode("utf-8"))
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size > self.max_bytes:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        # Lock-Datei, damit nicht zwei Worker nacheinander rotieren (der zweite würde .1 überschreiben)
+        with open(f"{self.path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, f"{self.path}.1")
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            end = self._written
+            pending = self._pending()
+            if not pending:
+                return 0
+            lines = "".join(json.dumps(dict(zip(FIELDS, entry))) + "\n" for entry in pending)
+            try:
+                await asyncio.to_thread(self._append, lines)
+            except OSError as e:
+                # Einträge bleiben im Buffer und gehen mit dem nächsten Flush raus
+                print(f"⚠️ LLM ledger flush error: {e}")
+                return 0
+            # record() kann während des Schreibens übergelaufene Einträge schon verworfen haben
+            self._flushed = max(self._flushed, end)
+            return len(pending)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def reset(self) -> None:
+        """Nach fork(): Einträge des Masters nicht doppelt schreiben"""
+        self._buffer = [None] * self.capacity
+        self._written = self._flushed = 0
+        self._task = None
+        self._flush_lock = asyncio.Lock()
+
+    @staticmethod
+    def _reverse_lines(path: str):
+        """Zeilen einer Datei von hinten nach vorne (blockweise gelesen)"""
+        with open(path, "rb") as f:
+            position = f.seek(0, os.SEEK_END)
+            rest = b""
+            while position > 0:
+                size = min(READ_BLOCK_SIZE, position)
+                position -= size
+                f.seek(position)
+                lines = (f.read(size) + rest).split(b"\n")
+                rest = lines.pop(0)
+                yield from reversed(lines)
+            yield rest
+
+    def _read_entries(self, since: float) -> List[Dict[str, Any]]:
+        entries = []
+        for path in (self.path, f"{self.path}.1"):
+            if not os.path.exists(path):
+                continue
+            for line in self._reverse_lines(path):
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                ts = entry.get("ts", 0)
+                if ts >= since:
+                    entries.append(entry)
+                elif ts < since - READ_SLACK_SECONDS:
+                    # Ältere Einträge (und die rotierte Datei) liegen komplett vor dem Zeitraum
+                    return entries
+        return entries
+
+    async def rollups(self, since: float = 0.0, user: Optional[str] = None) -> Dict[str, Any]:
+        """Aggregation pro Endpoint, User und Modell"""
+        await self.flush()
+        entries = await asyncio.to_thread(self._read_entries, since)
+        if user:
+            entries = [entry for entry in entries if entry.get("user") == user]
+
+        def _aggregate(key: str) -> Dict[str, Dict[str, Any]]:
+            groups: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+            for entry in entries:
+                groups[str(entry.get(key) or "unknown")].append(entry)
+
+            result = {}
+            for name, group in groups.items():
+                latencies = sorted(entry["latency_ms"] for entry in group)
+                result[name] = {
+                    "calls": len(group),
+                    "errors": sum(1 for entry in group if not entry.get("ok", True)),
+                    "prompt_tokens": sum(entry["prompt_tokens"] for entry in group),
+                    "completion_tokens": sum(entry["completion_tokens"] for entry in group),
+                    "cached_tokens": sum(entry["cached_tokens"] for entry in group),
+                    "cache_hits": sum(entry.get("cache_hits", 0) for entry in group),
+                    "avg_latency_ms": round(sum(latencies) / len(latencies), 1),
+                    "p95_latency_ms": round(_percentile(latencies, 0.95), 1),
+                    "avg_queue_ms": round(sum(entry.get("queue_ms", 0) for entry in group) / len(group), 1),
+                }
+            return result
+
+        return {
+            "calls": len(entries),
+            "dropped": self.dropped,
+            "by_endpoint": _aggregate("endpoint"),
+            "by_user": _aggregate("user"),
+            "by_model": _aggregate("model"),
+        }
@@ -0,0 +1,354 @@
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.metrics import _percentile
+
+# Laufender Task pro Event Loop (C-Implementierung von asyncio); ohne ihn keine Zuordnung zu Requests
+_current_tasks = getattr(asyncio.tasks, "_current_tasks", None)
+
+# Frames, in denen der Event Loop auf I/O wartet (selectors bzw. uvloop ohne Python-Frames darüber)
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("base_events.py", "run_forever"),
+    ("base_events.py", "run_until_complete"),
+    ("runners.py", "run"),
+}
+# Worker-Threads, die nur warten, tauchen nicht in den Stacks auf
+THREAD_IDLE_FRAMES = {("threading.py", "wait"), ("queue.py", "get"), ("thread.py", "_worker")}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    # app/... relativ, Bibliotheken ab dem Paketnamen
+    for marker in ("/app/", "/site-packages/", "/lib/python"):
+        index = filename.rfind(marker)
+        if index >= 0:
+            filename = filename[index + 1:]
+            break
+    return f"{filename}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def _is_idle(frame, idle_frames) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in idle_frames
+
+
+@dataclass(eq=False)
+class RequestProfile:
+    path: str
+    started: float
+    ended: Optional[float] = None
+    cpu_seconds: float = 0.0  # Loop-Samples, in denen dieser Request lief
+    queue_wait_seconds: float = 0.0  # Tasks des Requests waren bereit, der Loop aber mit anderem beschäftigt
+    tasks: List[Any] = field(default_factory=list)
+
+    def summary(self) -> Dict[str, Any]:
+        wall = ((self.ended or time.perf_counter()) - self.started) * 1000
+        cpu = self.cpu_seconds * 1000
+        blocked = min(self.queue_wait_seconds * 1000, max(wall - cpu, 0.0))
+        return {
+            "path": self.path,
+            "wall_ms": round(wall, 2),
+            "cpu_ms": round(cpu, 2),
+            "loop_blocked_ms": round(blocked, 2),
+            # Rest: Warten auf Upstreams (OpenAI, Pinecone, Firestore)
+            "io_wait_ms": round(max(wall - cpu - blocked, 0.0), 2),
+        }
+
+
+class SamplingProfiler:
+    """
+    Sampling-Profiler für den laufenden Prozess: ein Hintergrund-Thread liest in
+    festen Abständen den Stack des Event-Loop-Threads (sys._current_frames) und
+    zählt ihn als Collapsed Stack (flamegraph.pl / speedscope). Samples werden dem
+    gerade laufenden Task und damit dem Request zugeordnet - daraus ergeben sich
+    pro Request CPU-Zeit, Wartezeit auf den blockierten Loop und I/O-Wartezeit.
+
+    Die Wartezeit auf den Loop ist Scheduling-Lag: loop.call_soon und
+    loop.call_later werden während einer Session ersetzt, und für Tasks
+    profilierter Requests zählt die Zeit vom Fälligwerden eines Schritts (Wakeup
+    nach I/O, abgelaufener Timer) bis zu seiner Ausführung. Ein Request, der nur
+    auf I/O wartet, bekommt so keine fremde CPU-Zeit angerechnet.
+    """
+
+    def __init__(self, max_requests: int = 1000, max_depth: int = 64):
+        self.max_requests = max_requests
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._previous_factory = None
+        self._call_soon = None  # Original loop.call_soon/call_later während einer Session
+        self._call_later = None
+        self._session = 0
+        self._tasks: Dict[Any, RequestProfile] = {}
+        self._reset({})
+
+    def _reset(self, options: Dict[str, Any]) -> None:
+        self.options = options
+        self.stacks: Counter = Counter()
+        self.requests: Deque[RequestProfile] = deque(maxlen=self.max_requests)
+        self.samples = 0
+        self.busy_seconds = 0.0
+        self.idle_seconds = 0.0
+        self.started_at: Optional[float] = None
+        self.ended_at: Optional[float] = None
+        self.process_cpu_start = 0.0
+        self.process_cpu_seconds = 0.0
+
+    @property
+    def active(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # --- Steuerung ---
+    def start(self, seconds: float, interval_ms: float = 10.0, route: Optional[str] = None, sample_rate: float = 1.0, all_threads: bool = False) -> None:
+        """Muss im Event-Loop-Thread aufgerufen werden (z.B. aus einem Endpoint)"""
+        self.stop()
+        with self._lock:
+            self._reset({
+                "seconds": seconds, "interval_ms": interval_ms, "route": route,
+                "sample_rate": sample_rate, "all_threads": all_threads,
+            })
+            self._tasks.clear()
+            self.started_at = time.perf_counter()
+            self.process_cpu_start = time.process_time()
+
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        # Tasks, die ein profilierter Request startet (gather, create_task), gehören zum Request
+        self._previous_factory = self._loop.get_task_factory()
+        self._loop.set_task_factory(self._task_factory)
+        self._call_soon, self._call_later = self._loop.call_soon, self._loop.call_later
+        self._loop.call_soon, self._loop.call_later = self._timed_call_soon, self._timed_call_later
+
+        self._session += 1
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(seconds, interval_ms / 1000, self._session), name="sampling-profiler", daemon=True)
+        self._thread.start()
+        print(f"🔬 Profiler started for {seconds}s (route={route or 'all'}, rate={sample_rate}, interval={interval_ms}ms)")
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            if self._thread is not threading.current_thread():
+                self._thread.join(timeout=2)
+            self._thread = None
+        self._detach_loop()
+        with self._lock:
+            if self.started_at is not None and self.ended_at is None:
+                self.ended_at = time.perf_counter()
+                self.process_cpu_seconds = time.process_time() - self.process_cpu_start
+
+    def _detach_loop(self, session: Optional[int] = None) -> None:
+        """Task-Factory und call_soon zurücksetzen (nur im Event-Loop-Thread)"""
+        if self._loop is None or (session is not None and session != self._session):
+            return
+        if self._loop.get_task_factory() == self._task_factory:
+            self._loop.set_task_factory(self._previous_factory)
+        for name in ("call_soon", "call_later"):
+            if name in self._loop.__dict__:
+                delattr(self._loop, name)
+        self._call_soon = self._call_later = None
+        self._loop = None
+
+    def _task_factory(self, loop, coro, **kwargs):
+        if self._previous_factory is not None:
+            task = self._previous_factory(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        parent = asyncio.current_task(loop) if loop.is_running() else None
+        record = self._tasks.get(parent) if parent is not None else None
+        if record is not None:
+            with self._lock:
+                self._tasks[task] = record
+                record.tasks.append(task)
+        return task
+
+    @staticmethod
+    def _timed(record: RequestProfile, callback, due: float):
+        def run(*args):
+            record.queue_wait_seconds += max(time.perf_counter() - due, 0.0)
+            callback(*args)
+        return run
+
+    def _timed_call_soon(self, callback, *args, context=None):
+        # Task-Schritte und Wakeups sind an den Task gebunden (__self__)
+        task = getattr(callback, "__self__", None)
+        record = self._tasks.get(task) if isinstance(task, asyncio.Task) else None
+        if record is not None:
+            callback = self._timed(record, callback, time.perf_counter())
+        return self._call_soon(callback, *args, context=context)
+
+    def _timed_call_later(self, delay, callback, *args, context=None):
+        # Timer (asyncio.sleep) gehören dem Task, der sie stellt
+        task = _current_tasks.get(self._loop) if _current_tasks is not None else None
+        record = self._tasks.get(task) if task is not None else None
+        if record is not None:
+            callback = self._timed(record, callback, time.perf_counter() + max(delay, 0))
+        return self._call_later(delay, callback, *args, context=context)
+
+    # --- Requests ---
+    def begin_request(self, path: str) -> Optional[RequestProfile]:
+        if not self.active:
+            return None
+        route = self.options.get("route")
+        if route and path != route:
+            return None
+        if random.random() >= self.options.get("sample_rate", 1.0):
+            return None
+        task = asyncio.current_task()
+        record = RequestProfile(path=path, started=time.perf_counter(), tasks=[task])
+        with self._lock:
+            self._tasks[task] = record
+        return record
+
+    def end_request(self, record: RequestProfile) -> None:
+        record.ended = time.perf_counter()
+        with self._lock:
+            for task in record.tasks:
+                self._tasks.pop(task, None)
+            record.tasks = []
+            self.requests.append(record)
+
+    # --- Sampling ---
+    def _stack(self, frame, prefix: Optional[str] = None) -> str:
+        labels = []
+        while frame is not None and len(labels) < self.max_depth:
+            labels.append(_frame_label(frame))
+            frame = frame.f_back
+        if prefix:
+            labels.append(prefix)
+        return ";".join(reversed(labels))
+
+    def _run(self, seconds: float, interval: float, session: int) -> None:
+        try:
+            self._sample_loop(seconds, interval)
+        except Exception as e:
+            print(f"⚠️ Profiler sampling failed: {e}")
+        finally:
+            with self._lock:
+                self.ended_at = time.perf_counter()
+                self.process_cpu_seconds = time.process_time() - self.process_cpu_start
+            print(f"🔬 Profiler finished: {self.samples} samples, {len(self.requests)} requests")
+            # Abgelaufene Session: Hooks im Loop-Thread entfernen
+            loop = self._loop
+            if loop is not None and not loop.is_closed():
+                loop.call_soon_threadsafe(self._detach_loop, session)
+
+    def _sample_loop(self, seconds: float, interval: float) -> None:
+        deadline = time.perf_counter() + seconds
+        last = time.perf_counter()
+        route_only = bool(self.options.get("route"))
+        all_threads = self.options.get("all_threads", False)
+        thread_names = {}
+
+        while not self._stop.wait(interval):
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            frames = sys._current_frames()
+            loop_frame = frames.get(self._loop_thread_id)
+            task = _current_tasks.get(self._loop) if _current_tasks is not None and self._loop is not None else None
+
+            with self._lock:
+                self.samples += 1
+                record = self._tasks.get(task) if task is not None else None
+                if loop_frame is None or _is_idle(loop_frame, IDLE_FRAMES):
+                    self.idle_seconds += elapsed
+                else:
+                    self.busy_seconds += elapsed
+                    if record is not None:
+                        record.cpu_seconds += elapsed
+                    if not route_only or record is not None:
+                        self.stacks[self._stack(loop_frame, "event-loop")] += 1
+
+                if all_threads:
+                    if len(thread_names) != threading.active_count():
+                        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+                    for thread_id, frame in frames.items():
+                        if thread_id in (self._loop_thread_id, threading.get_ident()) or _is_idle(frame, THREAD_IDLE_FRAMES):
+                            continue
+                        self.stacks[self._stack(frame, f"thread:{thread_names.get(thread_id, thread_id)}")] += 1
+
+            if now >= deadline:
+                break
+
+    # --- Auswertung ---
+    def collapsed(self) -> str:
+        """Collapsed Stacks ("frame;frame;frame count" pro Zeile)"""
+        with self._lock:
+            return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def summary(self, top: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            now = time.perf_counter()
+            wall = ((self.ended_at or now) - self.started_at) if self.started_at else 0.0
+            process_cpu = self.process_cpu_seconds if self.ended_at else (
+                time.process_time() - self.process_cpu_start if self.started_at else 0.0
+            )
+            requests = [record.summary() for record in self.requests]
+            stacks = self.stacks.most_common(top)
+            sampled = self.busy_seconds + self.idle_seconds
+
+        by_path: Dict[str, Dict[str, Any]] = {}
+        for path in sorted({request["path"] for request in requests}):
+            entries = [request for request in requests if request["path"] == path]
+            by_path[path] = {"requests": len(entries)}
+            for key in ("wall_ms", "cpu_ms", "loop_blocked_ms", "io_wait_ms"):
+                values = sorted(entry[key] for entry in entries)
+                by_path[path][key] = {
+                    "avg": round(sum(values) / len(values), 2),
+                    "p50": round(_percentile(values, 0.50), 2),
+                    "p95": round(_percentile(values, 0.95), 2),
+                }
+
+        return {
+            "pid": os.getpid(),
+            "active": self.active,
+            "options": self.options,
+            "wall_seconds": round(wall, 3),
+            # Prozess-CPU inkl. Threads (to_thread, SQLite) vs. Anteil des Event Loops
+            "process_cpu_seconds": round(process_cpu, 3),
+            "loop_busy_ratio": round(self.busy_seconds / sampled, 3) if sampled else 0.0,
+            "samples": self.samples,
+            "by_path": by_path,
+            "recent_requests": requests[-20:],
+            "top_stacks": [{"stack": stack, "samples": count} for stack, count in stacks],
+        }
+
+
+class ProfilingMiddleware:
+    """Ordnet Requests dem laufenden Profiler zu (ohne aktive Session praktisch kostenlos)"""
+
+    def __init__(self, app: ASGIApp, profiler: SamplingProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.profiler.active:
+            await self.app(scope, receive, send)
+            return
+
+        record = self.profiler.begin_request(scope["path"])
+        if record is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.end_request(record)
+
+
+# Profiler Instanz (pro Prozess)
+profiler = SamplingProfiler()
@@ -0,0 +1,44 @@
+from typing import Any, Optional
+
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+# orjson ist optional - ohne orjson wird auf die Starlette-Serialisierung zurückgefallen
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON Response mit schneller Serialisierung.
+    Pydantic Models werden direkt über pydantic-core zu JSON gerendert
+    (ohne jsonable_encoder), alles andere über orjson.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            if hasattr(content, "model_dump_json"):
+                return content.model_dump_json().encode("utf-8")
+            return content.json(ensure_ascii=False).encode("utf-8")  # pydantic v1
+
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """If-None-Match / If-Match gegen ein ETag prüfen (schwacher Vergleich, Listen und "*")"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    target = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == target:
+            return True
+    return False
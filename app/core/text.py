@@ -0,0 +1,17 @@
+import re
+import unicodedata
+
+# Führende Mengenangaben wie "2x", "500 g", "1,5l" entfernen
+_QUANTITY_PREFIX = re.compile(r"^\s*\d+([.,]\d+)?\s*(x|stk\.?|stück|g|kg|ml|l|pck\.?|packung(en)?)?\s+", re.IGNORECASE)
+_NON_WORD = re.compile(r"[^\w\s&-]", re.UNICODE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_product_name(name: str) -> str:
+    """Normalisierter Schlüssel für Produktnamen ("  2x Milch! " -> "milch")"""
+    if not name:
+        return ""
+    text = unicodedata.normalize("NFKC", name).strip().lower()
+    text = _QUANTITY_PREFIX.sub("", text)
+    text = _NON_WORD.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
@@ -0,0 +1,18 @@
+"""
+Multi-Worker Betrieb: gunicorn lädt die App einmal (preload_app) und forkt dann
+die Worker. Alles was Sockets, Threads oder gRPC-Kanäle hält, muss pro Prozess
+neu erzeugt werden - das passiert hier im post_fork Hook.
+"""
+
+
+def reset_after_fork() -> None:
+    from app.core.cache import reset_caches
+    from app.database import reset_repository
+    from app.services.openai_service import llm_ledger, openai_service
+    from app.services.pinecone_service import pinecone_service
+
+    reset_caches()
+    reset_repository()
+    openai_service.reset()
+    llm_ledger.reset()
+    pinecone_service.reset()
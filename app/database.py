@@ -0,0 +1,504 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel
+
+from app.config import settings
+from app.models.shopping import CookingPlan, Recipe, ShoppingList, Supermarket
+
+# Firestore erlaubt maximal 500 Operationen pro Batch
+FIRESTORE_BATCH_LIMIT = 500
+
+# Collections
+SHOPPING_LISTS = "shopping_lists"
+RECIPES = "recipes"
+COOKING_PLANS = "cooking_plans"
+SUPERMARKETS = "supermarkets"
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+# Mutator für Transaktionen: bekommt das aktuelle Dokument (oder None) und
+# gibt das neue Dokument zurück (None = Dokument löschen)
+Mutator = Callable[[Optional[Dict[str, Any]]], Optional[Dict[str, Any]]]
+
+
+@dataclass
+class Page(Generic[ModelT]):
+    """Eine Seite eines paginierten Reads"""
+    items: List[ModelT] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+
+
+class DocumentStore(ABC):
+    """Gemeinsames Interface für Firestore und SQLite"""
+
+    @abstractmethod
+    async def set(self, collection: str, doc_id: str, data: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    async def set_many(self, collection: str, docs: List[Tuple[str, Dict[str, Any]]]) -> None:
+        ...
+
+    @abstractmethod
+    async def get(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def get_many(self, collection: str, doc_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def delete(self, collection: str, doc_id: str) -> None:
+        ...
+
+    @abstractmethod
+    async def query_page(
+        self,
+        collection: str,
+        user_email: str,
+        order_by: str,
+        descending: bool,
+        limit: int,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Dokumente eines Users sortiert lesen; cursor ist die ID des letzten Dokuments"""
+        ...
+
+    @abstractmethod
+    async def scan(
+        self,
+        collection: str,
+        limit: int,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Tuple[str, Dict[str, Any]]], Optional[str]]:
+        """Alle Dokumente einer Collection nach ID sortiert lesen (Jobs, globale Kataloge)"""
+        ...
+
+    @abstractmethod
+    async def transact(self, collection: str, doc_id: str, mutator: Mutator) -> Optional[Dict[str, Any]]:
+        """Read-Modify-Write eines Dokuments in einer Transaktion"""
+        ...
+
+
+# --- Firestore ---
+
+class FirestoreStore(DocumentStore):
+    """Non-blocking Firestore Zugriff über den AsyncClient"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def _ref(self, collection: str, doc_id: str):
+        return self.client.collection(collection).document(doc_id)
+
+    async def set(self, collection: str, doc_id: str, data: Dict[str, Any]) -> None:
+        await self._ref(collection, doc_id).set(data)
+
+    async def set_many(self, collection: str, docs: List[Tuple[str, Dict[str, Any]]]) -> None:
+        for start in range(0, len(docs), FIRESTORE_BATCH_LIMIT):
+            batch = self.client.batch()
+            for doc_id, data in docs[start:start + FIRESTORE_BATCH_LIMIT]:
+                batch.set(self._ref(collection, doc_id), data)
+            await batch.commit()
+
+    async def get(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        snapshot = await self._ref(collection, doc_id).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+    async def get_many(self, collection: str, doc_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not doc_ids:
+            return {}
+        refs = [self._ref(collection, doc_id) for doc_id in doc_ids]
+        result = {}
+        async for snapshot in self.client.get_all(refs):
+            if snapshot.exists:
+                result[snapshot.id] = snapshot.to_dict()
+        return result
+
+    async def delete(self, collection: str, doc_id: str) -> None:
+        await self._ref(collection, doc_id).delete()
+
+    async def query_page(
+        self,
+        collection: str,
+        user_email: str,
+        order_by: str,
+        descending: bool,
+        limit: int,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        from google.cloud.firestore import Query
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        direction = Query.DESCENDING if descending else Query.ASCENDING
+        query = (
+            self.client.collection(collection)
+            .where(filter=FieldFilter("user_email", "==", user_email))
+            .order_by(order_by, direction=direction)
+            .limit(limit + 1)
+        )
+        if cursor:
+            cursor_snapshot = await self._ref(collection, cursor).get()
+            if cursor_snapshot.exists:
+                query = query.start_after(cursor_snapshot)
+
+        snapshots = [snapshot async for snapshot in query.stream()]
+        next_cursor = snapshots[limit - 1].id if len(snapshots) > limit else None
+        return [snapshot.to_dict() for snapshot in snapshots[:limit]], next_cursor
+
+    async def scan(
+        self,
+        collection: str,
+        limit: int,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Tuple[str, Dict[str, Any]]], Optional[str]]:
+        query = self.client.collection(collection).order_by("__name__").limit(limit + 1)
+        if cursor:
+            query = query.start_after({"__name__": self._ref(collection, cursor)})
+
+        snapshots = [snapshot async for snapshot in query.stream()]
+        next_cursor = snapshots[limit - 1].id if len(snapshots) > limit else None
+        return [(snapshot.id, snapshot.to_dict()) for snapshot in snapshots[:limit]], next_cursor
+
+    async def transact(self, collection: str, doc_id: str, mutator: Mutator) -> Optional[Dict[str, Any]]:
+        from google.cloud.firestore import async_transactional
+
+        ref = self._ref(collection, doc_id)
+
+        @async_transactional
+        async def _run(transaction):
+            snapshot = await ref.get(transaction=transaction)
+            new_data = mutator(snapshot.to_dict() if snapshot.exists else None)
+            if new_data is None:
+                transaction.delete(ref)
+            else:
+                transaction.set(ref, new_data)
+            return new_data
+
+        return await _run(self.client.transaction())
+
+
+# --- SQLite (offline, für Tests und Benchmarks) ---
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class SQLiteStore(DocumentStore):
+    """
+    Lokale Implementierung desselben Interfaces. Dokumente werden als JSON
+    gespeichert, die blockierenden sqlite3-Aufrufe laufen in einem Thread.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                collection TEXT NOT NULL,
+                id TEXT NOT NULL,
+                user_email TEXT,
+                data TEXT NOT NULL,
+                PRIMARY KEY (collection, id)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_documents_user ON documents (collection, user_email)"
+        )
+
+    async def _run(self, fn, *args):
+        def _locked():
+            with self._lock:
+                return fn(*args)
+        return await asyncio.to_thread(_locked)
+
+    @staticmethod
+    def _row(collection: str, doc_id: str, data: Dict[str, Any]) -> Tuple[str, str, Optional[str], str]:
+        return collection, doc_id, data.get("user_email"), json.dumps(data, default=_json_default)
+
+    def _set_many_sync(self, rows: List[Tuple[str, str, Optional[str], str]]) -> None:
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents (collection, id, user_email, data) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    async def set(self, collection: str, doc_id: str, data: Dict[str, Any]) -> None:
+        await self._run(self._set_many_sync, [self._row(collection, doc_id, data)])
+
+    async def set_many(self, collection: str, docs: List[Tuple[str, Dict[str, Any]]]) -> None:
+        if docs:
+            await self._run(self._set_many_sync, [self._row(collection, doc_id, data) for doc_id, data in docs])
+
+    def _get_many_sync(self, collection: str, doc_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        placeholders = ",".join("?" * len(doc_ids))
+        rows = self._conn.execute(
+            f"SELECT id, data FROM documents WHERE collection = ? AND id IN ({placeholders})",
+            [collection, *doc_ids],
+        ).fetchall()
+        return {doc_id: json.loads(data) for doc_id, data in rows}
+
+    async def get(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        return (await self.get_many(collection, [doc_id])).get(doc_id)
+
+    async def get_many(self, collection: str, doc_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not doc_ids:
+            return {}
+        return await self._run(self._get_many_sync, collection, list(doc_ids))
+
+    def _delete_sync(self, collection: str, doc_id: str) -> None:
+        self._conn.execute("DELETE FROM documents WHERE collection = ? AND id = ?", (collection, doc_id))
+
+    async def delete(self, collection: str, doc_id: str) -> None:
+        await self._run(self._delete_sync, collection, doc_id)
+
+    def _query_page_sync(self, collection, user_email, order_by, descending, limit, cursor):
+        # Keyset-Pagination über (Sortierfeld, id), analog zu start_after in Firestore
+        sort_expr = "json_extract(data, ?)"
+        path = f"$.{order_by}"
+        direction, cmp = ("DESC", "<") if descending else ("ASC", ">")
+        sql = "SELECT id, data FROM documents WHERE collection = ? AND user_email = ?"
+        params: List[Any] = [collection, user_email]
+
+        if cursor:
+            row = self._conn.execute(
+                f"SELECT {sort_expr} FROM documents WHERE collection = ? AND id = ?",
+                (path, collection, cursor),
+            ).fetchone()
+            if row is not None:
+                sql += f" AND ({sort_expr} {cmp} ? OR ({sort_expr} = ? AND id {cmp} ?))"
+                params += [path, row[0], path, row[0], cursor]
+
+        sql += f" ORDER BY {sort_expr} {direction}, id {direction} LIMIT ?"
+        params += [path, limit + 1]
+
+        rows = self._conn.execute(sql, params).fetchall()
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return [json.loads(data) for _, data in rows[:limit]], next_cursor
+
+    async def query_page(
+        self,
+        collection: str,
+        user_email: str,
+        order_by: str,
+        descending: bool,
+        limit: int,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        return await self._run(self._query_page_sync, collection, user_email, order_by, descending, limit, cursor)
+
+    def _scan_sync(self, collection: str, limit: int, cursor: Optional[str]):
+        rows = self._conn.execute(
+            "SELECT id, data FROM documents WHERE collection = ? AND id > ? ORDER BY id LIMIT ?",
+            (collection, cursor or "", limit + 1),
+        ).fetchall()
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return [(doc_id, json.loads(data)) for doc_id, data in rows[:limit]], next_cursor
+
+    async def scan(
+        self,
+        collection: str,
+        limit: int,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Tuple[str, Dict[str, Any]]], Optional[str]]:
+        return await self._run(self._scan_sync, collection, limit, cursor)
+
+    def _transact_sync(self, collection: str, doc_id: str, mutator: Mutator) -> Optional[Dict[str, Any]]:
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute(
+                "SELECT data FROM documents WHERE collection = ? AND id = ?", (collection, doc_id)
+            ).fetchone()
+            new_data = mutator(json.loads(row[0]) if row else None)
+            if new_data is None:
+                self._delete_sync(collection, doc_id)
+            else:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO documents (collection, id, user_email, data) VALUES (?, ?, ?, ?)",
+                    self._row(collection, doc_id, new_data),
+                )
+            self._conn.execute("COMMIT")
+            # Rundreise über JSON, damit beide Backends dieselben Typen liefern
+            return json.loads(json.dumps(new_data, default=_json_default)) if new_data is not None else None
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    async def transact(self, collection: str, doc_id: str, mutator: Mutator) -> Optional[Dict[str, Any]]:
+        return await self._run(self._transact_sync, collection, doc_id, mutator)
+
+
+# --- Typisierte Repositories ---
+
+class ModelRepository(Generic[ModelT]):
+    """Typisierter Zugriff auf eine Collection (ShoppingList, Recipe, CookingPlan, Supermarket)"""
+
+    def __init__(self, store: DocumentStore, collection: str, model: Type[ModelT], order_by: str, descending: bool = True):
+        self.store = store
+        self.collection = collection
+        self.model = model
+        self.order_by = order_by
+        self.descending = descending
+
+    def _to_doc(self, obj: ModelT) -> Dict[str, Any]:
+        return obj.dict()
+
+    async def save(self, obj: ModelT) -> str:
+        await self.store.set(self.collection, obj.uuid, self._to_doc(obj))
+        return obj.uuid
+
+    async def save_many(self, objs: List[ModelT]) -> List[str]:
+        """Batched Write (Firestore: max. 500 pro Commit)"""
+        await self.store.set_many(self.collection, [(obj.uuid, self._to_doc(obj)) for obj in objs])
+        return [obj.uuid for obj in objs]
+
+    async def get(self, doc_id: str) -> Optional[ModelT]:
+        data = await self.store.get(self.collection, doc_id)
+        return self.model(**data) if data is not None else None
+
+    async def get_many(self, doc_ids: List[str]) -> List[ModelT]:
+        """Batched Read; Reihenfolge entspricht doc_ids, fehlende werden übersprungen"""
+        docs = await self.store.get_many(self.collection, doc_ids)
+        return [self.model(**docs[doc_id]) for doc_id in doc_ids if doc_id in docs]
+
+    async def delete(self, doc_id: str) -> None:
+        await self.store.delete(self.collection, doc_id)
+
+    async def list_for_user(self, user_email: str, page_size: int = 20, cursor: Optional[str] = None) -> Page[ModelT]:
+        docs, next_cursor = await self.store.query_page(
+            self.collection, user_email, self.order_by, self.descending, page_size, cursor
+        )
+        return Page(items=[self.model(**doc) for doc in docs], next_cursor=next_cursor)
+
+    async def update(self, doc_id: str, fn: Callable[[Optional[ModelT]], Optional[ModelT]]) -> Optional[ModelT]:
+        """Transaktionales Read-Modify-Write"""
+        def mutator(current: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+            updated = fn(self.model(**current) if current is not None else None)
+            return self._to_doc(updated) if updated is not None else None
+
+        data = await self.store.transact(self.collection, doc_id, mutator)
+        return self.model(**data) if data is not None else None
+
+
+class Repository:
+    """Persistenz für ShoppingLists, Rezepte, Kochpläne und Supermärkte"""
+
+    def __init__(self, store: DocumentStore):
+        self.store = store
+        self.shopping_lists: ModelRepository[ShoppingList] = ModelRepository(store, SHOPPING_LISTS, ShoppingList, "updated_at")
+        self.recipes: ModelRepository[Recipe] = ModelRepository(store, RECIPES, Recipe, "name", descending=False)
+        self.cooking_plans: ModelRepository[CookingPlan] = ModelRepository(store, COOKING_PLANS, CookingPlan, "date")
+        self.supermarkets: ModelRepository[Supermarket] = ModelRepository(store, SUPERMARKETS, Supermarket, "name", descending=False)
+
+    async def add_document(self, collection: str, data: Dict[str, Any], doc_id: Optional[str] = None) -> str:
+        """Untypisiertes Dokument speichern (z.B. generierte Listen mit Zusatzfeldern)"""
+        doc_id = doc_id or data.get("uuid") or str(uuid.uuid4())
+        await self.store.set(collection, doc_id, data)
+        return doc_id
+
+
+# --- Firebase Initialisierung ---
+
+FIREBASE_ENABLED = False
+_repository: Optional[Repository] = None
+
+
+def initialize_firebase() -> bool:
+    """Firebase App initialisieren (idempotent). Gibt zurück ob Firebase verfügbar ist."""
+    global FIREBASE_ENABLED
+
+    try:
+        # ✅ IMPORTS INNERHALB DER FUNKTION - Firebase bleibt optional
+        import firebase_admin
+        from firebase_admin import credentials
+
+        if firebase_admin._apps:
+            FIREBASE_ENABLED = True
+            return True
+
+        if not all([
+            settings.FIREBASE_PROJECT_ID,
+            settings.FIREBASE_PRIVATE_KEY,
+            settings.FIREBASE_CLIENT_EMAIL
+        ]):
+            print("⚠️ Firebase credentials incomplete - using mock mode")
+            return False
+
+        firebase_config = {
+            "type": "service_account",
+            "project_id": settings.FIREBASE_PROJECT_ID,
+            "private_key_id": settings.FIREBASE_PRIVATE_KEY_ID,
+            "private_key": settings.FIREBASE_PRIVATE_KEY,
+            "client_email": settings.FIREBASE_CLIENT_EMAIL,
+            "client_id": settings.FIREBASE_CLIENT_ID,
+            "auth_uri": settings.FIREBASE_AUTH_URI,
+            "token_uri": settings.FIREBASE_TOKEN_URI,
+            "client_x509_cert_url": settings.FIREBASE_CLIENT_CERT_URL
+        }
+
+        cred = credentials.Certificate(firebase_config)
+        firebase_admin.initialize_app(cred)
+        FIREBASE_ENABLED = True
+        print("✅ Firebase initialized successfully")
+        return True
+
+    except ImportError:
+        print("⚠️ Firebase Admin SDK not available")
+    except Exception as e:
+        print(f"❌ Firebase initialization error: {e}")
+    return False
+
+
+def get_repository() -> Optional[Repository]:
+    """
+    Liefert das konfigurierte Repository (lazy). DATABASE_BACKEND=sqlite nutzt
+    die lokale SQLite-Datei, sonst Firestore. None wenn Firestore nicht verfügbar ist.
+    """
+    global _repository
+
+    if _repository is not None:
+        return _repository
+
+    if settings.DATABASE_BACKEND == "sqlite":
+        _repository = Repository(SQLiteStore(settings.SQLITE_PATH))
+        print(f"✅ Using SQLite repository: {settings.SQLITE_PATH}")
+        return _repository
+
+    if not initialize_firebase():
+        return None
+
+    from firebase_admin import firestore_async
+
+    _repository = Repository(FirestoreStore(firestore_async.client()))
+    return _repository
+
+
+def reset_repository() -> None:
+    """Nach fork(): Repository (und damit den Firestore Client) neu erzeugen"""
+    global _repository
+    _repository = None
+
+
+def set_repository(repository: Optional[Repository]) -> None:
+    """Repository explizit setzen (Tests, Benchmarks)"""
+    global _repository
+    _repository = repository
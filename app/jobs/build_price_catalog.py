@@ -0,0 +1,175 @@
+"""
+Baut den Preiskatalog aus allen gespeicherten Einkaufslisten neu auf.
+
+    python -m app.jobs.build_price_catalog [--dry-run] [--page-size 500]
+
+    python -m app.jobs.build_price_catalog --no-estimate
+
+Der Rebuild ersetzt den Katalog komplett und ist damit idempotent. Items, deren
+Preis bereits aus dem Katalog stammt (price_source == "catalog"), werden
+übersprungen, damit sich Katalogpreise nicht selbst verstärken. Manuell gesetzte
+Preise (und ältere LLM-Schätzungen) fließen ein.
+
+Produkte aus den Listen, für die es noch keinen Preis gibt, schätzt der Job
+gesammelt per LLM (ein Call pro ESTIMATE_BATCH_SIZE Produkte). Geschätzte
+Einträge sind markiert und werden bei späteren Rebuilds übernommen, bis ein
+beobachteter Preis sie ersetzt - die Generierung selbst fragt keine Preise ab.
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List
+
+from app.core.admission import Lane
+from app.core.text import normalize_product_name
+from app.database import SHOPPING_LISTS, get_repository
+from app.services.openai_service import openai_service
+from app.services.price_catalog import PRICE_CATALOG, PriceCatalog, catalog_doc_id, price_catalog
+
+ESTIMATE_MODEL = "gpt-4o-mini"
+ESTIMATE_BATCH_SIZE = 100
+
+
+def _parse_estimates(text: str, count: int) -> Dict[int, float]:
+    """LLM-Antwort {"0": 1.29, ...} in gültige Preise pro Index übersetzen"""
+    start, end = text.find("{"), text.rfind("}") + 1
+    if start == -1 or end == 0:
+        return {}
+    try:
+        raw = json.loads(text[start:end])
+    except json.JSONDecodeError:
+        return {}
+    estimates = {}
+    for key, price in raw.items():
+        if not str(key).isdigit() or int(key) >= count:
+            continue
+        if isinstance(price, (int, float)) and not isinstance(price, bool) and price > 0:
+            estimates[int(key)] = round(float(price), 2)
+    return estimates
+
+
+async def estimate_prices(products: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Durchschnittspreise für Produkte ohne beobachteten Preis schätzen (doc_id -> Katalogeintrag)"""
+    entries: Dict[str, Dict[str, Any]] = {}
+    for start in range(0, len(products), ESTIMATE_BATCH_SIZE):
+        batch = products[start:start + ESTIMATE_BATCH_SIZE]
+        listing = "\n".join(
+            f"{index}: {product['name']}" + (f" ({product['category']})" if product.get("category") else "")
+            for index, product in enumerate(batch)
+        )
+        try:
+            response = await openai_service.chat_completion(
+                messages=[
+                    {"role": "system", "content": "Du schätzt durchschnittliche Preise in deutschen Supermärkten in Euro. "
+                                                  "Antworte NUR mit einem JSON-Objekt {\"<Nummer>\": <Preis>}."},
+                    {"role": "user", "content": listing},
+                ],
+                model=ESTIMATE_MODEL, temperature=0.0, max_tokens=12 * len(batch) + 50,
+                lane=Lane.BACKGROUND, endpoint="price-catalog-estimate",
+            )
+        except Exception as e:
+            print(f"⚠️ Price estimation failed for {len(batch)} products: {e}")
+            continue
+
+        estimates = _parse_estimates(response.choices[0].message.content or "", len(batch))
+        for index, price in estimates.items():
+            product = batch[index]
+            name_key = normalize_product_name(product["name"])
+            entries[catalog_doc_id(name_key, product.get("category"))] = {
+                "name": product["name"],
+                "name_key": name_key,
+                "category": product.get("category"),
+                "prices": {"unknown": {"total": price, "count": 1}},
+                "updated_at": time.time(),
+                "estimated": True,
+            }
+    return entries
+
+
+async def build(page_size: int = 500, dry_run: bool = False, estimate: bool = True) -> Dict[str, int]:
+    repository = get_repository()
+    if repository is None:
+        raise RuntimeError("No repository configured (DATABASE_BACKEND / Firebase credentials)")
+
+    stats = {"lists": 0, "skipped_lists": 0, "skipped_items": 0, "priced_items": 0, "products": 0,
+             "kept_estimates": 0, "estimated_products": 0}
+    items: List[Dict[str, Any]] = []
+    # Alle Produkte aus den Listen (name_key -> Item), auch ohne Preis
+    seen: Dict[str, Dict[str, Any]] = {}
+    cursor = None
+
+    while True:
+        docs, cursor = await repository.store.scan(SHOPPING_LISTS, page_size, cursor)
+        for _, doc in docs:
+            list_items = [item for item in doc.get("items") or [] if isinstance(item, dict)]
+            for item in list_items:
+                name_key = normalize_product_name(item.get("name", ""))
+                if name_key:
+                    seen.setdefault(name_key, item)
+            # Ältere Listen waren als Ganzes markiert
+            if doc.get("price_source") == "catalog":
+                stats["skipped_lists"] += 1
+                continue
+            stats["lists"] += 1
+            for item in list_items:
+                if not item.get("estimated_price"):
+                    continue
+                if item.get("price_source") == "catalog":
+                    stats["skipped_items"] += 1
+                    continue
+                items.append(item)
+        if cursor is None:
+            break
+
+    entries = PriceCatalog.aggregate(items)
+    stats["priced_items"] = len(items)
+
+    # Frühere Schätzungen übernehmen, solange kein beobachteter Preis vorliegt
+    priced_names = {entry["name_key"] for entry in entries.values()}
+    cursor = None
+    while True:
+        docs, cursor = await repository.store.scan(PRICE_CATALOG, page_size, cursor)
+        for doc_id, entry in docs:
+            if entry.get("estimated") and entry.get("name_key") in seen and entry.get("name_key") not in priced_names:
+                entries[doc_id] = entry
+                priced_names.add(entry["name_key"])
+                stats["kept_estimates"] += 1
+        if cursor is None:
+            break
+
+    missing = [
+        {"name": item["name"], "category": item.get("category")}
+        for name_key, item in seen.items() if name_key not in priced_names
+    ]
+    if dry_run:
+        stats["products"] = len(entries)
+        print(f"🔍 Would write {len(entries)} catalog entries from {len(items)} priced items"
+              f" and estimate {len(missing) if estimate else 0} unpriced products")
+        return stats
+
+    if estimate and missing:
+        estimated = await estimate_prices(missing)
+        entries.update(estimated)
+        stats["estimated_products"] = len(estimated)
+        print(f"💶 Estimated prices for {len(estimated)}/{len(missing)} unpriced products")
+    stats["products"] = len(entries)
+
+    await price_catalog.replace(entries)
+    print(f"✅ Price catalog rebuilt with {len(entries)} products")
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild the local price catalog from stored shopping lists")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--no-estimate", action="store_true", help="Do not estimate prices for unpriced products")
+    args = parser.parse_args()
+
+    stats = asyncio.run(build(args.page_size, args.dry_run, not args.no_estimate))
+    print(f"📊 Price catalog build finished: {stats}")
+
+
+if __name__ == "__main__":
+    main()
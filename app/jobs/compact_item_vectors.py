@@ -0,0 +1,138 @@
+"""
+Fasst doppelte Item-Vektoren (alte item_{uuid4} IDs) zu einem Vektor pro
+User und Produkt zusammen. Die zusammengefassten Vektoren landen direkt im
+Namespace des Users (kompaktes Metadaten-Schema).
+
+    python -m app.jobs.compact_item_vectors [--dry-run] [--batch-size 1000]
+
+Der Job ist idempotent und kann nach einem Abbruch einfach neu gestartet werden:
+bereits kompaktierte Vektoren tragen purchase_count und werden nicht erneut gelesen.
+Zusammengefasste Vektoren werden nicht ein zweites Mal eingerechnet - weder wenn
+Pinecone sie nach dem Löschen noch kurz liefert (eventually consistent), noch
+nach einem Abbruch zwischen Upsert und Delete. Legacy-Vektoren ohne user_email
+oder name sind keinem User zuzuordnen und werden gelöscht.
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from app.services.item_history_service import LEGACY_ITEM_NAMESPACE, item_namespace, item_vector_id, merge_item_metadata
+from app.services.pinecone_service import pinecone_service
+from app.services.vector_metadata import compact_metadata, to_epoch
+
+# Alte Vektoren haben noch kein purchase_count
+LEGACY_FILTER = {"item_type": "shopping_item", "purchase_count": {"$exists": False}}
+# Liefert die Query nur noch bereits verarbeitete Vektoren, kurz warten (Löschungen sind noch nicht sichtbar)
+STALE_RETRIES = 3
+STALE_RETRY_DELAY = 2.0
+
+
+def _already_merged(target: Optional[Dict], legacy: Dict) -> bool:
+    """Die Liste des Legacy-Vektors steht schon im Ziel - er wurde bereits eingerechnet"""
+    list_uuid = legacy.get("list_uuid")
+    return bool(target and list_uuid) and list_uuid in (compact_metadata(target).get("l") or [])
+
+
+async def compact(batch_size: int = 1000, dry_run: bool = False) -> Dict[str, int]:
+    stats = {"legacy_vectors": 0, "canonical_vectors": 0, "already_merged": 0, "invalid": 0, "deleted": 0}
+    dummy_vector = await pinecone_service.zero_vector()
+    processed = set()
+    stale_rounds = 0
+
+    while True:
+        matches = await pinecone_service.query_vectors(
+            dummy_vector, batch_size, LEGACY_ITEM_NAMESPACE, LEGACY_FILTER, include_values=True, use_cache=False
+        )
+        if not matches:
+            break
+        fresh = [match for match in matches if match["id"] not in processed]
+        if not fresh:
+            stale_rounds += 1
+            if stale_rounds > STALE_RETRIES:
+                print(f"⚠️ {len(matches)} processed legacy vectors still returned after delete - stopping")
+                break
+            await asyncio.sleep(STALE_RETRY_DELAY)
+            continue
+        matches, stale_rounds = fresh, 0
+
+        # Nach User und (User, normalisiertem Namen) gruppieren
+        groups: Dict[str, Dict[str, List[Dict]]] = defaultdict(lambda: defaultdict(list))
+        invalid: List[str] = []
+        for match in matches:
+            metadata = match.get("metadata") or {}
+            if metadata.get("user_email") and metadata.get("name"):
+                user_email = metadata["user_email"]
+                groups[user_email][item_vector_id(user_email, metadata["name"])].append(match)
+            else:
+                # Ohne User oder Namen nicht zuzuordnen - löschen statt den Job daran hängen zu lassen
+                invalid.append(match["id"])
+        stats["invalid"] += len(invalid)
+
+        vectors_by_user: Dict[str, List[Dict]] = {}
+        for user_email, products in groups.items():
+            existing = await pinecone_service.fetch_vectors(list(products), item_namespace(user_email))
+
+            vectors = []
+            for vector_id, group in products.items():
+                # Älteste zuerst, damit der letzte Stand gewinnt
+                group.sort(key=lambda match: match["metadata"].get("created_at", ""))
+                current = existing.get(vector_id)
+                metadata = current.get("metadata") if current else None
+
+                for match in group:
+                    legacy = match["metadata"]
+                    # Gegen den Stand vor diesem Batch prüfen: dieselbe Liste kann ein Produkt mehrfach enthalten
+                    if _already_merged(current.get("metadata") if current else None, legacy):
+                        stats["already_merged"] += 1
+                        continue
+                    metadata = merge_item_metadata(
+                        metadata,
+                        legacy,
+                        legacy.get("list_uuid"),
+                        to_epoch(legacy.get("created_at")) or 0,
+                    )
+
+                vectors.append({
+                    "id": vector_id,
+                    "values": current["values"] if current else group[-1]["values"],
+                    "metadata": metadata,
+                })
+            vectors_by_user[user_email] = vectors
+
+        legacy_ids: List[str] = [match["id"] for products in groups.values() for group in products.values() for match in group]
+        canonical = sum(len(vectors) for vectors in vectors_by_user.values())
+        stats["legacy_vectors"] += len(legacy_ids)
+        stats["canonical_vectors"] += canonical
+
+        if dry_run:
+            print(f"🔍 Would merge {len(legacy_ids)} legacy vectors into {canonical} products and delete {len(invalid)} invalid ones")
+            break
+
+        # Erst upserten, dann löschen: ein Abbruch verliert keine Daten
+        for user_email, vectors in vectors_by_user.items():
+            if not await pinecone_service.upsert_vectors(vectors, item_namespace(user_email)):
+                raise RuntimeError("Upsert failed - aborting compaction")
+        if not await pinecone_service.delete_vectors(legacy_ids + invalid, LEGACY_ITEM_NAMESPACE):
+            raise RuntimeError("Delete failed - aborting compaction")
+
+        processed.update(legacy_ids)
+        processed.update(invalid)
+        stats["deleted"] += len(legacy_ids) + len(invalid)
+        print(f"✅ Merged {len(legacy_ids)} legacy vectors into {canonical} products")
+
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compact duplicate shopping item vectors in Pinecone")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    stats = asyncio.run(compact(args.batch_size, args.dry_run))
+    print(f"📊 Compaction finished: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Schreibt bestehende Vektoren ins kompakte Metadaten-Schema um (kurze Keys,
+typisierte Werte, ohne user/uuid) und zieht generierte Items aus dem Default
+Namespace in die Namespaces der User.
+
+    python -m app.jobs.migrate_vector_metadata [--dry-run] [--batch-size 1000] [--namespace user@example.com]
+
+Nicht kompaktierte Item-Vektoren (ohne purchase_count) vorher mit
+app.jobs.compact_item_vectors zusammenfassen. Der Job ist idempotent:
+migrierte Vektoren tragen den Key "t" und werden nicht erneut gelesen.
+Umgezogene Items werden nicht ein zweites Mal eingerechnet - weder wenn
+Pinecone sie nach dem Löschen noch kurz liefert (eventually consistent), noch
+nach einem Abbruch zwischen Upsert und Delete.
+"""
+import argparse
+import asyncio
+import json
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from app.services.item_history_service import LEGACY_ITEM_NAMESPACE, combine_item_metadata, item_namespace, item_vector_id
+from app.services.pinecone_service import pinecone_service
+from app.services.vector_metadata import compact_metadata
+
+# Vektoren im alten Schema haben noch keinen Typ-Code
+LEGACY_FILTER = {"t": {"$exists": False}}
+# Bereits kompaktierte, aber noch nicht umgezogene generierte Items
+LEGACY_ITEM_FILTER = {"item_type": "shopping_item", "purchase_count": {"$exists": True}}
+# Liefert die Query nur noch bereits umgezogene Items, kurz warten (Löschungen sind noch nicht sichtbar)
+STALE_RETRIES = 3
+STALE_RETRY_DELAY = 2.0
+
+
+def _size(metadata: Dict) -> int:
+    return len(json.dumps(metadata, ensure_ascii=False).encode("utf-8"))
+
+
+def _already_merged(target: Dict, source: Dict) -> bool:
+    """Ziel enthält alle Listen der Quelle - die Quelle wurde schon eingerechnet"""
+    lists = source.get("l") or []
+    return bool(lists) and set(lists) <= set(target.get("l") or [])
+
+
+async def migrate_namespace(namespace: str, stats: Dict[str, int], batch_size: int, dry_run: bool) -> None:
+    """Metadaten eines User-Namespaces in place umschreiben"""
+    dummy_vector = await pinecone_service.zero_vector()
+    skipped = set()
+
+    while True:
+        matches = await pinecone_service.query_vectors(
+            dummy_vector, batch_size, namespace, LEGACY_FILTER, include_values=True, use_cache=False
+        )
+        matches = [match for match in matches if match["id"] not in skipped]
+        if not matches:
+            break
+
+        vectors = []
+        for match in matches:
+            metadata = compact_metadata(match.get("metadata") or {})
+            if "t" not in metadata:
+                # Ohne Typ nicht migrierbar - sonst liefert der Filter ihn endlos wieder
+                skipped.add(match["id"])
+                continue
+            stats["bytes_before"] += _size(match.get("metadata") or {})
+            stats["bytes_after"] += _size(metadata)
+            vectors.append({"id": match["id"], "values": match["values"], "metadata": metadata})
+
+        if not vectors:
+            continue
+        stats["rewritten"] += len(vectors)
+
+        if dry_run:
+            print(f"🔍 Would rewrite {len(vectors)} vectors in namespace {namespace}")
+            break
+        if not await pinecone_service.upsert_vectors(vectors, namespace):
+            raise RuntimeError(f"Upsert failed in namespace {namespace} - aborting migration")
+        print(f"✅ Rewrote {len(vectors)} vectors in namespace {namespace}")
+
+    stats["skipped"] += len(skipped)
+
+
+async def move_legacy_items(stats: Dict[str, int], batch_size: int, dry_run: bool) -> None:
+    """Generierte Items aus dem Default Namespace in den Namespace des Users verschieben"""
+    dummy_vector = await pinecone_service.zero_vector()
+    processed = set()
+    stale_rounds = 0
+
+    while True:
+        matches = await pinecone_service.query_vectors(
+            dummy_vector, batch_size, LEGACY_ITEM_NAMESPACE, LEGACY_ITEM_FILTER, include_values=True, use_cache=False
+        )
+        if not matches:
+            break
+        fresh = [match for match in matches if match["id"] not in processed]
+        if not fresh:
+            stale_rounds += 1
+            if stale_rounds > STALE_RETRIES:
+                print(f"⚠️ {len(matches)} moved items still returned after delete - stopping")
+                break
+            await asyncio.sleep(STALE_RETRY_DELAY)
+            continue
+        matches, stale_rounds = fresh, 0
+
+        by_user: Dict[str, List[Dict]] = defaultdict(list)
+        for match in matches:
+            metadata = match.get("metadata") or {}
+            if metadata.get("user_email") and metadata.get("name"):
+                by_user[metadata["user_email"]].append(match)
+
+        if not by_user:
+            print(f"⚠️ {len(matches)} legacy items without user_email/name - skipping")
+            break
+
+        moved: List[str] = []
+        for user_email, group in by_user.items():
+            namespace = item_namespace(user_email)
+            ids = {match["id"]: item_vector_id(user_email, match["metadata"]["name"]) for match in group}
+            # Seit dem Deployment kann das Produkt schon im User-Namespace gelandet sein
+            existing = await pinecone_service.fetch_vectors(list(set(ids.values())), namespace)
+
+            vectors: Dict[str, Dict] = {}
+            for match in group:
+                vector_id = ids[match["id"]]
+                metadata = compact_metadata(match["metadata"])
+                stats["bytes_before"] += _size(match["metadata"])
+                current = vectors.get(vector_id) or existing.get(vector_id)
+                if current:
+                    current_metadata = compact_metadata(current.get("metadata") or {})
+                    if _already_merged(current_metadata, metadata):
+                        stats["already_merged"] += 1
+                        metadata = current_metadata
+                    else:
+                        metadata = combine_item_metadata(current_metadata, metadata)
+                values = current["values"] if current else match["values"]
+                vectors[vector_id] = {"id": vector_id, "values": values, "metadata": metadata}
+
+            stats["bytes_after"] += sum(_size(vector["metadata"]) for vector in vectors.values())
+            stats["moved"] += len(group)
+            if not dry_run and not await pinecone_service.upsert_vectors(list(vectors.values()), namespace):
+                raise RuntimeError(f"Upsert failed for {user_email} - aborting migration")
+            moved.extend(ids)
+
+        processed.update(moved)
+        if dry_run:
+            print(f"🔍 Would move {len(moved)} items into {len(by_user)} user namespaces")
+            break
+
+        # Erst upserten, dann löschen: ein Abbruch verliert keine Daten
+        if not await pinecone_service.delete_vectors(moved, LEGACY_ITEM_NAMESPACE):
+            raise RuntimeError("Delete failed - aborting migration")
+        print(f"✅ Moved {len(moved)} items into {len(by_user)} user namespaces")
+
+
+async def migrate(batch_size: int = 1000, dry_run: bool = False, namespace: Optional[str] = None) -> Dict[str, int]:
+    stats = {"namespaces": 0, "rewritten": 0, "moved": 0, "already_merged": 0, "skipped": 0, "bytes_before": 0, "bytes_after": 0}
+
+    if namespace is not None:
+        namespaces = [namespace]
+    else:
+        index_stats = await pinecone_service.describe_index_stats()
+        namespaces = list(index_stats.get("namespaces", {}))
+
+    for name in namespaces:
+        stats["namespaces"] += 1
+        if name == LEGACY_ITEM_NAMESPACE:
+            await move_legacy_items(stats, batch_size, dry_run)
+        else:
+            await migrate_namespace(name, stats, batch_size, dry_run)
+
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Migrate Pinecone metadata to the compact per-user schema")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--namespace", default=None, help="Only migrate this namespace")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    stats = asyncio.run(migrate(args.batch_size, args.dry_run, args.namespace))
+    if stats["bytes_before"]:
+        saved = 1 - stats["bytes_after"] / stats["bytes_before"]
+        print(f"📦 Metadata size: {stats['bytes_before']} -> {stats['bytes_after']} bytes ({saved:.0%} smaller)")
+    print(f"📊 Migration finished: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Re-Embedding / Backfill aller Vektoren mit einem (neuen) Embedding-Modell.
+
+    python -m app.jobs.reembed [--model text-embedding-3-small] [--target-url https://neuer-index...]
+                               [--namespace-prefix v2:] [--namespace user@example.com]
+                               [--concurrency 8] [--page-size 100] [--tpm 1000000] [--rpm 3000]
+                               [--checkpoint reembed_checkpoint.json]
+                               [--dry-run] [--restart]
+
+Der Text wird aus den Metadaten rekonstruiert (vector_metadata.embedding_text),
+neu embedded und in den Ziel-Index bzw. Ziel-Namespace upserted. Ohne
+--target-url und --namespace-prefix wird in place überschrieben.
+
+Seiten werden parallel verarbeitet (--concurrency). Der Checkpoint speichert
+pro Namespace das Pagination-Token hinter der letzten lückenlos fertigen Seite;
+nach einem Abbruch geht es dort weiter (Upserts sind idempotent).
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from app.config import settings
+from app.core.admission import AdmissionController, Lane
+from app.services.openai_service import embedding_bytes, openai_service
+from app.services.pinecone_service import PineconeService, pinecone_service
+from app.services.vector_metadata import embedding_text
+
+# Pinecone fetch per GET: IDs stehen in der URL
+FETCH_BATCH_SIZE = 100
+MAX_ATTEMPTS = 4
+REPORT_INTERVAL = 10.0
+CHECKPOINT_INTERVAL = 1.0
+
+
+class DimensionMismatch(Exception):
+    """Neues Modell passt nicht zur Dimension des Ziel-Index - Wiederholen hilft nicht"""
+
+
+class Checkpoint:
+    """Fortschritt als JSON-Datei, atomar ersetzt (tmp + os.replace)"""
+
+    def __init__(self, path: str, model: str, target: str, persist: bool = True):
+        self.path = path
+        self.persist = persist
+        self.saved_at = 0.0
+        self.state: Dict[str, Any] = {"model": model, "target": target, "namespaces": {}}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as handle:
+                state = json.load(handle)
+            if state.get("model") != model or state.get("target") != target:
+                raise SystemExit(f"Checkpoint {path} belongs to another run ({state.get('model')} -> {state.get('target')}); use --restart")
+            self.state = state
+
+    def namespace(self, name: str) -> Dict[str, Any]:
+        return self.state["namespaces"].setdefault(name, {"token": None, "done": False, "vectors": 0})
+
+    def save(self, force: bool = True) -> None:
+        # Bei vielen Namespaces wird die Datei groß - nicht nach jeder Seite schreiben
+        if not self.persist or (not force and time.monotonic() - self.saved_at < CHECKPOINT_INTERVAL):
+            return
+        self.saved_at = time.monotonic()
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as handle:
+            json.dump(self.state, handle)
+        os.replace(tmp, self.path)
+
+
+class Progress:
+    def __init__(self, total: int):
+        self.total = total
+        self.started = time.perf_counter()
+        self.last_report = self.started
+        self.stats = {"vectors": 0, "skipped": 0, "tokens": 0}
+
+    def report(self, force: bool = False) -> None:
+        now = time.perf_counter()
+        if not force and now - self.last_report < REPORT_INTERVAL:
+            return
+        self.last_report = now
+        elapsed = max(now - self.started, 1e-9)
+        rate = self.stats["vectors"] / elapsed
+        remaining = max(self.total - self.stats["vectors"] - self.stats["skipped"], 0)
+        eta = f"{remaining / rate / 60:.1f}min" if rate > 0 else "?"
+        print(
+            f"📈 {self.stats['vectors']}/{self.total} vectors, {rate:.0f} vectors/s, "
+            f"{self.stats['tokens'] / elapsed:.0f} tokens/s, ETA {eta}"
+        )
+
+
+class Reembedder:
+    def __init__(self, args: argparse.Namespace, source: PineconeService, target: PineconeService, checkpoint: Checkpoint, progress: Progress):
+        self.args = args
+        self.source = source
+        self.target = target
+        self.checkpoint = checkpoint
+        self.progress = progress
+        self.slots = asyncio.Semaphore(args.concurrency)
+        self.dimension: Optional[int] = None
+
+    async def _embed_page(self, namespace: str, ids: List[str]) -> None:
+        vectors: Dict[str, Dict] = {}
+        for start in range(0, len(ids), FETCH_BATCH_SIZE):
+            chunk = ids[start:start + FETCH_BATCH_SIZE]
+            # Fehler werden durchgereicht; fehlende IDs sind seit dem Listing gelöscht
+            vectors.update(await self.source.fetch_vectors(chunk, namespace))
+
+        texts: Dict[str, str] = {}
+        for vector_id, vector in vectors.items():
+            text = embedding_text(vector.get("metadata") or {})
+            if text:
+                texts[vector_id] = text
+        self.progress.stats["skipped"] += len(ids) - len(texts)
+        if not texts:
+            return
+        if self.args.dry_run:
+            # Nur Texte rekonstruieren - keine Embedding-Kosten, kein Upsert
+            self.progress.stats["vectors"] += len(texts)
+            return
+
+        # Direkt ohne Embedding-Cache: ein Backfill würde ihn nur verdrängen
+        response = await openai_service.create_embeddings(
+            list(texts.values()), model=self.args.model, lane=Lane.BACKGROUND, endpoint="reembed",
+        )
+        self.progress.stats["tokens"] += response.usage.total_tokens if response.usage else 0
+
+        upserts = []
+        for (vector_id, _), item in zip(texts.items(), response.data):
+            values = memoryview(embedding_bytes(item.embedding)).cast("f").tolist()
+            if self.dimension and len(values) != self.dimension:
+                raise DimensionMismatch(f"Embedding dimension {len(values)} does not match target index dimension {self.dimension}")
+            upserts.append({"id": vector_id, "values": values, "metadata": vectors[vector_id].get("metadata") or {}})
+
+        if not await self.target.upsert_vectors(upserts, self.args.namespace_prefix + namespace):
+            raise RuntimeError("upsert failed")
+        self.progress.stats["vectors"] += len(upserts)
+
+    async def _with_retries(self, label: str, call):
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                return await call()
+            except DimensionMismatch:
+                raise
+            except Exception as e:
+                if attempt == MAX_ATTEMPTS - 1:
+                    raise
+                delay = 2 ** attempt
+                print(f"⚠️ {label} failed ({e}), retry in {delay}s")
+                await asyncio.sleep(delay)
+
+    async def _process_page(self, namespace: str, ids: List[str]) -> None:
+        try:
+            await self._with_retries(f"Page in {namespace}", lambda: self._embed_page(namespace, ids))
+        finally:
+            self.slots.release()
+
+    async def run_namespace(self, namespace: str) -> None:
+        state = self.checkpoint.namespace(namespace)
+        if state["done"]:
+            return
+
+        # Seiten in Listen-Reihenfolge; der Checkpoint rückt nur über lückenlos fertige Seiten vor
+        pending: Deque = deque()
+        token = state["token"]
+
+        def advance() -> None:
+            while pending and pending[0][0].done():
+                task, next_token, count = pending.popleft()
+                task.result()
+                state["token"] = next_token
+                state["vectors"] += count
+            self.checkpoint.save(force=False)
+            self.progress.report()
+
+        while True:
+            ids, next_token = await self._with_retries(
+                f"Listing {namespace}", lambda: self.source.list_vector_ids(namespace, self.args.page_size, token)
+            )
+            if ids:
+                await self.slots.acquire()
+                task = asyncio.create_task(self._process_page(namespace, ids))
+                pending.append((task, next_token, len(ids)))
+                advance()
+            if not next_token:
+                break
+            token = next_token
+
+        if pending:
+            await asyncio.gather(*(task for task, _, _ in pending))
+        advance()
+        state["done"] = True
+        self.checkpoint.save()
+        print(f"✅ Namespace {namespace or '(default)'} re-embedded ({state['vectors']} vectors)")
+
+
+async def reembed(args: argparse.Namespace) -> Dict[str, int]:
+    # Der Job läuft allein: Embedding-Limits des Accounts statt des Anteils eines Web-Workers
+    openai_service.admission = AdmissionController(
+        tokens_per_minute=args.tpm, requests_per_minute=args.rpm, max_wait=settings.OPENAI_ADMISSION_MAX_WAIT,
+    )
+    source = pinecone_service
+    target = PineconeService(api_url=args.target_url) if args.target_url else pinecone_service
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    checkpoint = Checkpoint(args.checkpoint, args.model, f"{args.target_url or 'source'}|{args.namespace_prefix}", persist=not args.dry_run)
+
+    source_stats = await source.describe_index_stats()
+    namespaces: Dict[str, Dict] = source_stats.get("namespaces", {})
+    if args.namespace is not None:
+        namespaces = {args.namespace: namespaces.get(args.namespace, {})}
+    elif args.namespace_prefix and target is source:
+        # Bereits geschriebene Ziel-Namespaces im selben Index nicht erneut lesen
+        namespaces = {name: info for name, info in namespaces.items() if not name.startswith(args.namespace_prefix)}
+    total = sum(int(info.get("vectorCount", 0)) for info in namespaces.values())
+    progress = Progress(total)
+
+    reembedder = Reembedder(args, source, target, checkpoint, progress)
+    reembedder.dimension = (await target.describe_index_stats()).get("dimension") if target is not source else source_stats.get("dimension")
+    print(f"🔁 Re-embedding {total} vectors in {len(namespaces)} namespaces with {args.model} (concurrency {args.concurrency})")
+
+    # Ein Namespace pro User: viele kleine Namespaces parallel, die Seiten-Slots begrenzen die Last
+    queue: asyncio.Queue = asyncio.Queue()
+    for namespace in namespaces:
+        queue.put_nowait(namespace)
+
+    async def worker() -> None:
+        while not queue.empty():
+            await reembedder.run_namespace(queue.get_nowait())
+
+    await asyncio.gather(*(worker() for _ in range(min(args.concurrency, len(namespaces)) or 1)))
+    checkpoint.save()
+
+    progress.report(force=True)
+    return {**progress.stats, "namespaces": len(namespaces), "seconds": round(time.perf_counter() - progress.started, 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Re-embed all Pinecone vectors with a new embedding model")
+    parser.add_argument("--model", default=settings.EMBEDDING_MODEL)
+    parser.add_argument("--target-url", default=None, help="Pinecone index host to write to (default: source index)")
+    parser.add_argument("--namespace-prefix", default="", help="Write into <prefix><namespace>")
+    parser.add_argument("--namespace", default=None, help="Only re-embed this namespace")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--tpm", type=int, default=settings.OPENAI_TPM_LIMIT, help="Embedding tokens per minute for this job")
+    parser.add_argument("--rpm", type=int, default=settings.OPENAI_RPM_LIMIT, help="Embedding requests per minute for this job")
+    parser.add_argument("--checkpoint", default="reembed_checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    stats = asyncio.run(reembed(args))
+    print(f"📊 Re-embedding finished: {stats}")
+
+
+if __name__ == "__main__":
+    main()
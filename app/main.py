@@ -1,21 +1,27 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-import firebase_admin
-from firebase_admin import credentials
-import json
 
 # API Routes
+from app.api import debug, profiler as profiler_api
 from app.api.ai import embeddings
-from app.api.v1 import chat, generate_shopping_list
+from app.api.v1 import autocomplete, chat, generate_shopping_list, recipes, shopping, supermarkets
 
 # Config
 from app.config import settings
+from app.core.body_limit import BodySizeLimitMiddleware
+from app.core.compression import CompressionMiddleware
+from app.core.deadline import DeadlineMiddleware
+from app.core.profiler import ProfilingMiddleware, profiler
+from app.core.responses import FastJSONResponse
+from app.database import initialize_firebase
+from app.services.openai_service import llm_ledger
 
 # FastAPI App
 app = FastAPI(
     title="ShoppiQ Backend",
     description="AI-Powered Shopping Assistant Backend",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
 # CORS Middleware
@@ -25,40 +31,55 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],  # Delta-Sync der Einkaufslisten (If-None-Match / If-Match)
 )
 
-# Firebase Initialization
-def initialize_firebase():
-    try:
-        if not firebase_admin._apps:
-            # Firebase Credentials aus Environment Variables
-            firebase_config = {
-                "type": "service_account",
-                "project_id": settings.FIREBASE_PROJECT_ID,
-                "private_key_id": settings.FIREBASE_PRIVATE_KEY_ID,
-                "private_key": settings.FIREBASE_PRIVATE_KEY,
-                "client_email": settings.FIREBASE_CLIENT_EMAIL,
-                "client_id": settings.FIREBASE_CLIENT_ID,
-                "auth_uri": settings.FIREBASE_AUTH_URI,
-                "token_uri": settings.FIREBASE_TOKEN_URI,
-                "client_x509_cert_url": settings.FIREBASE_CLIENT_CERT_URL
-            }
-            
-            cred = credentials.Certificate(firebase_config)
-            firebase_admin.initialize_app(cred)
-            print("✅ Firebase initialized successfully")
-    except Exception as e:
-        print(f"❌ Firebase initialization error: {e}")
+# Response-Kompression (br/gzip je nach Accept-Encoding)
+app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MINIMUM_SIZE)
+
+# Zuordnung von Requests zum Sampling-Profiler (innerhalb der Deadline-Middleware, damit der Handler-Task zählt)
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+# Request-Deadlines + Abbruch bei Client-Disconnect
+app.add_middleware(
+    DeadlineMiddleware,
+    default_timeout=settings.REQUEST_TIMEOUT,
+    max_timeout=settings.REQUEST_TIMEOUT_MAX,
+    route_timeouts={
+        "/api/v1/shopping-list-chat": settings.REQUEST_TIMEOUT,
+        "/api/v1/shopping-list-suggestions": settings.REQUEST_TIMEOUT,
+        "/api/v1/generate-shopping-list": settings.GENERATE_REQUEST_TIMEOUT,
+    },
+)
+
+# Zu große Bodies ablehnen, bevor die Deadline-Middleware sie puffert (äußerste Middleware)
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_bytes=settings.MAX_REQUEST_BODY_BYTES,
+    route_limits={"/api/ai/embeddings/batch": settings.EMBEDDINGS_MAX_BODY_BYTES},
+)
 
 # Initialize Firebase on startup
 @app.on_event("startup")
 async def startup_event():
     initialize_firebase()
+    llm_ledger.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    profiler.stop()
+    await llm_ledger.stop()
 
 # Include Routers
 app.include_router(embeddings.router, prefix="/api/ai", tags=["AI"])
 app.include_router(chat.router, prefix="/api/v1", tags=["Shopping Chat"])
 app.include_router(generate_shopping_list.router, prefix="/api/v1", tags=["Shopping List"])
+app.include_router(shopping.router, prefix="/api/v1", tags=["Shopping List"])
+app.include_router(supermarkets.router, prefix="/api/v1", tags=["Supermarkets"])
+app.include_router(recipes.router, prefix="/api/v1", tags=["Recipes"])
+app.include_router(autocomplete.router, prefix="/api/v1", tags=["Autocomplete"])
+app.include_router(debug.router, prefix="/debug", tags=["Debug"])
+app.include_router(profiler_api.router, prefix="/debug/profiler", tags=["Debug"])
 
 # Root Endpoints
 @app.get("/")
@@ -10,6 +10,7 @@ class ShoppingItem(BaseModel):
     category: Optional[str] = None
     isChecked: bool = False
     supermarkt: Optional[str] = None
+    version: int = 0  # Listen-Version der letzten Änderung (0 = vor Delta-Sync)
 
 class Supermarket(BaseModel):
     uuid: str
@@ -18,6 +19,8 @@ class Supermarket(BaseModel):
     placeId: str
     latitude: Optional[float] = None
     longitude: Optional[float] = None
+    user_email: Optional[str] = None
+    categories: Optional[List[str]] = None  # None = Vollsortiment
 
 class ShoppingList(BaseModel):
     uuid: str
@@ -26,6 +29,9 @@ class ShoppingList(BaseModel):
     created_at: datetime
     updated_at: datetime
     user_email: str
+    version: int = 0
+    tombstones: Dict[str, int] = {}  # gelöschte Item-UUID -> Version der Löschung
+    tombstone_floor: int = 0  # ältere Löschungen sind verworfen - Clients davor brauchen einen vollen Sync
 
 class Recipe(BaseModel):
     uuid: str
@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+from typing import Dict, Optional
+
+class PurchaseStats(BaseModel):
+    """Aggregierte Kaufhistorie eines Produkts"""
+    name: str  # Anzeigename (zuletzt verwendete Schreibweise)
+    count: int = 0
+    total_quantity: int = 0
+    last_seen: float = 0.0  # Unix Timestamp
+    category: Optional[str] = None
+    supermarkets: Dict[str, int] = {}
+
+    @property
+    def typical_quantity(self) -> int:
+        return max(1, round(self.total_quantity / self.count)) if self.count else 1
+
+    @property
+    def preferred_supermarket(self) -> Optional[str]:
+        if not self.supermarkets:
+            return None
+        return max(self.supermarkets.items(), key=lambda entry: entry[1])[0]
+
+class PurchaseProfile(BaseModel):
+    user_email: str
+    items: Dict[str, PurchaseStats] = {}  # Key: normalisierter Produktname
+    updated_at: float = 0.0
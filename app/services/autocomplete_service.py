@@ -0,0 +1,271 @@
+import asyncio
+import math
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.config import settings
+from app.core.text import normalize_product_name
+from app.models.user import PurchaseProfile, PurchaseStats
+from app.services.purchase_profile_service import _score, purchase_profile_service
+from app.services.supermarket_index import SpatialIndex, supermarket_index_service
+
+ITEM = "item"
+SUPERMARKET = "supermarket"
+
+# Gewichtung der Trefferart: Anfang des Namens > Anfang eines Worts > Trigramm (Infix, Tippfehler)
+NAME_PREFIX_QUALITY = 1.0
+WORD_PREFIX_QUALITY = 0.8
+TRIGRAM_QUALITY = 0.6
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[index:index + 3] for index in range(len(text) - 2)}
+
+
+@dataclass
+class Suggestion:
+    key: str
+    kind: str
+    name: str
+    count: float
+    last_seen: Optional[float] = None  # ohne Zeitstempel kein Recency-Decay (Supermärkte)
+    category: Optional[str] = None
+    quantity: Optional[int] = None
+    supermarket: Optional[str] = None
+
+
+@dataclass
+class Completion:
+    suggestion: Suggestion
+    score: float
+    match: str
+
+
+class PrefixIndex:
+    """
+    Prefix- und Trigramm-Index über Produkt- und Supermarktnamen eines Users.
+    Präfixe laufen über eine sortierte Liste (name, id) und bisect - für den
+    ganzen Namen und jeden Wortanfang ("bio vollmilch" findet auch "voll").
+    Trigramme decken Infixe ("milch" -> "Hafermilch") und einfache Tippfehler ab.
+    Einträge werden einzeln hinzugefügt und entfernt.
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, Suggestion] = {}
+        self._terms: List[Tuple[str, str]] = []
+        self._trigrams: Dict[str, Set[str]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def _entry_id(kind: str, key: str) -> str:
+        return f"{kind}:{key}"
+
+    @staticmethod
+    def _entry_terms(key: str) -> List[str]:
+        words = key.split(" ")
+        return [" ".join(words[index:]) for index in range(len(words))]
+
+    def upsert(self, suggestion: Suggestion) -> None:
+        entry_id = self._entry_id(suggestion.kind, suggestion.key)
+        if entry_id in self.entries:
+            # Name und Schlüssel bleiben gleich - nur Gewicht und Details aktualisieren
+            self.entries[entry_id] = suggestion
+            return
+        self.entries[entry_id] = suggestion
+        for term in self._entry_terms(suggestion.key):
+            insort(self._terms, (term, entry_id))
+        for gram in trigrams(suggestion.key):
+            self._trigrams[gram].add(entry_id)
+
+    def remove(self, kind: str, key: str) -> None:
+        entry_id = self._entry_id(kind, key)
+        if self.entries.pop(entry_id, None) is None:
+            return
+        for term in self._entry_terms(key):
+            position = bisect_left(self._terms, (term, entry_id))
+            if position < len(self._terms) and self._terms[position] == (term, entry_id):
+                del self._terms[position]
+        for gram in trigrams(key):
+            ids = self._trigrams.get(gram)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._trigrams[gram]
+
+    def keys(self, kind: str) -> Set[str]:
+        return {suggestion.key for suggestion in self.entries.values() if suggestion.kind == kind}
+
+    def search(self, query: str, limit: int = 10, kind: Optional[str] = None) -> List[Completion]:
+        """Treffer nach Trefferart x (1 + log(1 + Gewicht)) sortiert; Gewicht = Häufigkeit mit Recency-Decay"""
+        if not query:
+            return []
+        now = time.time()
+
+        matches: Dict[str, Tuple[float, str]] = {}
+        position = bisect_left(self._terms, (query,))
+        while position < len(self._terms) and self._terms[position][0].startswith(query):
+            term, entry_id = self._terms[position]
+            position += 1
+            quality = NAME_PREFIX_QUALITY if term == self.entries[entry_id].key else WORD_PREFIX_QUALITY
+            if quality > matches.get(entry_id, (0.0, ""))[0]:
+                matches[entry_id] = (quality, "prefix" if quality == NAME_PREFIX_QUALITY else "word")
+
+        # Trigramme nur, wenn die Präfixe nicht reichen
+        query_grams = trigrams(query)
+        if len(matches) < limit and query_grams:
+            shared: Dict[str, int] = defaultdict(int)
+            for gram in query_grams:
+                for entry_id in self._trigrams.get(gram, ()):
+                    shared[entry_id] += 1
+            for entry_id, count in shared.items():
+                similarity = count / len(query_grams)
+                if entry_id not in matches and similarity >= settings.AUTOCOMPLETE_MIN_SIMILARITY:
+                    matches[entry_id] = (TRIGRAM_QUALITY * similarity, "fuzzy")
+
+        completions = []
+        for entry_id, (quality, match) in matches.items():
+            suggestion = self.entries[entry_id]
+            if kind and suggestion.kind != kind:
+                continue
+            weight = _score(suggestion, now) if suggestion.last_seen is not None else suggestion.count
+            completions.append(Completion(suggestion, quality * (1 + math.log1p(weight)), match))
+        completions.sort(key=lambda completion: (-completion.score, completion.suggestion.name))
+        return completions[:limit]
+
+
+def _item_suggestion(key: str, stats: PurchaseStats) -> Suggestion:
+    return Suggestion(
+        key=key,
+        kind=ITEM,
+        name=stats.name,
+        count=stats.count,
+        last_seen=stats.last_seen,
+        category=stats.category,
+        quantity=stats.typical_quantity,
+        supermarket=stats.preferred_supermarket,
+    )
+
+
+class UserAutocomplete:
+    """Index eines Users plus Sync-Stand gegenüber Kaufprofil und Supermarkt-Index"""
+
+    def __init__(self):
+        self.index = PrefixIndex()
+        self.profile: Optional[PurchaseProfile] = None
+        self.profile_synced_at = 0.0
+        self.markets: Optional[SpatialIndex] = None
+        self.markets_version = -1
+        self.recorded: Dict[str, PurchaseStats] = {}  # Items aus Listen, die (noch) nicht im Profil sind
+
+    def sync_profile(self, profile: PurchaseProfile) -> bool:
+        """Nur Produkte übernehmen, die seit dem letzten Sync gesehen wurden; verdrängte entfernen"""
+        if profile is self.profile and profile.updated_at <= self.profile_synced_at:
+            return False
+        since = self.profile_synced_at if profile is self.profile else -1.0
+
+        for key, stats in profile.items.items():
+            if stats.last_seen > since:
+                self.recorded.pop(key, None)
+                self.index.upsert(_item_suggestion(key, stats))
+        for key in self.index.keys(ITEM) - set(profile.items) - set(self.recorded):
+            self.index.remove(ITEM, key)
+
+        self.profile = profile
+        self.profile_synced_at = profile.updated_at
+        return True
+
+    def sync_markets(self, markets: SpatialIndex, profile: PurchaseProfile, profile_changed: bool = False) -> None:
+        if markets is self.markets and markets.version == self.markets_version and not profile_changed:
+            return
+        # Gewicht eines Markts: wie oft Produkte dort gekauft wurden
+        usage: Dict[str, int] = defaultdict(int)
+        for stats in profile.items.values():
+            for name, count in stats.supermarkets.items():
+                usage[normalize_product_name(name)] += count
+
+        current = set()
+        for market in markets.markets.values():
+            key = normalize_product_name(market.name)
+            if not key:
+                continue
+            current.add(key)
+            self.index.upsert(Suggestion(key=key, kind=SUPERMARKET, name=market.name, count=usage.get(key, 0)))
+        for key in self.index.keys(SUPERMARKET) - current:
+            self.index.remove(SUPERMARKET, key)
+
+        self.markets = markets
+        self.markets_version = markets.version
+
+
+class AutocompleteService:
+    """
+    Autocomplete für Produktnamen und Supermärkte aus der Historie des Users,
+    ohne Embedding und Vektor-Query. Der Index liegt pro User im Speicher
+    (LRU) und wird bei jeder Anfrage inkrementell mit Kaufprofil und
+    Supermarkt-Index abgeglichen.
+    """
+
+    def __init__(self, max_users: int = 1000):
+        self.max_users = max_users
+        self._users: "OrderedDict[str, UserAutocomplete]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _lock(self, user_email: str) -> asyncio.Lock:
+        lock = self._locks.get(user_email)
+        if lock is None:
+            lock = self._locks[user_email] = asyncio.Lock()
+        return lock
+
+    def _user(self, user_email: str) -> UserAutocomplete:
+        user = self._users.get(user_email)
+        if user is None:
+            user = self._users[user_email] = UserAutocomplete()
+            while len(self._users) > self.max_users:
+                evicted, _ = self._users.popitem(last=False)
+                self._locks.pop(evicted, None)
+        self._users.move_to_end(user_email)
+        return user
+
+    async def get_index(self, user_email: str) -> PrefixIndex:
+        async with self._lock(user_email):
+            # Beide Quellen sind nach dem ersten Laden In-Memory
+            profile = await purchase_profile_service.get_profile(user_email)
+            markets = await supermarket_index_service.get_index(user_email)
+            user = self._user(user_email)
+            profile_changed = user.sync_profile(profile)
+            user.sync_markets(markets, profile, profile_changed)
+            return user.index
+
+    async def complete(self, user_email: str, query: str, limit: int = 10, kind: Optional[str] = None) -> List[Completion]:
+        index = await self.get_index(user_email)
+        return index.search(normalize_product_name(query), limit, kind)
+
+    def record(self, user_email: str, items: List[Dict[str, Any]]) -> None:
+        """
+        Neu auf Listen gesetzte Items sofort vorschlagen (nur bereits geladene
+        User; sonst baut sie der nächste Aufruf ohnehin aus dem Profil).
+        """
+        user = self._users.get(user_email)
+        if user is None:
+            return
+        now = time.time()
+        for item in items:
+            key = normalize_product_name(item.get("name") or "")
+            if not key or (user.profile is not None and key in user.profile.items):
+                continue
+            stats = user.recorded.get(key) or PurchaseStats(name=item["name"])
+            stats.count += 1
+            stats.total_quantity += max(1, int(item.get("quantity") or 1))
+            stats.last_seen = now
+            stats.category = item.get("category") or stats.category
+            user.recorded[key] = stats
+            user.index.upsert(_item_suggestion(key, stats))
+
+
+# Service Instanz
+autocomplete_service = AutocompleteService()
@@ -0,0 +1,116 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.core.admission import Lane
+from app.core.cache import create_cache
+from app.core.text import normalize_product_name
+from app.services.item_history_service import ITEM_EMBEDDING_MODEL
+from app.services.openai_service import openai_service
+
+DEFAULT_CATEGORY = "Sonstiges"
+
+# Feste Kategorien der App mit typischen Produkten als Stützpunkte für die Zentroide
+CATEGORY_EXAMPLES: Dict[str, List[str]] = {
+    "Obst & Gemüse": ["Äpfel", "Bananen", "Tomaten", "Gurke", "Kartoffeln", "Zwiebeln", "Paprika", "Salat", "Karotten", "Zitronen"],
+    "Fleisch & Fisch": ["Hähnchenbrust", "Hackfleisch", "Lachs", "Schweineschnitzel", "Rinderhack", "Salami", "Kochschinken", "Thunfisch", "Bratwurst"],
+    "Milchprodukte": ["Milch", "Butter", "Joghurt", "Käse", "Quark", "Sahne", "Frischkäse", "Mozzarella", "Eier"],
+    "Getränke": ["Mineralwasser", "Orangensaft", "Cola", "Bier", "Apfelschorle", "Kaffee", "Tee", "Rotwein", "Limonade"],
+    "Brot & Backwaren": ["Brot", "Brötchen", "Toastbrot", "Vollkornbrot", "Croissants", "Baguette", "Knäckebrot", "Brezeln"],
+    "Tiefkühlkost": ["Tiefkühlpizza", "Fischstäbchen", "TK-Erbsen", "Pommes frites", "Eiscreme", "TK-Spinat", "Tiefkühlbeeren"],
+    "Konserven": ["Dosentomaten", "Kidneybohnen", "Mais aus der Dose", "Kichererbsen", "Thunfisch in Dose", "Passierte Tomaten", "Nudeln", "Reis", "Mehl"],
+    "Süßwaren": ["Schokolade", "Gummibärchen", "Kekse", "Chips", "Müsliriegel", "Pralinen", "Nutella"],
+    "Haushaltsartikel": ["Toilettenpapier", "Spülmittel", "Waschmittel", "Müllbeutel", "Küchenrolle", "Zahnpasta", "Duschgel", "Schwämme"],
+    DEFAULT_CATEGORY: ["Batterien", "Blumen", "Geschenkpapier", "Zeitschrift", "Grillkohle"],
+}
+CATEGORIES = list(CATEGORY_EXAMPLES)
+
+# Zuordnung Name -> Kategorie, geteilt über alle Worker
+category_cache = create_cache("categories", settings.SHARED_CACHE_PATH, max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES, max_bytes=settings.EMBEDDING_CACHE_MAX_BYTES)
+
+
+class CategoryClassifier:
+    """
+    Lokale Kategorisierung von Produkten: das Embedding des Namens wird gegen
+    je einen Zentroid pro Kategorie gescored (eine Matrixmultiplikation pro Batch).
+    Ergebnisse werden pro normalisiertem Namen gecacht.
+    """
+
+    def __init__(self):
+        self._centroids: Optional[np.ndarray] = None
+        self._lock = asyncio.Lock()
+
+    async def _ensure_centroids(self) -> np.ndarray:
+        if self._centroids is not None:
+            return self._centroids
+        async with self._lock:
+            if self._centroids is None:
+                examples = [(category, name) for category, names in CATEGORY_EXAMPLES.items() for name in names]
+                embeddings, _ = await openai_service.embed(
+                    [name for _, name in examples], model=ITEM_EMBEDDING_MODEL,
+                    lane=Lane.BACKGROUND, endpoint="category-classifier",
+                )
+                vectors = np.asarray(embeddings, dtype=np.float32)
+                vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+
+                labels = np.array([CATEGORIES.index(category) for category, _ in examples])
+                centroids = np.stack([vectors[labels == index].mean(axis=0) for index in range(len(CATEGORIES))])
+                centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+                self._centroids = centroids
+        return self._centroids
+
+    def score(self, embeddings: np.ndarray) -> List[str]:
+        """Kategorien für eine (n, d) Matrix von Embeddings"""
+        vectors = embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-12)
+        similarities = vectors @ self._centroids.T
+        best = similarities.argmax(axis=1)
+        confident = similarities[np.arange(len(best)), best] >= settings.CATEGORY_MIN_SIMILARITY
+        return [CATEGORIES[index] if ok else DEFAULT_CATEGORY for index, ok in zip(best, confident)]
+
+    async def classify(self, names: List[str]) -> List[str]:
+        """Kategorie pro Produktname (Cache, sonst Embedding + Zentroid-Scoring)"""
+        keys = [normalize_product_name(name) for name in names]
+        cached = await category_cache.get_many([key for key in set(keys) if key])
+        result = {key: value.decode("utf-8") for key, value in cached.items()}
+
+        missing = [key for key in dict.fromkeys(keys) if key and key not in result]
+        if missing:
+            await self._ensure_centroids()
+            embeddings, _ = await openai_service.embed(
+                missing, model=ITEM_EMBEDDING_MODEL, lane=Lane.INTERACTIVE, endpoint="category-classifier",
+            )
+            categories = self.score(np.asarray(embeddings, dtype=np.float32))
+            fresh = dict(zip(missing, categories))
+            await category_cache.set_many({key: category.encode("utf-8") for key, category in fresh.items()})
+            result.update(fresh)
+
+        return [result.get(key, DEFAULT_CATEGORY) for key in keys]
+
+    async def fill_categories(self, items: List[Any]) -> int:
+        """Fehlende Kategorien setzen (dicts oder Pydantic Models); gibt die Anzahl zurück"""
+        def _get(item, key):
+            return item.get(key) if isinstance(item, dict) else getattr(item, key, None)
+
+        targets = [item for item in items if _get(item, "name") and not _get(item, "category")]
+        if not targets:
+            return 0
+
+        try:
+            categories = await self.classify([_get(item, "name") for item in targets])
+        except Exception as e:
+            print(f"⚠️ Category classification failed: {e}")
+            return 0
+
+        for item, category in zip(targets, categories):
+            if isinstance(item, dict):
+                item["category"] = category
+            else:
+                item.category = category
+        print(f"🏷️ Classified {len(targets)} items")
+        return len(targets)
+
+
+# Service Instanz
+category_classifier = CategoryClassifier()
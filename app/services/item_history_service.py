@@ -0,0 +1,128 @@
+import hashlib
+import time
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.core.text import normalize_product_name
+from app.services.openai_service import openai_service
+from app.services.pinecone_service import pinecone_service
+from app.services.vector_metadata import TYPE_CODES, compact_metadata, embedding_text
+
+# Altes Schema: generierte Items aller User im Default Namespace
+LEGACY_ITEM_NAMESPACE = ""
+# Gleiches Modell wie für Queries, sonst sind die Scores nicht vergleichbar
+ITEM_EMBEDDING_MODEL = settings.EMBEDDING_MODEL
+# Wie viele List-UUIDs pro Produkt in den Metadaten gehalten werden
+MAX_LIST_UUIDS = 20
+
+
+def item_namespace(user_email: str) -> str:
+    """Generierte Items liegen wie alle anderen Vektoren im Namespace des Users"""
+    return user_email
+
+
+def item_vector_id(user_email: str, name: str) -> str:
+    """Deterministische Vector-ID aus User und normalisiertem Produktnamen"""
+    key = f"{user_email.strip().lower()}|{normalize_product_name(name)}"
+    return f"item_{hashlib.sha1(key.encode('utf-8')).hexdigest()}"
+
+
+def merge_item_metadata(
+    existing: Optional[Dict[str, Any]],
+    item: Dict[str, Any],
+    list_uuid: Optional[str],
+    seen_at: int,
+    purchase_count: int = 1,
+) -> Dict[str, Any]:
+    """Metadaten eines Produkts aggregieren (Kaufanzahl, last seen, List-IDs) im kompakten Schema"""
+    metadata = compact_metadata(existing or {})
+
+    list_uuids = list(metadata.get("l", []))
+    if list_uuid and list_uuid not in list_uuids:
+        list_uuids.append(list_uuid)
+
+    metadata.update({
+        "t": TYPE_CODES["shopping_item"],
+        "n": item["name"],
+        "pc": int(metadata.get("pc", 0)) + purchase_count,
+        "fs": min(metadata.get("fs", seen_at), seen_at),
+        "ls": max(metadata.get("ls", seen_at), seen_at),
+        "l": list_uuids[-MAX_LIST_UUIDS:],
+    })
+
+    # Letzte bekannte Werte übernehmen (Pinecone erlaubt keine null-Werte)
+    latest = compact_metadata({key: item.get(key) for key in ("category", "quantity", "estimated_price", "supermarket")})
+    metadata.update(latest)
+
+    return metadata
+
+
+def combine_item_metadata(first: Dict[str, Any], second: Dict[str, Any]) -> Dict[str, Any]:
+    """Zwei kompakte Metadaten desselben Produkts zusammenführen (z.B. beim Namespace-Umzug)"""
+    older, newer = sorted((first, second), key=lambda metadata: metadata.get("ls", 0))
+    combined = {**older, **newer}
+    combined["pc"] = int(older.get("pc", 0)) + int(newer.get("pc", 0))
+    seen = [metadata["fs"] for metadata in (older, newer) if "fs" in metadata]
+    if seen:
+        combined["fs"] = min(seen)
+    combined["l"] = list(dict.fromkeys(older.get("l", []) + newer.get("l", [])))[-MAX_LIST_UUIDS:]
+    return combined
+
+
+class ItemHistoryService:
+    """Dedupliziert gespeicherte Items: ein Vektor pro User und Produkt"""
+
+    async def save_items(self, items: List[Dict[str, Any]], user_email: str, list_uuid: str) -> int:
+        """Items upserten; nur neue Produkte werden embedded. Gibt Anzahl Vektoren zurück."""
+        seen_at = int(time.time())
+        namespace = item_namespace(user_email)
+
+        # Duplikate innerhalb der Liste zusammenfassen
+        items_by_id: Dict[str, Dict[str, Any]] = {}
+        for item in items:
+            if item.get("name"):
+                items_by_id[item_vector_id(user_email, item["name"])] = item
+
+        if not items_by_id:
+            return 0
+
+        existing = await pinecone_service.fetch_vectors(list(items_by_id), namespace)
+
+        # Nur für unbekannte Produkte Embeddings erzeugen (ein Batch-Request)
+        new_ids = [vector_id for vector_id in items_by_id if vector_id not in existing]
+        new_values: Dict[str, List[float]] = {}
+        if new_ids:
+            texts = [
+                embedding_text({"type": "shopping_item", **items_by_id[vector_id]})
+                for vector_id in new_ids
+            ]
+            try:
+                embeddings = await openai_service.get_embeddings_batch(
+                    texts, model=ITEM_EMBEDDING_MODEL, endpoint="item-history", user=user_email
+                )
+                new_values = dict(zip(new_ids, embeddings))
+            except Exception as e:
+                print(f"⚠️ Error creating embeddings for {len(new_ids)} items: {e}")
+
+        vectors = []
+        for vector_id, item in items_by_id.items():
+            current = existing.get(vector_id)
+            values = current.get("values") if current else new_values.get(vector_id)
+            if not values:
+                continue
+            vectors.append({
+                "id": vector_id,
+                "values": values,
+                "metadata": merge_item_metadata(
+                    current.get("metadata") if current else None, item, list_uuid, seen_at
+                ),
+            })
+
+        if vectors and await pinecone_service.upsert_vectors(vectors, namespace):
+            print(f"✅ Upserted {len(vectors)} item vectors to Pinecone ({len(new_ids)} new)")
+            return len(vectors)
+        return 0
+
+
+# Service Instanz
+item_history_service = ItemHistoryService()
@@ -0,0 +1,264 @@
+import asyncio
+import json
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from app.config import settings
+from app.core import deadline
+from app.core.admission import Lane
+from app.core.metrics import metrics
+from app.core.text import normalize_product_name
+from app.services.openai_service import openai_service
+
+DEFAULT_MODEL = "gpt-4o"
+
+# Reihenfolge zählt: die erste passende Route gewinnt, die letzte passt immer
+DEFAULT_ROUTES: List[Dict[str, Any]] = [
+    # Reine Navigation ("zeig mir meine Einkaufsliste") braucht kein großes Modell
+    {"name": "chat-navigation", "model": "gpt-4o-mini", "endpoints": ["shopping-list-chat"],
+     "navigation": True, "intents": ["none"]},
+    # Kurze Fragen zu kleinen Listen
+    {"name": "chat-question", "model": "gpt-4o-mini", "endpoints": ["shopping-list-chat"],
+     "intents": ["none"], "max_list_length": 30, "max_message_length": 200},
+    # Einfache Änderungen an kleinen Listen; bei unparsbarem JSON Fallback auf gpt-4o
+    {"name": "chat-edit-small", "model": "gpt-4o-mini", "endpoints": ["shopping-list-chat"],
+     "intents": ["added", "removed", "modified"], "max_list_length": 15, "max_message_length": 300},
+    {"name": "suggestions-small", "model": "gpt-4o-mini", "endpoints": ["shopping-list-suggestions"],
+     "max_list_length": 20},
+    # Generierung bleibt auf gpt-4o, ein Teil wird mit gpt-4o-mini verglichen
+    {"name": "generate", "model": "gpt-4o", "endpoints": ["generate-shopping-list"],
+     "shadow_model": "gpt-4o-mini", "shadow_rate": 0.05},
+    {"name": "default", "model": DEFAULT_MODEL},
+]
+
+
+@dataclass
+class RouteSignals:
+    """Signale, aus denen das Modell pro Request gewählt wird"""
+    endpoint: str
+    list_length: int = 0
+    intent: str = "none"  # "added", "removed", "modified", "none"
+    navigation: bool = False
+    message_length: int = 0
+
+
+@dataclass
+class Route:
+    name: str
+    model: str
+    endpoints: Optional[List[str]] = None
+    intents: Optional[List[str]] = None
+    navigation: Optional[bool] = None
+    max_list_length: Optional[int] = None
+    max_message_length: Optional[int] = None
+    fallback_model: Optional[str] = DEFAULT_MODEL
+    shadow_model: Optional[str] = None
+    shadow_rate: float = 0.0
+
+    def __post_init__(self):
+        # MODEL_ROUTES kommt als JSON: Typen prüfen, sonst scheitert matches() erst im Request
+        for name in ("name", "model"):
+            if not isinstance(getattr(self, name), str):
+                raise TypeError(f"{name} must be a string")
+        for name in ("fallback_model", "shadow_model"):
+            if getattr(self, name) is not None and not isinstance(getattr(self, name), str):
+                raise TypeError(f"{name} must be a string")
+        for name in ("endpoints", "intents"):
+            value = getattr(self, name)
+            if value is not None and (not isinstance(value, list) or not all(isinstance(v, str) for v in value)):
+                raise TypeError(f"{name} must be a list of strings")
+        if self.navigation is not None and not isinstance(self.navigation, bool):
+            raise TypeError("navigation must be a boolean")
+        for name in ("max_list_length", "max_message_length"):
+            value = getattr(self, name)
+            if value is not None and (isinstance(value, bool) or not isinstance(value, int)):
+                raise TypeError(f"{name} must be an integer")
+        if isinstance(self.shadow_rate, bool) or not isinstance(self.shadow_rate, (int, float)):
+            raise TypeError("shadow_rate must be a number")
+        if not 0.0 <= self.shadow_rate <= 1.0:
+            raise ValueError("shadow_rate must be between 0 and 1")
+        self.shadow_rate = float(self.shadow_rate)
+
+    def matches(self, signals: RouteSignals) -> bool:
+        if self.endpoints is not None and signals.endpoint not in self.endpoints:
+            return False
+        if self.intents is not None and signals.intent not in self.intents:
+            return False
+        if self.navigation is not None and signals.navigation != self.navigation:
+            return False
+        if self.max_list_length is not None and signals.list_length > self.max_list_length:
+            return False
+        if self.max_message_length is not None and signals.message_length > self.max_message_length:
+            return False
+        return True
+
+
+@dataclass
+class RoutedCompletion:
+    content: str
+    model: str
+    route: str
+    fell_back: bool = False
+    response: Any = field(default=None, repr=False)
+
+
+def load_routes(raw: Optional[str] = None) -> List[Route]:
+    """
+    Routen aus MODEL_ROUTES (JSON-Liste) oder die Defaults. Eine fehlerhafte
+    Konfiguration darf den Start nicht verhindern: dann gelten die Defaults.
+    """
+    routes = [Route(**spec) for spec in DEFAULT_ROUTES]
+    if raw:
+        try:
+            specs = json.loads(raw)
+            if not isinstance(specs, list):
+                raise ValueError("expected a JSON list of routes")
+        except ValueError as e:  # json.JSONDecodeError ist ein ValueError
+            print(f"⚠️ Invalid MODEL_ROUTES, using defaults: {e}")
+            specs = None
+
+        configured = []
+        for index, spec in enumerate(specs or []):
+            try:
+                configured.append(Route(**spec))
+            except (TypeError, ValueError) as e:
+                print(f"⚠️ Invalid route #{index} in MODEL_ROUTES ({e}), using defaults")
+                configured = []
+                break
+        routes = configured or routes
+    # Ohne Catch-all Route landet alles auf dem Default-Modell
+    if not routes or not routes[-1].matches(RouteSignals(endpoint="")):
+        routes.append(Route(name="default", model=DEFAULT_MODEL))
+    return routes
+
+
+def _item_names(text: str) -> Optional[Set[str]]:
+    start, end = text.find("["), text.rfind("]") + 1
+    if start == -1 or end == 0:
+        return None
+    try:
+        items = json.loads(text[start:end])
+    except json.JSONDecodeError:
+        return None
+    return {normalize_product_name(item.get("name", "")) for item in items if isinstance(item, dict)}
+
+
+def response_agreement(primary: str, shadow: str) -> float:
+    """Übereinstimmung zweier Antworten (0..1): Jaccard über Item-Namen bzw. Wörter"""
+    left, right = _item_names(primary), _item_names(shadow)
+    if left is None or right is None:
+        left = set(re.findall(r"\w+", primary.lower()))
+        right = set(re.findall(r"\w+", shadow.lower()))
+    if not left and not right:
+        return 1.0
+    return len(left & right) / len(left | right)
+
+
+class ModelRouter:
+    """
+    Wählt das Modell pro LLM-Call anhand von Endpoint, Listenlänge, Intent und
+    Nachrichtenlänge. Ist die Antwort des kleinen Modells unbrauchbar, wird mit
+    dem Fallback-Modell wiederholt. Optional läuft ein Shadow-Call in der
+    BACKGROUND-Lane mit, dessen Übereinstimmung als Metrik erfasst wird.
+    """
+
+    def __init__(self, routes: List[Route]):
+        self.routes = routes
+        self._shadow_tasks: Set[asyncio.Task] = set()
+
+    def select(self, signals: RouteSignals) -> Route:
+        for route in self.routes:
+            if route.matches(signals):
+                return route
+        return self.routes[-1]
+
+    async def _call(self, route: Route, model: str, messages: List[Dict[str, str]], **kwargs) -> Any:
+        start = time.perf_counter()
+        try:
+            return await openai_service.chat_completion(model=model, messages=messages, **kwargs)
+        finally:
+            metrics.observe("model_route_latency_ms", (time.perf_counter() - start) * 1000, route=route.name, model=model)
+
+    async def complete(
+        self,
+        signals: RouteSignals,
+        messages: List[Dict[str, str]],
+        validate: Optional[Callable[[str], bool]] = None,
+        lane: Lane = Lane.INTERACTIVE,
+        user: Optional[str] = None,
+        **kwargs: Any,
+    ) -> RoutedCompletion:
+        """Chat Completion über die passende Route (inkl. Fallback und Shadow)"""
+        route = self.select(signals)
+        metrics.increment("model_route_requests_total", route=route.name, model=route.model)
+
+        response = await self._call(route, route.model, messages, lane=lane, endpoint=signals.endpoint, user=user, **kwargs)
+        result = RoutedCompletion(response.choices[0].message.content or "", route.model, route.name, response=response)
+
+        if validate and not validate(result.content) and route.fallback_model and route.fallback_model != route.model:
+            print(f"⚠️ Route '{route.name}': {route.model} response invalid, falling back to {route.fallback_model}")
+            metrics.increment("model_route_fallbacks_total", route=route.name, model=route.model)
+            response = await self._call(route, route.fallback_model, messages, lane=lane, endpoint=signals.endpoint, user=user, **kwargs)
+            result = RoutedCompletion(
+                response.choices[0].message.content or "", route.fallback_model, route.name, fell_back=True, response=response
+            )
+
+        if route.shadow_model and random.random() < route.shadow_rate:
+            task = asyncio.create_task(self._shadow(route, signals, messages, result, user, kwargs))
+            self._shadow_tasks.add(task)
+            task.add_done_callback(self._shadow_tasks.discard)
+
+        return result
+
+    async def _shadow(self, route: Route, signals: RouteSignals, messages: List[Dict[str, str]], primary: RoutedCompletion, user: Optional[str], kwargs: Dict[str, Any]) -> None:
+        """Shadow-Vergleich: gleiche Anfrage mit dem Shadow-Modell, Ergebnis nur als Metrik"""
+        # Läuft nach der Response weiter - nicht an die Deadline des Requests gebunden
+        deadline.clear()
+        try:
+            start = time.perf_counter()
+            response = await openai_service.chat_completion(
+                model=route.shadow_model, messages=messages, lane=Lane.BACKGROUND,
+                endpoint=f"{signals.endpoint}:shadow", user=user, **kwargs,
+            )
+            metrics.observe("model_shadow_latency_ms", (time.perf_counter() - start) * 1000, route=route.name, model=route.shadow_model)
+            agreement = response_agreement(primary.content, response.choices[0].message.content or "")
+            metrics.observe("model_shadow_agreement", agreement, route=route.name, model=route.shadow_model)
+        except Exception as e:
+            metrics.increment("model_shadow_errors_total", route=route.name)
+            print(f"⚠️ Shadow call for route '{route.name}' failed: {e}")
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Routen mit Request-, Fallback- und Latenz-Kennzahlen"""
+        snapshot = metrics.snapshot()
+        requests = snapshot["counters"].get("model_route_requests_total", {})
+        fallbacks = snapshot["counters"].get("model_route_fallbacks_total", {})
+        latencies = snapshot["histograms"].get("model_route_latency_ms", {})
+        agreements = snapshot["histograms"].get("model_shadow_agreement", {})
+
+        result = []
+        for route in self.routes:
+            label = f"model={route.model},route={route.name}"
+            total = requests.get(label, 0)
+            fallback_count = fallbacks.get(label, 0)
+            shadow = agreements.get(f"model={route.shadow_model},route={route.name}") if route.shadow_model else None
+            result.append({
+                "route": route.name,
+                "model": route.model,
+                "fallback_model": route.fallback_model,
+                "requests": total,
+                "fallbacks": fallback_count,
+                "fallback_rate": round(fallback_count / total, 3) if total else 0.0,
+                "latency_ms": {
+                    key.split(",")[0].split("=", 1)[1]: summary
+                    for key, summary in latencies.items() if key.endswith(f"route={route.name}")
+                },
+                "shadow": {"model": route.shadow_model, "rate": route.shadow_rate, "agreement": shadow} if route.shadow_model else None,
+            })
+        return result
+
+
+# Router Instanz
+model_router = ModelRouter(load_routes(settings.MODEL_ROUTES))
@@ -1,21 +1,272 @@
-from openai import OpenAI
-from typing import List
+import asyncio
+import base64
+import hashlib
+import os
+import time
+from array import array
+from openai import AsyncOpenAI
+from typing import Dict, List, Optional, Tuple, Union
 from app.config import settings
+from app.core import deadline
+from app.core.admission import AdmissionController, AdmissionTimeout, Lane, estimate_tokens
+from app.core.deadline import DeadlineExceeded
+from app.core.metrics import metrics
+from app.core.cache import create_cache
+from app.core.llm_ledger import LLMLedger, cached_prompt_tokens
+
+# Limits der Embeddings API pro Request (Inputs, Tokens gesamt) und pro Input (8191 Tokens).
+# Byte-Level BPE erzeugt nie mehr Tokens als UTF-8 Bytes - Byte-Längen sind damit eine
+# sichere Obergrenze, auch für Ziffern, CJK oder Emoji
+EMBEDDING_MAX_BATCH_INPUTS = 2048
+EMBEDDING_MAX_BATCH_TOKENS = 300_000
+EMBEDDING_MAX_INPUT_BYTES = 8191
+EMBEDDING_MAX_INPUT_CHARS = 8000  # schnelle Vorprüfung der API; maßgeblich sind die Bytes
+
+# Embeddings sind deterministisch - Cache ohne TTL, geteilt über alle Worker
+embedding_cache = create_cache("embeddings", settings.SHARED_CACHE_PATH, max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES, max_bytes=settings.EMBEDDING_CACHE_MAX_BYTES)
+
+# Jeder OpenAI-Call wird mit Tokens und Latenz im Ledger festgehalten
+llm_ledger = LLMLedger(settings.LLM_LEDGER_PATH, capacity=settings.LLM_LEDGER_CAPACITY, max_bytes=settings.LLM_LEDGER_MAX_BYTES)
+
+def _embedding_key(model: str, text: str) -> str:
+    if settings.EMBEDDING_DIMENSIONS:
+        model = f"{model}@{settings.EMBEDDING_DIMENSIONS}"
+    return hashlib.sha1(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+def embedding_input_bytes(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+def truncate_embedding_input(text: str) -> str:
+    """Input auf das Token-Limit kürzen (über Bytes, ohne ein Zeichen zu zerschneiden)"""
+    encoded = text.encode("utf-8")
+    if len(encoded) <= EMBEDDING_MAX_INPUT_BYTES:
+        return text
+    return encoded[:EMBEDDING_MAX_INPUT_BYTES].decode("utf-8", errors="ignore")
+
+def embedding_chunks(texts: List[str]) -> List[Tuple[int, int]]:
+    """Batch in zusammenhängende Bereiche (start, end) innerhalb der API-Limits aufteilen"""
+    chunks: List[Tuple[int, int]] = []
+    start, tokens = 0, 0
+    for index, text in enumerate(texts):
+        text_tokens = embedding_input_bytes(text)
+        if index > start and (index - start >= EMBEDDING_MAX_BATCH_INPUTS or tokens + text_tokens > EMBEDDING_MAX_BATCH_TOKENS):
+            chunks.append((start, index))
+            start, tokens = index, 0
+        tokens += text_tokens
+    if start < len(texts):
+        chunks.append((start, len(texts)))
+    return chunks
+
+def embedding_bytes(embedding: Union[str, List[float]]) -> bytes:
+    """Embedding als float32 Bytes - base64 von OpenAI ist bereits genau das"""
+    if isinstance(embedding, str):
+        return base64.b64decode(embedding)
+    return array("f", embedding).tobytes()
 
 class OpenAIService:
+    """
+    Zentraler Zugang zu OpenAI. Jeder Call läuft durch die Admission Control
+    (TPM/RPM Token Bucket mit Prioritäts-Lanes) und landet im LLM-Ledger.
+    """
+
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
-    
-    async def get_embeddings(self, text: str) -> List[float]:
-        """Text zu Embeddings konvertieren"""
+        self._client: Optional[AsyncOpenAI] = None
+        self._client_pid: Optional[int] = None
+        # Account-Limits werden auf die Worker aufgeteilt
+        workers = max(1, settings.WEB_CONCURRENCY)
+        self.admission = AdmissionController(
+            tokens_per_minute=settings.OPENAI_TPM_LIMIT // workers,
+            requests_per_minute=settings.OPENAI_RPM_LIMIT // workers,
+            max_wait=settings.OPENAI_ADMISSION_MAX_WAIT,
+        )
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        """Client lazy pro Prozess erzeugen (sicher nach fork())"""
+        if self._client is None or self._client_pid != os.getpid():
+            self._client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL or None)
+            self._client_pid = os.getpid()
+        return self._client
+
+    def reset(self) -> None:
+        self._client = None
+        self._client_pid = None
+
+    async def _admit(self, estimated_tokens: int, lane: Lane):
+        """Admission, aber nie länger als die Request-Deadline erlaubt"""
+        try:
+            return await self.admission.acquire(estimated_tokens, lane, max_wait=deadline.timeout("admission"))
+        except AdmissionTimeout:
+            left = deadline.remaining()
+            if left is not None and left <= 0.05:
+                metrics.increment("deadline_exceeded_total", stage="admission")
+                raise DeadlineExceeded("admission")
+            raise
+
+    async def chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "gpt-4o",
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        lane: Lane = Lane.INTERACTIVE,
+        endpoint: str = "unknown",
+        user: Optional[str] = None,
+    ):
+        """Chat Completion; gibt die rohe OpenAI Response zurück"""
+        estimated = estimate_tokens(*(message["content"] for message in messages)) + max_tokens
+        queued_at = time.perf_counter()
+        ticket = await self._admit(estimated, lane)
+        started_at = time.perf_counter()
+
+        try:
+            # Restzeit der Request-Deadline (abzüglich Reserve für Persistenz) inkl. SDK-Retries
+            response = await deadline.run("llm", self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens
+            ), reserve=settings.DEADLINE_RESERVE)
+        except (Exception, asyncio.CancelledError):
+            llm_ledger.record(
+                endpoint, model, "chat", user=user,
+                latency_ms=(time.perf_counter() - started_at) * 1000,
+                queue_ms=(started_at - queued_at) * 1000, ok=False,
+            )
+            raise
+
+        usage = response.usage
+        ticket.reconcile(usage.total_tokens if usage else None)
+        llm_ledger.record(
+            endpoint, model, "chat", user=user,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+            cached_tokens=cached_prompt_tokens(usage) if usage else 0,
+            latency_ms=(time.perf_counter() - started_at) * 1000,
+            queue_ms=(started_at - queued_at) * 1000,
+        )
+        return response
+
+    async def create_embeddings(
+        self,
+        input: Union[str, List[str]],
+        model: str = settings.EMBEDDING_MODEL,
+        lane: Lane = Lane.BACKGROUND,
+        endpoint: str = "unknown",
+        user: Optional[str] = None,
+        cache_hits: int = 0,
+    ):
+        """Embeddings; gibt die rohe OpenAI Response zurück (embedding als base64 float32, siehe embedding_bytes)"""
+        texts = [input] if isinstance(input, str) else input
+        queued_at = time.perf_counter()
+        ticket = await self._admit(estimate_tokens(*texts), lane)
+        started_at = time.perf_counter()
+
         try:
-            response = self.client.embeddings.create(
-                model="text-embedding-ada-002",
-                input=text
+            # base64 statt JSON-Floats: spart Parsing und ~1/3 Payload
+            response = await deadline.run("embedding", self.client.embeddings.create(
+                model=model,
+                input=input,
+                encoding_format="base64",
+                extra_body={"dimensions": settings.EMBEDDING_DIMENSIONS} if settings.EMBEDDING_DIMENSIONS else None,
+            ), reserve=settings.DEADLINE_RESERVE)
+        except (Exception, asyncio.CancelledError):
+            llm_ledger.record(
+                endpoint, model, "embedding", user=user, cache_hits=cache_hits,
+                latency_ms=(time.perf_counter() - started_at) * 1000,
+                queue_ms=(started_at - queued_at) * 1000, ok=False,
             )
-            return response.data[0].embedding
+            raise
+
+        usage = response.usage
+        ticket.reconcile(usage.total_tokens if usage else None)
+        llm_ledger.record(
+            endpoint, model, "embedding", user=user,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            cache_hits=cache_hits,
+            latency_ms=(time.perf_counter() - started_at) * 1000,
+            queue_ms=(started_at - queued_at) * 1000,
+        )
+        return response
+
+    async def embed(
+        self,
+        texts: List[str],
+        model: str = settings.EMBEDDING_MODEL,
+        lane: Lane = Lane.BACKGROUND,
+        endpoint: str = "unknown",
+        user: Optional[str] = None,
+    ) -> Tuple[List[List[float]], int]:
+        """Embeddings mit geteiltem Cache; gibt (Embeddings, verbrauchte Tokens) zurück"""
+        if not texts:
+            return [], 0
+
+        # Zu lange Inputs würde die API mit 400 ablehnen (die Endpoints prüfen vorab)
+        texts = [truncate_embedding_input(text) for text in texts]
+        keys = [_embedding_key(model, text) for text in texts]
+        cached = await embedding_cache.get_many(keys)
+
+        # Nur fehlende (deduplizierte) Texte anfragen
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        token_count = 0
+        if missing:
+            # Große Batches in Teil-Requests innerhalb der API-Limits, parallel über die Admission Control
+            missing_keys, missing_texts = list(missing), list(missing.values())
+            chunks = embedding_chunks(missing_texts)
+            responses = await asyncio.gather(*(
+                self.create_embeddings(
+                    missing_texts[start:end], model=model, lane=lane, endpoint=endpoint, user=user,
+                    # Cache-Treffer nur einmal im Ledger zählen
+                    cache_hits=len(texts) - len(missing) if start == 0 else 0,
+                )
+                for start, end in chunks
+            ))
+            fresh = {}
+            for (start, end), response in zip(chunks, responses):
+                token_count += response.usage.total_tokens if response.usage else 0
+                for key, item in zip(missing_keys[start:end], response.data):
+                    fresh[key] = embedding_bytes(item.embedding)
+            await embedding_cache.set_many(fresh)
+            cached.update(fresh)
+        else:
+            # Vollständig aus dem Cache bedient - als Null-Token-Eintrag festhalten
+            llm_ledger.record(endpoint, model, "embedding", user=user, cache_hits=len(texts))
+
+        embeddings = []
+        for key in keys:
+            values = array("f")
+            values.frombytes(cached[key])
+            embeddings.append(values.tolist())
+        return embeddings, token_count
+
+    async def get_embeddings(self, text: str, lane: Lane = Lane.INTERACTIVE, endpoint: str = "unknown", user: Optional[str] = None) -> List[float]:
+        """Text zu Embeddings konvertieren"""
+        try:
+            embeddings, _ = await self.embed([text], model=settings.EMBEDDING_MODEL, lane=lane, endpoint=endpoint, user=user)
+            return embeddings[0]
+        except Exception as e:
+            raise Exception(f"OpenAI Embedding Error: {str(e)}")
+
+    async def get_embeddings_batch(
+        self,
+        texts: List[str],
+        model: str = settings.EMBEDDING_MODEL,
+        lane: Lane = Lane.BACKGROUND,
+        endpoint: str = "unknown",
+        user: Optional[str] = None,
+    ) -> List[List[float]]:
+        """Mehrere Texte in einem Request zu Embeddings konvertieren"""
+        if not texts:
+            return []
+        try:
+            embeddings, _ = await self.embed(texts, model=model, lane=lane, endpoint=endpoint, user=user)
+            return embeddings
         except Exception as e:
             raise Exception(f"OpenAI Embedding Error: {str(e)}")
 
 # Service Instanz
-openai_service = OpenAIService()
\ No newline at end of file
+openai_service = OpenAIService()
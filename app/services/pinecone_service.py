@@ -1,35 +1,71 @@
+import hashlib
 import httpx
 import json
-from typing import List, Dict, Any, Optional
+import os
+from typing import List, Dict, Any, Optional, Tuple
 from app.config import settings
+from app.core import deadline
+from app.core.cache import create_cache
 from app.models.shopping import ShoppingItem, Supermarket, ShoppingList, Recipe, CookingPlan
+from app.services.vector_metadata import compact_metadata, expand_matches, type_filter
+
+# orjson ist optional - Vektor-Payloads (1536 Floats pro Vektor) sind mit der stdlib ~10x langsamer
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# Query-Ergebnisse kurz cachen (Pinecone ist ohnehin eventually consistent), geteilt über alle Worker
+query_cache = create_cache("pinecone_queries", settings.SHARED_CACHE_PATH, ttl=settings.QUERY_CACHE_TTL, max_entries=20000)
 
 class PineconeService:
-    def __init__(self):
-        self.api_key = settings.PINECONE_API_KEY
-        self.api_url = settings.PINECONE_API_URL
+    def __init__(self, api_url: Optional[str] = None, api_key: Optional[str] = None):
+        # Eigener api_url z.B. für einen Ziel-Index beim Re-Embedding
+        self.api_key = api_key or settings.PINECONE_API_KEY
+        self.api_url = api_url or settings.PINECONE_API_URL
+        self._http: Optional[httpx.AsyncClient] = None
+        self._http_pid: Optional[int] = None
+        self._dimension: Optional[int] = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """Geteilter HTTP Client (Connection Reuse), lazy pro Prozess erzeugt"""
+        if self._http is None or self._http_pid != os.getpid():
+            self._http = httpx.AsyncClient()
+            self._http_pid = os.getpid()
+        return self._http
+
+    def reset(self) -> None:
+        self._http = None
+        self._http_pid = None
         
-    async def _make_request(self, method: str, endpoint: str, data: Dict = None, namespace: str = None) -> Dict:
+    async def _make_request(self, method: str, endpoint: str, data: Dict = None, namespace: str = None, params: Dict = None) -> Dict:
         """Helper für Pinecone API Requests"""
         url = f"{self.api_url}{endpoint}"
+        params = dict(params or {})
         if namespace:
-            url += f"?namespace={namespace}"
+            params["namespace"] = namespace
             
         headers = {
             'Api-Key': self.api_key,
             'Content-Type': 'application/json',
         }
         
-        async with httpx.AsyncClient() as client:
-            if method == "POST":
-                response = await client.post(url, headers=headers, json=data)
-            elif method == "DELETE":
-                response = await client.delete(url, headers=headers, json=data)
-            else:
-                response = await client.get(url, headers=headers)
-                
-            response.raise_for_status()
-            return response.json()
+        client = self.http
+        # Nie länger als die Request-Deadline (wirft DeadlineExceeded, wenn sie schon abgelaufen ist)
+        timeout = deadline.timeout("vector", cap=settings.PINECONE_TIMEOUT)
+        body = None
+        if data is not None:
+            body = orjson.dumps(data) if orjson is not None else json.dumps(data).encode("utf-8")
+        if method == "POST":
+            response = await client.post(url, headers=headers, content=body, params=params, timeout=timeout)
+        elif method == "DELETE":
+            response = await client.request("DELETE", url, headers=headers, content=body, params=params, timeout=timeout)
+        else:
+            response = await client.get(url, headers=headers, params=params, timeout=timeout)
+            
+        response.raise_for_status()
+        return orjson.loads(response.content) if orjson is not None else response.json()
 
     # --- Vector CRUD Operations ---
     async def upsert_vector(self, vector_id: str, embedding: List[float], metadata: Dict, namespace: str) -> bool:
@@ -49,6 +85,41 @@ class PineconeService:
             print(f"Pinecone upsert error: {e}")
             return False
 
+    async def upsert_vectors(self, vectors: List[Dict], namespace: str, batch_size: int = 100) -> bool:
+        """Mehrere Vektoren in Batches upserten"""
+        try:
+            for start in range(0, len(vectors), batch_size):
+                data = {"vectors": vectors[start:start + batch_size], "namespace": namespace}
+                await self._make_request("POST", "/vectors/upsert", data)
+            return True
+        except Exception as e:
+            print(f"Pinecone upsert error: {e}")
+            return False
+
+    async def fetch_vectors(self, vector_ids: List[str], namespace: str, batch_size: int = 100) -> Dict[str, Dict]:
+        """
+        Vektoren per ID laden (id -> {id, values, metadata}), in Batches wegen der
+        URL-Länge. Fehler werden durchgereicht: ein leeres Ergebnis hieße für die
+        Aufrufer "Produkt neu" und würde bestehende Metadaten überschreiben.
+        """
+        vectors: Dict[str, Dict] = {}
+        for start in range(0, len(vector_ids), batch_size):
+            params = {"ids": vector_ids[start:start + batch_size]}
+            result = await self._make_request("GET", "/vectors/fetch", namespace=namespace, params=params)
+            vectors.update(result.get("vectors", {}))
+        return vectors
+
+    async def delete_vectors(self, vector_ids: List[str], namespace: str, batch_size: int = 1000) -> bool:
+        """Mehrere Vektoren in Batches löschen"""
+        try:
+            for start in range(0, len(vector_ids), batch_size):
+                data = {"ids": vector_ids[start:start + batch_size], "namespace": namespace}
+                await self._make_request("POST", "/vectors/delete", data)
+            return True
+        except Exception as e:
+            print(f"Pinecone delete error: {e}")
+            return False
+
     async def delete_vector(self, vector_id: str, namespace: str) -> bool:
         """Vektor aus Pinecone löschen"""
         try:
@@ -59,21 +130,51 @@ class PineconeService:
             print(f"Pinecone delete error: {e}")
             return False
 
-    async def query_vectors(self, query_vector: List[float], top_k: int, namespace: str, filter_dict: Dict = None) -> List[Dict]:
+    async def list_vector_ids(self, namespace: str, limit: int = 100, pagination_token: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+        """Eine Seite Vector-IDs eines Namespaces (ids, nächstes Token); Fehler werden durchgereicht"""
+        params: Dict[str, Any] = {"limit": limit}
+        if pagination_token:
+            params["paginationToken"] = pagination_token
+        result = await self._make_request("GET", "/vectors/list", namespace=namespace, params=params)
+        ids = [vector["id"] for vector in result.get("vectors", [])]
+        return ids, (result.get("pagination") or {}).get("next")
+
+    async def describe_index_stats(self) -> Dict[str, Any]:
+        """Namespaces und Vektoranzahl des Index"""
+        return await self._make_request("POST", "/describe_index_stats", {})
+
+    async def zero_vector(self) -> List[float]:
+        """Nullvektor in der Dimension des Index (für Queries, die nur filtern); Fehler werden durchgereicht"""
+        if self._dimension is None:
+            # Der Index ist maßgeblich - EMBEDDING_DIMENSIONS kann für einen Ziel-Index abweichen
+            stats = await self.describe_index_stats()
+            self._dimension = int(stats["dimension"])
+        return [0.0] * self._dimension
+
+    async def query_vectors(self, query_vector: List[float], top_k: int, namespace: str, filter_dict: Dict = None, include_values: bool = False, use_cache: bool = True) -> List[Dict]:
         """Ähnliche Vektoren suchen"""
         try:
             data = {
                 "vector": query_vector,
                 "topK": top_k,
-                "includeValues": False,
+                "includeValues": include_values,
                 "includeMetadata": True,
                 "namespace": namespace
             }
             if filter_dict:
                 data["filter"] = filter_dict
+            
+            cache_key = hashlib.sha1(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+            if use_cache:
+                cached = await query_cache.get(cache_key)
+                if cached is not None:
+                    return json.loads(cached)
                 
             result = await self._make_request("POST", "/query", data)
-            return result.get("matches", [])
+            matches = result.get("matches", [])
+            if use_cache:
+                await query_cache.set(cache_key, json.dumps(matches).encode("utf-8"))
+            return matches
         except Exception as e:
             print(f"Pinecone query error: {e}")
             return []
@@ -81,14 +182,12 @@ class PineconeService:
     # --- Shopping Item Operations ---
     async def add_shopping_vector(self, embedding: List[float], item: ShoppingItem, user_email: str) -> bool:
         """Shopping Item zu Pinecone hinzufügen"""
-        metadata = {
-            "user": user_email,
+        metadata = compact_metadata({
             "type": "shopping_item",
             "name": item.name,
-            "uuid": item.uuid,
             "category": item.category,
             "quantity": item.quantity
-        }
+        })
         return await self.upsert_vector(item.uuid, embedding, metadata, user_email)
 
     async def delete_shopping_vector(self, item_id: str, user_email: str) -> bool:
@@ -98,14 +197,14 @@ class PineconeService:
     # --- Supermarket Operations ---
     async def add_supermarket_vector(self, embedding: List[float], market: Supermarket, user_email: str) -> bool:
         """Supermarkt zu Pinecone hinzufügen"""
-        metadata = {
-            "user": user_email,
+        metadata = compact_metadata({
             "type": "supermarket",
             "name": market.name,
-            "uuid": market.uuid,
             "placeId": market.placeId,
-            "address": market.address
-        }
+            "address": market.address,
+            "lat": market.latitude,
+            "lng": market.longitude
+        })
         return await self.upsert_vector(market.uuid, embedding, metadata, user_email)
 
     async def delete_supermarket_vector(self, market_id: str, user_email: str) -> bool:
@@ -115,14 +214,12 @@ class PineconeService:
     # --- Recipe Operations ---
     async def add_recipe_vector(self, embedding: List[float], recipe: Recipe, user_email: str) -> bool:
         """Rezept zu Pinecone hinzufügen"""
-        metadata = {
-            "user": user_email,
+        metadata = compact_metadata({
             "type": "recipe",
             "name": recipe.name,
-            "uuid": recipe.uuid,
             "category": recipe.category,
-            "ingredients": json.dumps(recipe.ingredients)
-        }
+            "ingredients": recipe.ingredients
+        })
         return await self.upsert_vector(recipe.uuid, embedding, metadata, user_email)
 
     async def delete_recipe_vector(self, recipe_id: str, user_email: str) -> bool:
@@ -132,26 +229,24 @@ class PineconeService:
     # --- Query Operations ---
     async def get_similar_items(self, query: str, user_email: str, item_type: str = None) -> List[Dict]:
         """Ähnliche Items basierend auf Text-Query finden"""
-        from app.services.openai_service import OpenAIService
+        from app.services.openai_service import openai_service
         
-        openai_service = OpenAIService()
-        query_embedding = await openai_service.get_embeddings(query)
+        query_embedding = await openai_service.get_embeddings(query, endpoint="similar-items", user=user_email)
         
-        filter_dict = {"user": user_email}
-        if item_type:
-            filter_dict["type"] = item_type
-            
-        return await self.query_vectors(query_embedding, 10, user_email, filter_dict)
+        # Namespace = User, gefiltert wird nur noch nach Typ
+        matches = await self.query_vectors(query_embedding, 10, user_email, type_filter(item_type))
+        return expand_matches(matches)
 
     async def get_all_items_for_user(self, user_email: str, item_type: str = None) -> List[Dict]:
         """Alle Items eines Users abrufen"""
-        dummy_vector = [0.0] * 1536  # OpenAI Embedding Dimension
-        
-        filter_dict = {"user": user_email}
-        if item_type:
-            filter_dict["type"] = item_type
-            
-        return await self.query_vectors(dummy_vector, 100, user_email, filter_dict)
+        try:
+            dummy_vector = await self.zero_vector()
+        except Exception as e:
+            print(f"Pinecone describe_index_stats error: {e}")
+            return []
+
+        matches = await self.query_vectors(dummy_vector, 100, user_email, type_filter(item_type))
+        return expand_matches(matches)
 
 # Service Instanz
 pinecone_service = PineconeService()
\ No newline at end of file
@@ -0,0 +1,259 @@
+import asyncio
+import hashlib
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.core import deadline
+from app.core.admission import Lane
+from app.core.text import normalize_product_name
+from app.database import get_repository
+from app.services.item_history_service import ITEM_EMBEDDING_MODEL
+from app.services.openai_service import openai_service
+
+PRICE_CATALOG = "price_catalog"
+SUPERMARKETS = ["REWE", "EDEKA", "ALDI", "LIDL", "Kaufland", "Netto"]
+_SUPERMARKET_KEYS = {name.lower(): name for name in SUPERMARKETS}
+
+
+def normalize_supermarket(name: Optional[str]) -> Optional[str]:
+    """Kanonische Schreibweise ("Rewe" -> "REWE"), unbekannte Märkte unverändert"""
+    if not name:
+        return None
+    return _SUPERMARKET_KEYS.get(name.strip().lower(), name.strip())
+
+
+def catalog_doc_id(name_key: str, category: Optional[str]) -> str:
+    key = f"{name_key}|{(category or '').strip().lower()}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def _mean_price(prices: Dict[str, Dict[str, float]], supermarket: Optional[str]) -> Optional[float]:
+    """Durchschnittspreis im Supermarkt, sonst über alle Supermärkte gewichtet"""
+    if supermarket and supermarket in prices:
+        entry = prices[supermarket]
+        return entry["total"] / entry["count"]
+    count = sum(entry["count"] for entry in prices.values())
+    if not count:
+        return None
+    return sum(entry["total"] for entry in prices.values()) / count
+
+
+def _set_price(item: Dict[str, Any], price: Optional[float]) -> None:
+    """Katalogpreis setzen; ohne Treffer bleibt das Item ohne Preis"""
+    if price is None:
+        item["estimated_price"], item["price_source"] = None, None
+    else:
+        item["estimated_price"], item["price_source"] = round(price, 2), "catalog"
+
+
+def _normalized_matrix(embeddings: List[List[float]]) -> np.ndarray:
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+    return matrix
+
+
+class PriceCatalog:
+    """
+    Lokaler Preiskatalog, indexiert nach (normalisierter Name, Kategorie, Supermarkt).
+    Wird aus früheren Listen aufgebaut (app.jobs.build_price_catalog) und im
+    Repository persistiert. Unbekannte Namen werden per Embedding-Nearest-Neighbor
+    auf den ähnlichsten Katalogeintrag abgebildet; ganz neue Produkte bekommen
+    ihren Preis erst beim nächsten Katalog-Build.
+
+    Die Embedding-Matrix gehört zu einer Version der Einträge. Nach einem Reload
+    wird sie im Hintergrund neu gebaut und atomar getauscht; bis dahin bedient
+    die alte Matrix die Anfragen.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._by_name: Dict[str, List[str]] = defaultdict(list)
+        self._loaded_at = 0.0
+        self._load_lock = asyncio.Lock()
+        # Nearest-Neighbor Index: normalisierte Embeddings der Katalognamen
+        self._version = 0  # zählt Reloads/Rebuilds der Einträge
+        self._matrix: Optional[Tuple[int, np.ndarray, List[str]]] = None  # (Version, Matrix, doc_ids)
+        self._matrix_task: Optional[asyncio.Task] = None
+
+    def _index(self, doc_id: str, entry: Dict[str, Any]) -> None:
+        if doc_id not in self._entries:
+            self._by_name[entry["name_key"]].append(doc_id)
+        self._entries[doc_id] = entry
+
+    async def _ensure_loaded(self) -> None:
+        if self._loaded_at and time.monotonic() - self._loaded_at < settings.PRICE_CATALOG_TTL:
+            return
+        async with self._load_lock:
+            if self._loaded_at and time.monotonic() - self._loaded_at < settings.PRICE_CATALOG_TTL:
+                return
+            repository = get_repository()
+            entries: Dict[str, Dict[str, Any]] = {}
+            if repository is not None:
+                try:
+                    cursor = None
+                    while True:
+                        docs, cursor = await repository.store.scan(PRICE_CATALOG, 1000, cursor)
+                        entries.update(docs)
+                        if cursor is None:
+                            break
+                except Exception as e:
+                    print(f"⚠️ Error loading price catalog: {e}")
+
+            self._set_entries(entries)
+            print(f"💶 Price catalog loaded: {len(self._entries)} products")
+
+    def _set_entries(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        changed = entries != self._entries
+        self._entries, self._by_name = {}, defaultdict(list)
+        for doc_id, entry in entries.items():
+            self._index(doc_id, entry)
+        # Unveränderter Katalog behält seine Matrix
+        self._version += changed
+        self._loaded_at = time.monotonic()
+
+    def lookup(self, name: str, category: Optional[str] = None, supermarket: Optional[str] = None) -> Optional[float]:
+        """Exakter Treffer über den normalisierten Namen (Kategorie bevorzugt)"""
+        name_key = normalize_product_name(name)
+        doc_ids = self._by_name.get(name_key)
+        if not doc_ids:
+            return None
+        supermarket = normalize_supermarket(supermarket)
+        preferred = self._entries.get(catalog_doc_id(name_key, category))
+        if preferred is not None:
+            price = _mean_price(preferred["prices"], supermarket)
+            if price is not None:
+                return price
+        # Andere Kategorie, gleicher Name: über alle Einträge mitteln
+        prices = [_mean_price(self._entries[doc_id]["prices"], supermarket) for doc_id in doc_ids]
+        prices = [price for price in prices if price is not None]
+        return sum(prices) / len(prices) if prices else None
+
+    async def _nearest_neighbors(self, names: List[str]) -> List[Optional[Tuple[str, float]]]:
+        """Pro Name der ähnlichste Katalogeintrag (doc_id, Cosine Similarity)"""
+        if not self._entries:
+            return [None] * len(names)
+
+        if self._matrix is None:
+            # Erster Aufbau: ohne Matrix gibt es keine Treffer, also darauf warten
+            await self._refresh_matrix()
+        elif self._matrix[0] != self._version and (self._matrix_task is None or self._matrix_task.done()):
+            self._matrix_task = asyncio.create_task(self._refresh_matrix(background=True))
+        _, matrix, doc_ids = self._matrix
+
+        queries, _ = await openai_service.embed(names, model=ITEM_EMBEDDING_MODEL, lane=Lane.GENERATION, endpoint="price-catalog")
+        query_matrix = np.asarray(queries, dtype=np.float32)
+        query_matrix /= np.linalg.norm(query_matrix, axis=1, keepdims=True) + 1e-12
+
+        similarities = await asyncio.to_thread(np.matmul, query_matrix, matrix.T)
+        best = similarities.argmax(axis=1)
+        # Einträge, die seit dem Bau der Matrix verschwunden sind, zählen nicht
+        return [
+            (doc_ids[index], float(similarities[row, index])) if doc_ids[index] in self._entries else None
+            for row, index in enumerate(best)
+        ]
+
+    async def _refresh_matrix(self, background: bool = False) -> None:
+        """Matrix für die aktuelle Version bauen und danach in einem Schritt tauschen"""
+        if background:
+            # Überlebt den auslösenden Request - nicht an dessen Deadline gebunden
+            deadline.clear()
+        version, entries = self._version, self._entries
+        doc_ids = list(entries)
+        embeddings = []
+        try:
+            # Embeddings liegen im geteilten Cache - nur neue Namen kosten Tokens
+            for start in range(0, len(doc_ids), 1000):
+                chunk, _ = await openai_service.embed(
+                    [entries[doc_id]["name"] for doc_id in doc_ids[start:start + 1000]],
+                    model=ITEM_EMBEDDING_MODEL, lane=Lane.BACKGROUND, endpoint="price-catalog",
+                )
+                embeddings.extend(chunk)
+            matrix = await asyncio.to_thread(_normalized_matrix, embeddings)
+        except Exception as e:
+            if self._matrix is None:
+                raise
+            print(f"⚠️ Price catalog matrix refresh failed, keeping previous version: {e}")
+            return
+        if self._matrix is None or self._matrix[0] < version:
+            self._matrix = (version, matrix, doc_ids)
+
+    async def fill_prices(self, items: List[Dict[str, Any]]) -> int:
+        """estimated_price der Items aus dem Katalog setzen; gibt die Anzahl gefüllter Preise zurück"""
+        await self._ensure_loaded()
+
+        filled = 0
+        unresolved: List[Dict[str, Any]] = []
+        for item in items:
+            price = self.lookup(item.get("name", ""), item.get("category"), item.get("supermarket"))
+            if price is None:
+                unresolved.append(item)
+            else:
+                _set_price(item, price)
+                filled += 1
+
+        if unresolved and self._entries:
+            try:
+                matches = await self._nearest_neighbors([item.get("name", "") for item in unresolved])
+            except Exception as e:
+                print(f"⚠️ Price catalog nearest-neighbor lookup failed: {e}")
+                matches = [None] * len(unresolved)
+
+            for item, match in zip(unresolved, matches):
+                price = None
+                if match is not None and match[1] >= settings.PRICE_MATCH_MIN_SIMILARITY:
+                    price = _mean_price(self._entries[match[0]]["prices"], normalize_supermarket(item.get("supermarket")))
+                _set_price(item, price)
+                filled += price is not None
+        else:
+            for item in unresolved:
+                _set_price(item, None)
+
+        print(f"💶 Filled {filled}/{len(items)} prices from catalog")
+        return filled
+
+    @staticmethod
+    def aggregate(items: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Items mit Preis zu Katalogeinträgen zusammenfassen (doc_id -> Eintrag)"""
+        entries: Dict[str, Dict[str, Any]] = {}
+        for item in items:
+            price = item.get("estimated_price")
+            name_key = normalize_product_name(item.get("name", ""))
+            if not name_key or not isinstance(price, (int, float)) or price <= 0:
+                continue
+
+            doc_id = catalog_doc_id(name_key, item.get("category"))
+            entry = entries.get(doc_id)
+            if entry is None:
+                entry = entries[doc_id] = {
+                    "name": item["name"],
+                    "name_key": name_key,
+                    "category": item.get("category"),
+                    "prices": {},
+                    "updated_at": time.time(),
+                }
+
+            supermarket = normalize_supermarket(item.get("supermarket")) or "unknown"
+            stats = entry["prices"].setdefault(supermarket, {"total": 0.0, "count": 0})
+            stats["total"] += float(price)
+            stats["count"] += 1
+        return entries
+
+    async def replace(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        """Katalog komplett ersetzen (idempotenter Rebuild) und im Repository speichern"""
+        await self._ensure_loaded()
+        repository = get_repository()
+        if repository is not None:
+            stale = [doc_id for doc_id in self._entries if doc_id not in entries]
+            await repository.store.set_many(PRICE_CATALOG, list(entries.items()))
+            for doc_id in stale:
+                await repository.store.delete(PRICE_CATALOG, doc_id)
+
+        self._set_entries(entries)
+
+
+# Service Instanz
+price_catalog = PriceCatalog()
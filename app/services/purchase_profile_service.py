@@ -0,0 +1,149 @@
+import asyncio
+import heapq
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.core.text import normalize_product_name
+from app.database import get_repository
+from app.models.user import PurchaseProfile, PurchaseStats
+
+PURCHASE_PROFILES = "purchase_profiles"
+
+
+def _score(stats: PurchaseStats, now: float) -> float:
+    """Häufigkeit mit exponentiellem Recency-Decay"""
+    age_days = max(0.0, now - stats.last_seen) / 86400
+    return stats.count * 0.5 ** (age_days / settings.PROFILE_HALF_LIFE_DAYS)
+
+
+def _apply_items(profile: PurchaseProfile, items: List[Dict[str, Any]], now: float) -> None:
+    """Items in ein Profil einrechnen und das Profil auf PROFILE_MAX_ITEMS begrenzen"""
+    for item in items:
+        key = normalize_product_name(item.get("name", ""))
+        if not key:
+            continue
+
+        stats = profile.items.get(key)
+        if stats is None:
+            stats = profile.items[key] = PurchaseStats(name=item["name"])
+
+        stats.name = item["name"]
+        stats.count += 1
+        stats.total_quantity += max(1, int(item.get("quantity") or 1))
+        stats.last_seen = max(stats.last_seen, now)
+        if item.get("category"):
+            stats.category = item["category"]
+
+        supermarket = item.get("supermarket") or item.get("supermarkt")
+        if supermarket:
+            stats.supermarkets[supermarket] = stats.supermarkets.get(supermarket, 0) + 1
+
+    # Profil begrenzen: am wenigsten relevante Produkte verwerfen
+    if len(profile.items) > settings.PROFILE_MAX_ITEMS:
+        keep = heapq.nlargest(
+            settings.PROFILE_MAX_ITEMS,
+            profile.items.items(),
+            key=lambda entry: _score(entry[1], now),
+        )
+        profile.items = dict(keep)
+
+    profile.updated_at = now
+
+
+class PurchaseProfileService:
+    """
+    Per-User Kaufprofil (Häufigkeit, Recency, typische Menge, bevorzugter Supermarkt).
+    Wird inkrementell beim Speichern von Items aktualisiert, aus dem Speicher
+    bedient und im Repository persistiert.
+    """
+
+    def __init__(self, max_users: int = 1000):
+        self.max_users = max_users
+        self._profiles: "OrderedDict[str, PurchaseProfile]" = OrderedDict()
+        self._loaded_at: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _lock(self, user_email: str) -> asyncio.Lock:
+        lock = self._locks.get(user_email)
+        if lock is None:
+            lock = self._locks[user_email] = asyncio.Lock()
+        return lock
+
+    def _remember(self, profile: PurchaseProfile) -> None:
+        self._profiles[profile.user_email] = profile
+        self._profiles.move_to_end(profile.user_email)
+        self._loaded_at[profile.user_email] = time.monotonic()
+        while len(self._profiles) > self.max_users:
+            evicted, _ = self._profiles.popitem(last=False)
+            self._locks.pop(evicted, None)
+            self._loaded_at.pop(evicted, None)
+
+    async def _load(self, user_email: str) -> PurchaseProfile:
+        profile = self._profiles.get(user_email)
+        # Bei mehreren Workern können andere Prozesse das Profil geändert haben
+        fresh = time.monotonic() - self._loaded_at.get(user_email, 0.0) < settings.PROFILE_CACHE_TTL
+        if profile is not None and (fresh or settings.WEB_CONCURRENCY <= 1):
+            self._profiles.move_to_end(user_email)
+            return profile
+
+        profile = PurchaseProfile(user_email=user_email)
+        repository = get_repository()
+        if repository is not None:
+            try:
+                data = await repository.store.get(PURCHASE_PROFILES, user_email)
+                if data:
+                    profile = PurchaseProfile(**data)
+            except Exception as e:
+                print(f"⚠️ Error loading purchase profile: {e}")
+
+        self._remember(profile)
+        return profile
+
+    async def get_profile(self, user_email: str) -> PurchaseProfile:
+        async with self._lock(user_email):
+            return await self._load(user_email)
+
+    async def record_items(self, user_email: str, items: List[Dict[str, Any]], timestamp: Optional[float] = None) -> PurchaseProfile:
+        """
+        Profil inkrementell um gespeicherte Items erweitern und persistieren. Das
+        Read-Modify-Write läuft als Transaktion auf dem gespeicherten Profil, damit
+        parallele Updates anderer Worker nicht verloren gehen.
+        """
+        now = timestamp or time.time()
+
+        async with self._lock(user_email):
+            profile = await self._load(user_email)
+
+            def mutator(current: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+                stored = PurchaseProfile(**current) if current else PurchaseProfile(user_email=user_email)
+                _apply_items(stored, items, now)
+                return stored.dict()
+
+            repository = get_repository()
+            if repository is None:
+                _apply_items(profile, items, now)
+                return profile
+
+            try:
+                updated = PurchaseProfile(**await repository.store.transact(PURCHASE_PROFILES, user_email, mutator))
+            except Exception as e:
+                print(f"⚠️ Error saving purchase profile: {e}")
+                _apply_items(profile, items, now)
+                return profile
+
+            # Gecachtes Objekt aktualisieren statt ersetzen (Autocomplete synct inkrementell darüber)
+            profile.items, profile.updated_at = updated.items, updated.updated_at
+            self._remember(profile)
+            return profile
+
+    async def top_items(self, user_email: str, limit: int = 20) -> List[PurchaseStats]:
+        """Produkte nach Häufigkeit und Recency gerankt"""
+        profile = await self.get_profile(user_email)
+        now = time.time()
+        return heapq.nlargest(limit, profile.items.values(), key=lambda stats: _score(stats, now))
+
+
+# Service Instanz
+purchase_profile_service = PurchaseProfileService()
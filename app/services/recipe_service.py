@@ -0,0 +1,256 @@
+import asyncio
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.core.text import normalize_product_name
+from app.database import get_repository
+from app.models.shopping import Recipe
+
+# Zutaten, die als vorhanden gelten und nie als "fehlend" zählen
+PANTRY_STAPLES = {"salz", "pfeffer", "wasser", "öl", "olivenöl", "zucker", "essig"}
+
+# Maß- und Gebindewörter ("1 Dose Mais", "2 EL Butter") - gehören nicht zur Zutat
+MEASURE_WORDS = {
+    "g", "kg", "mg", "ml", "cl", "dl", "l", "el", "tl", "msp", "prise", "prisen", "dose", "dosen",
+    "glas", "gläser", "becher", "bund", "pck", "packung", "packungen", "päckchen", "stück", "stk",
+    "scheibe", "scheiben", "zehe", "zehen", "tasse", "tassen", "handvoll", "etwas",
+}
+
+# Popcount pro Byte (Fallback für numpy < 2.0 ohne np.bitwise_count)
+_BYTE_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def popcount_rows(bits: np.ndarray) -> np.ndarray:
+    """Gesetzte Bits pro Zeile einer (n, words) uint64 Matrix"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bits).sum(axis=1, dtype=np.int64)
+    return _BYTE_POPCOUNT[bits.view(np.uint8)].reshape(bits.shape[0], -1).sum(axis=1, dtype=np.int64)
+
+
+def ingredient_key(ingredient: str) -> str:
+    """Zutat normalisieren ("200 g Mehl" -> "mehl", "1 Dose passierte Tomaten" -> "passierte tomaten")"""
+    tokens = normalize_product_name(ingredient).split()
+    return " ".join(token for token in tokens if token not in MEASURE_WORDS and not token.isdigit())
+
+
+def is_pantry_staple(key: str) -> bool:
+    """Grundzutat wie "salz", auch mit Mengenangabe ("1 prise salz")"""
+    return key in PANTRY_STAPLES or key.rsplit(" ", 1)[-1] in PANTRY_STAPLES
+
+
+@dataclass
+class RecipeMatch:
+    recipe: Recipe
+    coverage: float
+    matched: int
+    total: int
+    missing: List[str] = field(default_factory=list)
+
+
+class RecipeIndex:
+    """
+    Inverted Index Zutat -> Rezepte plus eine Bitset-Matrix (ein uint64-Wort pro
+    64 Zutaten). Ein Match gegen eine Liste ist ein AND über die Kandidaten-Zeilen
+    und ein Popcount - vollständig vektorisiert.
+    """
+
+    def __init__(self, recipes: List[Recipe]):
+        self.recipes = recipes
+        self.vocabulary: Dict[str, int] = {}
+        self.names: List[str] = []
+        # Token -> Zutaten-IDs, damit "Eier" auch "Bio Eier" findet
+        self._tokens: Dict[str, List[int]] = defaultdict(list)
+
+        rows: List[List[int]] = []
+        for recipe in recipes:
+            ids = set()
+            for ingredient in recipe.ingredients:
+                key = ingredient_key(ingredient)
+                if not key or is_pantry_staple(key):
+                    continue
+                if key not in self.vocabulary:
+                    self.vocabulary[key] = len(self.names)
+                    self.names.append(ingredient.strip())
+                    for token in set(key.split()):
+                        self._tokens[token].append(self.vocabulary[key])
+                ids.add(self.vocabulary[key])
+            rows.append(sorted(ids))
+
+        self.words = max(1, (len(self.names) + 63) // 64)
+        self.bits = np.zeros((len(recipes), self.words), dtype=np.uint64)
+
+        # Alle (Rezept, Zutat) Paare auf einmal setzen statt Bit für Bit
+        row_ids = np.fromiter((row for row, ids in enumerate(rows) for _ in ids), dtype=np.int64)
+        ingredient_ids = np.fromiter((ingredient_id for ids in rows for ingredient_id in ids), dtype=np.int64)
+        np.bitwise_or.at(
+            self.bits,
+            (row_ids, ingredient_ids >> 6),
+            np.left_shift(np.uint64(1), (ingredient_ids & 63).astype(np.uint64)),
+        )
+
+        # Postings: Rezept-Zeilen pro Zutat, gruppiert über eine stabile Sortierung
+        order = np.argsort(ingredient_ids, kind="stable")
+        boundaries = np.flatnonzero(np.diff(ingredient_ids[order])) + 1
+        self.postings = {
+            int(ingredient_ids[order[group[0]]]): row_ids[order[group]]
+            for group in np.split(np.arange(len(order)), boundaries) if len(group)
+        }
+        self.sizes = popcount_rows(self.bits)
+
+    def encode(self, names: List[str]) -> np.ndarray:
+        """
+        Namen der Einkaufsliste als Bitset über das Zutaten-Vokabular. Eine Zutat
+        gilt als vorhanden, wenn alle Wörter des Listeneintrags in ihr vorkommen
+        ("Eier" deckt "Bio Eier", "Bio Eier" aber nicht "Bio Milch").
+        """
+        bits = np.zeros(self.words, dtype=np.uint64)
+        for name in names:
+            key = ingredient_key(name)
+            if not key:
+                continue
+            ids = set(self._tokens.get(key.split()[0], ()))
+            for token in key.split()[1:]:
+                ids &= set(self._tokens.get(token, ()))
+            if key in self.vocabulary:
+                ids.add(self.vocabulary[key])
+            for ingredient_id in ids:
+                bits[ingredient_id >> 6] |= np.uint64(1) << np.uint64(ingredient_id & 63)
+        return bits
+
+    def match(self, names: List[str], limit: int = 20, max_missing: Optional[int] = None, min_coverage: float = 0.0) -> List[RecipeMatch]:
+        if not self.recipes:
+            return []
+        query = self.encode(names)
+
+        # Kandidaten über den Inverted Index: Rezepte mit mindestens einer Zutat aus der Liste
+        present = np.flatnonzero(np.unpackbits(query.view(np.uint8), bitorder="little")[:len(self.names)])
+        if present.size == 0:
+            return []
+        candidates = np.unique(np.concatenate([self.postings[int(ingredient_id)] for ingredient_id in present]))
+
+        matched = popcount_rows(self.bits[candidates] & query)
+        totals = self.sizes[candidates]
+        missing = totals - matched
+        coverage = np.divide(matched, totals, out=np.ones(len(candidates)), where=totals > 0)
+
+        keep = coverage >= min_coverage
+        if max_missing is not None:
+            keep &= missing <= max_missing
+        candidates, matched, totals, missing, coverage = (
+            candidates[keep], matched[keep], totals[keep], missing[keep], coverage[keep]
+        )
+
+        # Höchste Abdeckung zuerst, bei Gleichstand weniger fehlende Zutaten
+        order = np.lexsort((missing, -coverage))[:limit]
+
+        results = []
+        for position in order:
+            row = int(candidates[position])
+            recipe = self.recipes[row]
+            missing_bits = self.bits[row] & ~query
+            missing_ids = set(np.flatnonzero(np.unpackbits(missing_bits.view(np.uint8), bitorder="little")).tolist())
+            results.append(RecipeMatch(
+                recipe=recipe,
+                coverage=round(float(coverage[position]), 3),
+                matched=int(matched[position]),
+                total=int(totals[position]),
+                # Originalzeilen des Rezepts (mit Mengenangaben)
+                missing=[
+                    ingredient for ingredient in recipe.ingredients
+                    if self.vocabulary.get(ingredient_key(ingredient)) in missing_ids
+                ],
+            ))
+        return results
+
+
+class RecipeService:
+    """Rezepte eines Users aus dem Repository, mit lazy aufgebautem Zutaten-Index"""
+
+    def __init__(self, max_users: int = 500):
+        self.max_users = max_users
+        self._indexes: "OrderedDict[str, RecipeIndex]" = OrderedDict()
+        self._loaded_at: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _lock(self, user_email: str) -> asyncio.Lock:
+        lock = self._locks.get(user_email)
+        if lock is None:
+            lock = self._locks[user_email] = asyncio.Lock()
+        return lock
+
+    def invalidate(self, user_email: str) -> None:
+        self._indexes.pop(user_email, None)
+        self._loaded_at.pop(user_email, None)
+
+    def _cached(self, user_email: str) -> Optional[RecipeIndex]:
+        index = self._indexes.get(user_email)
+        # Bei mehreren Workern können andere Prozesse Rezepte gespeichert haben
+        fresh = time.monotonic() - self._loaded_at.get(user_email, 0.0) < settings.PROFILE_CACHE_TTL
+        if index is not None and (fresh or settings.WEB_CONCURRENCY <= 1):
+            self._indexes.move_to_end(user_email)
+            return index
+        return None
+
+    async def get_index(self, user_email: str) -> RecipeIndex:
+        index = self._cached(user_email)
+        if index is not None:
+            return index
+
+        async with self._lock(user_email):
+            # Ein paralleler Request kann den Index inzwischen gebaut haben
+            index = self._cached(user_email)
+            if index is not None:
+                return index
+
+            recipes: List[Recipe] = []
+            repository = get_repository()
+            if repository is not None:
+                cursor = None
+                while True:
+                    page = await repository.recipes.list_for_user(user_email, page_size=500, cursor=cursor)
+                    recipes.extend(page.items)
+                    cursor = page.next_cursor
+                    if cursor is None:
+                        break
+
+            # Index-Aufbau ist CPU-Arbeit - nicht im Event Loop
+            index = await asyncio.to_thread(RecipeIndex, recipes)
+            self._indexes[user_email] = index
+            self._indexes.move_to_end(user_email)
+            self._loaded_at[user_email] = time.monotonic()
+            while len(self._indexes) > self.max_users:
+                evicted, _ = self._indexes.popitem(last=False)
+                self._loaded_at.pop(evicted, None)
+                self._locks.pop(evicted, None)
+            print(f"🍳 Built recipe index for {user_email}: {len(recipes)} recipes, {len(index.names)} ingredients")
+            return index
+
+    async def save_recipes(self, recipes: List[Recipe]) -> List[str]:
+        repository = get_repository()
+        if repository is None:
+            raise RuntimeError("No repository configured")
+        ids = await repository.recipes.save_many(recipes)
+        for user_email in {recipe.user_email for recipe in recipes}:
+            self.invalidate(user_email)
+        return ids
+
+    async def delete_recipe(self, user_email: str, recipe_id: str) -> None:
+        repository = get_repository()
+        if repository is None:
+            raise RuntimeError("No repository configured")
+        await repository.recipes.delete(recipe_id)
+        self.invalidate(user_email)
+
+    async def match(self, user_email: str, names: List[str], limit: int = 20, max_missing: Optional[int] = None, min_coverage: float = 0.0) -> List[RecipeMatch]:
+        """Rezepte des Users nach Abdeckung durch die Liste und fehlenden Zutaten ranken"""
+        index = await self.get_index(user_email)
+        return index.match(names, limit, max_missing, min_coverage)
+
+
+# Service Instanz
+recipe_service = RecipeService()
@@ -0,0 +1,221 @@
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pydantic import ValidationError
+
+from app.config import settings
+from app.core.metrics import metrics
+from app.database import SHOPPING_LISTS, Page, get_repository
+from app.models.shopping import ShoppingItem, ShoppingList
+
+# Sync-Interna, die nicht an Clients ausgeliefert werden
+INTERNAL_FIELDS = {"tombstones", "tombstone_floor"}
+
+
+class ShoppingListNotFound(Exception):
+    pass
+
+
+class VersionConflict(Exception):
+    """If-Match passt nicht zur aktuellen Version der Liste"""
+
+    def __init__(self, version: int):
+        super().__init__(f"List is at version {version}")
+        self.version = version
+
+
+class InvalidMutation(Exception):
+    pass
+
+
+def list_etag(list_uuid: str, version: int) -> str:
+    # Weak ETag: die Kompression ändert die Bytes, nicht den Inhalt
+    return f'W/"{list_uuid}.{version}"'
+
+
+def _timestamp(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def public_list(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Listen-Dokument ohne Sync-Interna, Zeitstempel als ISO-String (beide Backends gleich)"""
+    result = {key: value for key, value in doc.items() if key not in INTERNAL_FIELDS}
+    for key in ("created_at", "updated_at"):
+        if key in result:
+            result[key] = _timestamp(result[key])
+    return result
+
+
+def changes_since(doc: Dict[str, Any], since_version: int) -> Dict[str, Any]:
+    """
+    Delta seit der Version des Clients: geänderte/neue Items und IDs gelöschter
+    Items. Ohne Basis (0), mit verworfenen Tombstones oder einer unbekannten
+    Version gibt es die komplette Liste mit reset=True.
+    """
+    version = doc.get("version", 0)
+    reset = since_version <= 0 or since_version < doc.get("tombstone_floor", 0) or since_version > version
+    items = doc.get("items", [])
+    if reset:
+        changed, deleted = items, []
+    else:
+        changed = [item for item in items if item.get("version", 0) > since_version]
+        deleted = [item_uuid for item_uuid, deleted_at in (doc.get("tombstones") or {}).items() if deleted_at > since_version]
+
+    return {
+        "uuid": doc["uuid"],
+        "name": doc.get("name"),
+        "version": version,
+        "since_version": since_version,
+        "reset": reset,
+        "updated_at": _timestamp(doc.get("updated_at")),
+        "items": changed,
+        "deleted": deleted,
+    }
+
+
+def _without_version(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in item.items() if key != "version"}
+
+
+def apply_mutations(doc: Dict[str, Any], mutations: List[Dict[str, Any]], now: datetime) -> Dict[str, Any]:
+    """
+    Batch von Item-Mutationen ("upsert", "patch", "delete") auf ein Listen-Dokument
+    anwenden. Alle Änderungen bekommen dieselbe neue Listen-Version; ein Batch
+    ohne effektive Änderung lässt Version und Dokument unverändert.
+    """
+    version = doc.get("version", 0) + 1
+    items: Dict[str, Dict[str, Any]] = {item["uuid"]: item for item in doc.get("items", [])}
+    tombstones: Dict[str, int] = dict(doc.get("tombstones") or {})
+    changed = False
+
+    for mutation in mutations:
+        op = mutation["op"]
+        item_uuid = mutation.get("uuid")
+        current = items.get(item_uuid) if item_uuid else None
+
+        if op == "delete":
+            # Idempotent: unbekannte oder bereits gelöschte Items ignorieren
+            if current is not None:
+                del items[item_uuid]
+                tombstones[item_uuid] = version
+                changed = True
+            continue
+
+        fields = mutation.get("fields") or {}
+        if op == "patch":
+            if current is None:
+                raise InvalidMutation(f"Item {item_uuid} not found")
+            updated = {**_without_version(current), **fields}
+        elif op == "upsert":
+            if not fields.get("name"):
+                raise InvalidMutation("upsert requires a name")
+            item_uuid = item_uuid or str(uuid.uuid4())
+            updated = {"quantity": 1, "isChecked": False, **fields, "uuid": item_uuid}
+        else:
+            raise InvalidMutation(f"Unknown op {op}")
+
+        if current is not None and _without_version(current) == updated:
+            continue
+        # Nur Items schreiben, die sich auch wieder als ShoppingItem lesen lassen
+        try:
+            ShoppingItem(**updated)
+        except ValidationError as e:
+            error = e.errors()[0]
+            raise InvalidMutation(f"Invalid item {item_uuid}: {error['loc'][0]} - {error['msg']}")
+        updated["version"] = version
+        items[item_uuid] = updated
+        tombstones.pop(item_uuid, None)
+        changed = True
+
+    if not changed:
+        return doc
+
+    # Tombstones begrenzen; wer älter als die verworfenen ist, bekommt einen vollen Sync
+    floor = doc.get("tombstone_floor", 0)
+    overflow = len(tombstones) - settings.SHOPPING_LIST_MAX_TOMBSTONES
+    if overflow > 0:
+        ordered = sorted(tombstones.items(), key=lambda entry: entry[1])
+        floor = max(floor, ordered[overflow - 1][1])
+        tombstones = dict(ordered[overflow:])
+
+    return {
+        **doc,
+        "items": list(items.values()),
+        "version": version,
+        "tombstones": tombstones,
+        "tombstone_floor": floor,
+        "updated_at": now,
+    }
+
+
+class ShoppingListService:
+    """
+    Einkaufslisten mit Versionen für den Delta-Sync. Jede Mutation erhöht die
+    Listen-Version und stempelt die geänderten Items damit; gelöschte Items
+    bleiben als Tombstone (UUID -> Version) im Dokument. Ein Sync liest ein
+    Dokument und liefert nur das Delta seit der Version des Clients.
+
+    Gearbeitet wird auf den Rohdokumenten, damit Zusatzfelder generierter
+    Listen (settings, context, Preise) erhalten bleiben.
+    """
+
+    @staticmethod
+    def _repository():
+        repository = get_repository()
+        if repository is None:
+            raise RuntimeError("No repository configured")
+        return repository
+
+    async def create(self, user_email: str, name: str, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        now = datetime.now()
+        doc = apply_mutations(
+            {"uuid": str(uuid.uuid4()), "name": name, "items": [], "created_at": now, "user_email": user_email, "version": 0},
+            [{"op": "upsert", "uuid": item.get("uuid"), "fields": item} for item in items],
+            now,
+        )
+        # Auch eine leere Liste startet bei Version 1 (0 = "noch nie synchronisiert")
+        doc = {**doc, "version": max(doc["version"], 1), "updated_at": now}
+        await self._repository().add_document(SHOPPING_LISTS, doc, doc["uuid"])
+        return doc
+
+    async def get(self, list_uuid: str, user_email: str) -> Dict[str, Any]:
+        doc = await self._repository().store.get(SHOPPING_LISTS, list_uuid)
+        if doc is None or doc.get("user_email") != user_email:
+            raise ShoppingListNotFound(list_uuid)
+        return doc
+
+    async def list_for_user(self, user_email: str, page_size: int = 20, cursor: Optional[str] = None) -> Page[ShoppingList]:
+        return await self._repository().shopping_lists.list_for_user(user_email, page_size=page_size, cursor=cursor)
+
+    async def mutate(
+        self,
+        list_uuid: str,
+        user_email: str,
+        mutations: List[Dict[str, Any]],
+        expected_version: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Mutationen in einer Transaktion anwenden; expected_version aus If-Match"""
+        now = datetime.now()
+        state: Dict[str, Any] = {}
+
+        def mutator(current: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+            if current is None or current.get("user_email") != user_email:
+                raise ShoppingListNotFound(list_uuid)
+            if expected_version is not None and current.get("version", 0) != expected_version:
+                raise VersionConflict(current.get("version", 0))
+            state["base_version"] = current.get("version", 0)
+            return apply_mutations(current, mutations, now)
+
+        doc = await self._repository().store.transact(SHOPPING_LISTS, list_uuid, mutator)
+        metrics.increment("shopping_list_mutations_total", value=len(mutations))
+        # Antwort = Delta seit der Basis-Version: genau das, was der Client übernehmen muss
+        return changes_since(doc, state["base_version"])
+
+    async def delete(self, list_uuid: str, user_email: str) -> None:
+        await self.get(list_uuid, user_email)
+        await self._repository().store.delete(SHOPPING_LISTS, list_uuid)
+
+
+# Service Instanz
+shopping_list_service = ShoppingListService()
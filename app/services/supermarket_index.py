@@ -0,0 +1,293 @@
+import asyncio
+import math
+import re
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.database import get_repository
+from app.models.shopping import Supermarket
+from app.services.category_classifier import CATEGORIES, DEFAULT_CATEGORY, category_classifier
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+# Kantenlänge einer Gitterzelle in Grad (~5.5 km Nord-Süd)
+CELL_DEGREES = 0.05
+
+# Sortiment von Fachgeschäften anhand des Namens; alles andere gilt als Vollsortiment
+SPECIALTY_STORES: List[Tuple[Tuple[str, ...], Set[str]]] = [
+    (("dm", "rossmann", "müller", "budni"), {"Haushaltsartikel", "Süßwaren", "Getränke", DEFAULT_CATEGORY}),
+    (("bäcker", "bäckerei", "backhaus", "backstube"), {"Brot & Backwaren"}),
+    (("metzger", "metzgerei", "fleischerei", "fischhandel"), {"Fleisch & Fisch"}),
+    (("getränke", "getränkemarkt"), {"Getränke"}),
+    (("obst", "gemüse", "hofladen", "wochenmarkt"), {"Obst & Gemüse"}),
+]
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlmb = phi2 - phi1, math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def store_categories(market: Supermarket) -> Set[str]:
+    """Kategorien, die ein Markt führt (explizit gesetzt oder aus dem Namen abgeleitet)"""
+    if market.categories:
+        return set(market.categories)
+    tokens = re.findall(r"\w+", market.name.lower())
+    for keywords, categories in SPECIALTY_STORES:
+        # Kurze Keywords ("dm") nur als ganzes Wort, längere auch als Präfix
+        if any(token == keyword or (len(keyword) > 3 and token.startswith(keyword)) for keyword in keywords for token in tokens):
+            return categories
+    return set(CATEGORIES)
+
+
+def _cell(latitude: float, longitude: float) -> Tuple[int, int]:
+    return math.floor(latitude / CELL_DEGREES), math.floor(longitude / CELL_DEGREES)
+
+
+class SpatialIndex:
+    """
+    Gitter-Index (geohash-artig) über die Supermärkte eines Users. Nearest-Queries
+    durchsuchen Zellringe von innen nach außen und brechen ab, sobald kein
+    weiterer Ring näher liegen kann. Liegt die Anfrage weit weg von allen
+    Märkten (oder findet der Filter nichts), wäre der Ringweg teurer als alle
+    Märkte zu prüfen - ab einer Ringfläche von RING_CELL_FACTOR x belegten
+    Zellen wird daher vektorisiert über alle Märkte gerechnet.
+    """
+
+    RING_CELL_FACTOR = 4
+
+    def __init__(self, markets: Optional[List[Supermarket]] = None):
+        self.markets: Dict[str, Supermarket] = {}
+        self._cells: Dict[Tuple[int, int], List[Supermarket]] = defaultdict(list)
+        self._categories: Dict[str, Set[str]] = {}
+        self._bounds: Optional[Tuple[int, int, int, int]] = None  # min/max Zeile und Spalte
+        self._coordinates: Optional[Tuple[List[Supermarket], np.ndarray]] = None  # Märkte + (lat, lng) in Radiant
+        self.version = 0  # zählt Änderungen (abgeleitete Indizes wie Autocomplete syncen darüber)
+        for market in markets or []:
+            self.add(market)
+
+    def __len__(self) -> int:
+        return len(self.markets)
+
+    def add(self, market: Supermarket) -> None:
+        self.remove(market.uuid)
+        self.markets[market.uuid] = market
+        self._categories[market.uuid] = store_categories(market)
+        self.version += 1
+        if market.latitude is not None and market.longitude is not None:
+            self._cells[_cell(market.latitude, market.longitude)].append(market)
+            self._bounds = None
+            self._coordinates = None
+
+    def remove(self, market_id: str) -> Optional[Supermarket]:
+        market = self.markets.pop(market_id, None)
+        self._categories.pop(market_id, None)
+        if market is not None:
+            self.version += 1
+        if market is not None and market.latitude is not None and market.longitude is not None:
+            cell = _cell(market.latitude, market.longitude)
+            self._cells[cell] = [other for other in self._cells[cell] if other.uuid != market_id]
+            if not self._cells[cell]:
+                del self._cells[cell]
+            self._bounds = None
+            self._coordinates = None
+        return market
+
+    def carries(self, market: Supermarket, category: Optional[str]) -> bool:
+        return not category or category in self._categories.get(market.uuid, ())
+
+    def _ring(self, center: Tuple[int, int], radius: int):
+        row, col = center
+        if radius == 0:
+            yield center
+            return
+        for d in range(-radius, radius + 1):
+            yield row - radius, col + d
+            yield row + radius, col + d
+        for d in range(-radius + 1, radius):
+            yield row + d, col - radius
+            yield row + d, col + radius
+
+    def nearest(self, latitude: float, longitude: float, k: int = 1, category: Optional[str] = None) -> List[Tuple[Supermarket, float]]:
+        """k nächste Märkte (optional nur solche, die die Kategorie führen)"""
+        if not self._cells:
+            return []
+        center = _cell(latitude, longitude)
+        # Kleinste Zellbreite in km (Längengrade werden zum Pol hin schmaler)
+        cell_km = CELL_DEGREES * KM_PER_DEGREE * max(0.01, math.cos(math.radians(min(89.0, abs(latitude) + CELL_DEGREES))))
+        if self._bounds is None:
+            rows = [row for row, _ in self._cells]
+            cols = [col for _, col in self._cells]
+            self._bounds = (min(rows), max(rows), min(cols), max(cols))
+        min_row, max_row, min_col, max_col = self._bounds
+        # Über den äußersten belegten Ring hinaus gibt es nichts mehr zu finden
+        max_radius = max(center[0] - min_row, max_row - center[0], center[1] - min_col, max_col - center[1])
+
+        # Ringweg begrenzen: (2r+1)^2 Zellen höchstens RING_CELL_FACTOR x belegte Zellen
+        ring_limit = int(math.sqrt(self.RING_CELL_FACTOR * len(self._cells))) // 2 + 1
+
+        found: List[Tuple[Supermarket, float]] = []
+        for radius in range(min(max_radius, ring_limit) + 1):
+            for cell in self._ring(center, radius):
+                for market in self._cells.get(cell, ()):
+                    if self.carries(market, category):
+                        found.append((market, haversine_km(latitude, longitude, market.latitude, market.longitude)))
+            # Alles außerhalb von Ring r ist mindestens r Zellbreiten entfernt
+            if len(found) >= k:
+                found.sort(key=lambda entry: entry[1])
+                if found[k - 1][1] <= radius * cell_km:
+                    return found[:k]
+        if max_radius > ring_limit:
+            return self._nearest_scan(latitude, longitude, k, category)
+        found.sort(key=lambda entry: entry[1])
+        return found[:k]
+
+    def _nearest_scan(self, latitude: float, longitude: float, k: int, category: Optional[str]) -> List[Tuple[Supermarket, float]]:
+        """Haversine über alle Märkte mit Koordinaten auf einmal (numpy)"""
+        if self._coordinates is None:
+            markets = [market for cell in self._cells.values() for market in cell]
+            coordinates = np.radians(np.array([(market.latitude, market.longitude) for market in markets], dtype=np.float64))
+            self._coordinates = (markets, coordinates)
+        markets, coordinates = self._coordinates
+
+        if category:
+            mask = np.fromiter((self.carries(market, category) for market in markets), dtype=bool, count=len(markets))
+            candidates = np.flatnonzero(mask)
+        else:
+            candidates = np.arange(len(markets))
+        if candidates.size == 0:
+            return []
+
+        phi1, lmb1 = math.radians(latitude), math.radians(longitude)
+        phi2, lmb2 = coordinates[candidates, 0], coordinates[candidates, 1]
+        a = np.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin((lmb2 - lmb1) / 2) ** 2
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+        order = np.argsort(distances)[:k]
+        return [(markets[candidates[index]], float(distances[index])) for index in order]
+
+    def within_radius(self, latitude: float, longitude: float, radius_km: float, category: Optional[str] = None) -> List[Tuple[Supermarket, float]]:
+        """Alle Märkte im Umkreis, nach Entfernung sortiert"""
+        lat_span = radius_km / KM_PER_DEGREE
+        lng_span = radius_km / (KM_PER_DEGREE * max(0.01, math.cos(math.radians(min(89.0, abs(latitude) + lat_span)))))
+        min_row, min_col = _cell(latitude - lat_span, longitude - lng_span)
+        max_row, max_col = _cell(latitude + lat_span, longitude + lng_span)
+
+        result = []
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                for market in self._cells.get((row, col), ()):
+                    if not self.carries(market, category):
+                        continue
+                    distance = haversine_km(latitude, longitude, market.latitude, market.longitude)
+                    if distance <= radius_km:
+                        result.append((market, distance))
+        result.sort(key=lambda entry: entry[1])
+        return result
+
+
+class SupermarketIndexService:
+    """Per-User Spatial Index über gespeicherte Supermärkte (lazy aus dem Repository geladen)"""
+
+    def __init__(self, max_users: int = 1000):
+        self.max_users = max_users
+        self._indexes: "OrderedDict[str, SpatialIndex]" = OrderedDict()
+        self._loaded_at: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _lock(self, user_email: str) -> asyncio.Lock:
+        lock = self._locks.get(user_email)
+        if lock is None:
+            lock = self._locks[user_email] = asyncio.Lock()
+        return lock
+
+    def _cached(self, user_email: str) -> Optional[SpatialIndex]:
+        index = self._indexes.get(user_email)
+        # Bei mehreren Workern können andere Prozesse Märkte angelegt haben
+        fresh = time.monotonic() - self._loaded_at.get(user_email, 0.0) < settings.PROFILE_CACHE_TTL
+        if index is not None and (fresh or settings.WEB_CONCURRENCY <= 1):
+            self._indexes.move_to_end(user_email)
+            return index
+        return None
+
+    async def get_index(self, user_email: str) -> SpatialIndex:
+        index = self._cached(user_email)
+        if index is not None:
+            return index
+
+        async with self._lock(user_email):
+            # Ein paralleler Request kann den Index inzwischen geladen haben
+            index = self._cached(user_email)
+            if index is not None:
+                return index
+
+            markets: List[Supermarket] = []
+            repository = get_repository()
+            if repository is not None:
+                try:
+                    cursor = None
+                    while True:
+                        page = await repository.supermarkets.list_for_user(user_email, page_size=200, cursor=cursor)
+                        markets.extend(page.items)
+                        cursor = page.next_cursor
+                        if cursor is None:
+                            break
+                except Exception as e:
+                    # Nicht cachen: sonst bliebe der User bis zum TTL ohne Märkte
+                    print(f"⚠️ Error loading supermarkets: {e}")
+                    previous = self._indexes.get(user_email)
+                    return previous if previous is not None else SpatialIndex()
+
+            index = SpatialIndex(markets)
+            self._indexes[user_email] = index
+            self._indexes.move_to_end(user_email)
+            self._loaded_at[user_email] = time.monotonic()
+            while len(self._indexes) > self.max_users:
+                evicted, _ = self._indexes.popitem(last=False)
+                self._loaded_at.pop(evicted, None)
+                self._locks.pop(evicted, None)
+            return index
+
+    async def register(self, market: Supermarket) -> Supermarket:
+        index = await self.get_index(market.user_email)
+        repository = get_repository()
+        if repository is not None:
+            await repository.supermarkets.save(market)
+        index.add(market)
+        return market
+
+    async def remove(self, user_email: str, market_id: str) -> bool:
+        index = await self.get_index(user_email)
+        repository = get_repository()
+        if repository is not None:
+            await repository.supermarkets.delete(market_id)
+        return index.remove(market_id) is not None
+
+    async def assign(self, user_email: str, latitude: float, longitude: float, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Jedem Item den nächsten Markt zuordnen, der seine Kategorie führt"""
+        index = await self.get_index(user_email)
+        await category_classifier.fill_categories(items)
+
+        # Eine Nearest-Query pro Kategorie statt pro Item
+        by_category: Dict[Optional[str], Optional[Tuple[Supermarket, float]]] = {}
+        for item in items:
+            category = item.get("category")
+            if category not in by_category:
+                match = index.nearest(latitude, longitude, 1, category)
+                by_category[category] = match[0] if match else None
+
+            match = by_category[category]
+            item["supermarkt"] = match[0].name if match else None
+            item["supermarket_id"] = match[0].uuid if match else None
+            item["distance_km"] = round(match[1], 3) if match else None
+        return items
+
+
+# Service Instanz
+supermarket_index_service = SupermarketIndexService()
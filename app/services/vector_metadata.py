@@ -0,0 +1,134 @@
+"""
+Kompaktes Metadaten-Schema für Pinecone.
+
+Alle Vektoren eines Users liegen in seinem Namespace, daher werden weder User
+noch UUID (= Vector-ID) in den Metadaten gespeichert. Keys sind kurz, Werte
+typisiert: Zeitstempel als Unix-Sekunden, Listen als echte String-Listen.
+"""
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Vektor-Typen (Key "t")
+TYPE_CODES = {"shopping_item": "i", "supermarket": "s", "recipe": "r"}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+# Langer Name -> kurzer Key
+KEYS = {
+    "type": "t",
+    "name": "n",
+    "category": "c",
+    "quantity": "q",
+    "estimated_price": "p",
+    "supermarket": "m",
+    "purchase_count": "pc",
+    "first_seen": "fs",
+    "last_seen": "ls",
+    "list_uuids": "l",
+    "placeId": "pid",
+    "address": "a",
+    "lat": "lat",
+    "lng": "lng",
+    "ingredients": "ing",
+}
+LONG_KEYS = {short: long for long, short in KEYS.items()}
+
+# Redundant zum Namespace bzw. zur Vector-ID
+DROPPED_KEYS = {"user", "user_email", "uuid"}
+
+# Feld-Aliase des alten Schemas (generate_shopping_list im Default Namespace)
+LEGACY_ALIASES = {"item_type": "type", "supermarkt": "supermarket"}
+
+
+def to_epoch(value: Any) -> Optional[int]:
+    """ISO-String, datetime oder Zahl -> Unix-Sekunden"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    try:
+        return int(datetime.fromisoformat(str(value)).timestamp())
+    except ValueError:
+        return None
+
+
+def _typed(key: str, value: Any) -> Any:
+    if key == "type":
+        return TYPE_CODES.get(value, value)
+    if key in ("first_seen", "last_seen"):
+        return to_epoch(value)
+    if key in ("quantity", "purchase_count"):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return str(value) if key == "quantity" and value is not None else None
+    if key in ("estimated_price", "lat", "lng"):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    if key == "ingredients" and isinstance(value, str):
+        # Altes Schema: JSON-String
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return [value]
+    if key in ("ingredients", "list_uuids"):
+        return [str(entry) for entry in value or []]
+    return value
+
+
+def compact_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Metadaten (alt oder neu, lange oder kurze Keys) ins kompakte Schema bringen"""
+    result: Dict[str, Any] = {}
+    for key, value in metadata.items():
+        key = LONG_KEYS.get(key, LEGACY_ALIASES.get(key, key))
+        if key in DROPPED_KEYS:
+            continue
+        value = _typed(key, value)
+        # Pinecone erlaubt keine null-Werte
+        if value is None:
+            continue
+        result[KEYS.get(key, key)] = value
+    return result
+
+
+def expand_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Kompakte Metadaten für Aufrufer wieder mit langen Keys"""
+    result = {LONG_KEYS.get(key, key): value for key, value in metadata.items()}
+    if "type" in result:
+        result["type"] = TYPE_NAMES.get(result["type"], result["type"])
+    return result
+
+
+def is_compact(metadata: Dict[str, Any]) -> bool:
+    return "t" in metadata and not any(key in metadata for key in DROPPED_KEYS | set(LEGACY_ALIASES) | {"type"})
+
+
+def type_filter(item_type: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Filter nur nach Typ - der User steckt bereits im Namespace"""
+    if not item_type:
+        return None
+    return {"t": TYPE_CODES.get(item_type, item_type)}
+
+
+def expand_matches(matches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{**match, "metadata": expand_metadata(match.get("metadata") or {})} for match in matches]
+
+
+def embedding_text(metadata: Dict[str, Any]) -> str:
+    """
+    Text, aus dem ein Vektor erzeugt wird - nur aus Metadaten, damit ein
+    Re-Embedding (app.jobs.reembed) genau denselben Text wiederherstellen kann.
+    """
+    metadata = compact_metadata(metadata)
+    parts = [metadata.get("n", "")]
+    if metadata.get("t") == TYPE_CODES["supermarket"]:
+        parts.append(metadata.get("a", ""))
+    else:
+        parts.append(metadata.get("c", ""))
+    if metadata.get("t") == TYPE_CODES["recipe"]:
+        parts.extend(metadata.get("ing", []))
+    return " ".join(part for part in parts if part).strip()
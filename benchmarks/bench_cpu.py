@@ -0,0 +1,144 @@
+"""
+CPU Micro-Benchmarks für Prompt-Aufbau und Response-Parsing über synthetische
+Listen (10 bis 5000 Items). Misst Zeit und Allokationen pro Stage und hängt die
+Ergebnisse an benchmarks/results/cpu.jsonl an (mit Git-Commit), damit
+Regressionen über Commits sichtbar werden.
+
+    python -m benchmarks.bench_cpu [--sizes 10,100,1000,5000] [--repeat 20] [--no-save]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from app.api.v1.chat import build_similar_context, format_list_text, parse_updated_list
+from app.api.v1.generate_shopping_list import build_shopping_items
+
+RESULTS_PATH = os.path.join(os.path.dirname(__file__), "results", "cpu.jsonl")
+PRODUCTS = ["Milch", "Brot", "Äpfel", "Bananen", "Käse", "Joghurt", "Nudeln", "Reis", "Tomaten", "Kaffee"]
+# Abweichung gegenüber dem letzten Lauf, ab der eine Regression gemeldet wird
+REGRESSION_THRESHOLD = 0.20
+
+
+def synthetic_items(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "uuid": f"item-{i}",
+            "name": f"{PRODUCTS[i % len(PRODUCTS)]} {i}",
+            "quantity": 1 + i % 4,
+            "note": "bio" if i % 7 == 0 else "",
+            "category": "Milchprodukte",
+            "isChecked": i % 3 == 0,
+            "supermarkt": "REWE",
+            "unit": "Stück",
+            "estimated_price": 1.49 + i % 5,
+            "supermarket": "REWE",
+        }
+        for i in range(count)
+    ]
+
+
+def stages(size: int) -> Dict[str, Callable[[], Any]]:
+    items = synthetic_items(size)
+    items_json = json.dumps(items, ensure_ascii=False)
+    similar_lists = [{"name": f"Liste {i}", "items": items_json, "supermarkets": "REWE, ALDI", "note": "Wocheneinkauf"} for i in range(3)]
+    ai_response = f"Ich habe die Liste aktualisiert:\n{items_json}\nViel Spaß beim Einkaufen!"
+
+    return {
+        "chat.format_list_text": lambda: format_list_text(items),
+        "chat.build_similar_context": lambda: build_similar_context(similar_lists),
+        "chat.parse_updated_list": lambda: parse_updated_list(ai_response),
+        "generate.build_shopping_items": lambda: build_shopping_items(items),
+    }
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    # Prints der Stages nicht mitmessen
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()  # Warmup
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1000)
+
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        fn()
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename") if stat.size_diff > 0)
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    return {
+        "median_ms": round(statistics.median(timings), 4),
+        "min_ms": round(min(timings), 4),
+        "peak_kib": round(peak / 1024, 1),
+        "retained_kib": round(allocated / 1024, 1),
+        "retained_blocks": blocks,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+def load_previous(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        lines = [line for line in f if line.strip()]
+    return json.loads(lines[-1]) if lines else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="CPU micro-benchmarks for prompt building and response parsing")
+    parser.add_argument("--sizes", default="10,100,1000,5000")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--results", default=RESULTS_PATH)
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for size in [int(size) for size in args.sizes.split(",")]:
+        for stage, fn in stages(size).items():
+            results.setdefault(stage, {})[str(size)] = measure(fn, args.repeat)
+
+    previous = load_previous(args.results)
+    print(f"{'stage':32} {'items':>6} {'median ms':>10} {'peak KiB':>9} {'blocks':>7} {'vs last':>8}")
+    for stage, by_size in results.items():
+        for size, r in by_size.items():
+            change = ""
+            last = (previous or {}).get("results", {}).get(stage, {}).get(size)
+            if last and last["median_ms"] > 0:
+                ratio = r["median_ms"] / last["median_ms"] - 1
+                change = f"{ratio:+.0%}" + (" ⚠️" if ratio > REGRESSION_THRESHOLD else "")
+            print(f"{stage:32} {size:>6} {r['median_ms']:10.3f} {r['peak_kib']:9.1f} {r['retained_blocks']:7} {change:>8}")
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(args.results), exist_ok=True)
+        with open(args.results, "a") as f:
+            f.write(json.dumps({
+                "commit": git_commit(),
+                "timestamp": datetime.now().isoformat(),
+                "python": platform.python_version(),
+                "results": results,
+            }) + "\n")
+        if previous:
+            print(f"📊 Compared against commit {previous['commit']} ({previous['timestamp']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Serialisierungs-Benchmark: CPU-Zeit und Bytes on the wire für typische Payloads.
+
+    python -m benchmarks.bench_serialization [--repeat 50]
+
+Vergleicht den bisherigen Pfad (jsonable_encoder + Starlette JSONResponse)
+mit FastJSONResponse und zeigt die Größe mit gzip/brotli Kompression.
+"""
+import argparse
+import gzip
+import random
+import time
+import uuid
+from typing import Any, Callable, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+from app.api.v1.chat import ShoppingItemResponse as ChatItem, ShoppingListChatResponse
+from app.api.v1.generate_shopping_list import (
+    GenerateShoppingListResponse,
+    ShoppingItemResponse,
+    ShoppingListResponse,
+)
+from app.core.compression import brotli
+from app.core.responses import FastJSONResponse
+
+PRODUCTS = ["Milch", "Brot", "Äpfel", "Bananen", "Käse", "Joghurt", "Nudeln", "Reis", "Tomaten", "Kaffee"]
+
+
+def embeddings_payload(count: int = 100, dimension: int = 1536) -> Dict[str, Any]:
+    rng = random.Random(1)
+    return {
+        "embeddings": [[rng.uniform(-0.1, 0.1) for _ in range(dimension)] for _ in range(count)],
+        "token_count": count * 8,
+        "count": count,
+    }
+
+
+def generate_payload(count: int = 25) -> GenerateShoppingListResponse:
+    items = [
+        ShoppingItemResponse(
+            uuid=str(uuid.uuid4()),
+            name=PRODUCTS[i % len(PRODUCTS)],
+            quantity=1 + i % 3,
+            category="Milchprodukte",
+            estimated_price=1.99,
+            supermarket="REWE",
+            note="",
+        )
+        for i in range(count)
+    ]
+    shopping_list = ShoppingListResponse(
+        uuid=str(uuid.uuid4()),
+        name="KI-Einkaufsliste",
+        created_at="2024-01-01T00:00:00",
+        items=items,
+        total_estimated_price=49.75,
+        supermarkets=["REWE"],
+        created_by="user@example.com",
+    )
+    return GenerateShoppingListResponse(shopping_list=shopping_list, success=True, message="ok")
+
+
+def chat_payload(count: int = 200) -> ShoppingListChatResponse:
+    items = [
+        ChatItem(uuid=str(uuid.uuid4()), name=PRODUCTS[i % len(PRODUCTS)], quantity=1, supermarkt="EDEKA")
+        for i in range(count)
+    ]
+    return ShoppingListChatResponse(response="Ich habe die Liste aktualisiert. " * 20, updated_list=items, action_performed="added")
+
+
+def baseline_render(content: Any) -> bytes:
+    """Bisheriger Pfad: jsonable_encoder + stdlib json"""
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def fast_render(content: Any) -> bytes:
+    return FastJSONResponse(content).body
+
+
+def measure(fn: Callable[[Any], bytes], content: Any, repeat: int) -> float:
+    fn(content)  # Warmup
+    start = time.process_time()
+    for _ in range(repeat):
+        fn(content)
+    return (time.process_time() - start) / repeat * 1000
+
+
+def run(repeat: int) -> List[Dict[str, Any]]:
+    payloads = {
+        "/embeddings/batch (100x1536)": embeddings_payload(),
+        "/generate-shopping-list (25 items)": generate_payload(),
+        "/shopping-list-chat (200 items)": chat_payload(),
+    }
+
+    results = []
+    for name, content in payloads.items():
+        body = fast_render(content)
+        result = {
+            "payload": name,
+            "baseline_ms": measure(baseline_render, content, repeat),
+            "fast_ms": measure(fast_render, content, repeat),
+            "raw_bytes": len(body),
+            "gzip_bytes": len(gzip.compress(body, compresslevel=6)),
+            "br_bytes": len(brotli.compress(body, quality=4)) if brotli is not None else None,
+        }
+        results.append(result)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark response serialization and compression")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'payload':38} {'baseline ms':>12} {'fast ms':>9} {'speedup':>8} {'raw B':>10} {'gzip B':>10} {'br B':>10}")
+    for r in run(args.repeat):
+        speedup = r["baseline_ms"] / r["fast_ms"] if r["fast_ms"] else float("inf")
+        br_bytes = r["br_bytes"] if r["br_bytes"] is not None else "-"
+        print(
+            f"{r['payload']:38} {r['baseline_ms']:12.3f} {r['fast_ms']:9.3f} {speedup:7.1f}x "
+            f"{r['raw_bytes']:10} {r['gzip_bytes']:10} {br_bytes:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
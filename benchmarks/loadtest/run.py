@@ -0,0 +1,222 @@
+"""
+Offline Lasttest: startet app.main:app gegen lokale OpenAI- und Pinecone-Stand-ins
+und misst Durchsatz sowie p50/p95/p99 pro Endpoint.
+
+    python -m benchmarks.loadtest.run --duration 30 --concurrency 20 \\
+        --mix chat=6,generate=2,embeddings=2 --openai-latency-ms 800 --openai-error-rate 0.01
+
+Es werden keine echten OpenAI- oder Pinecone-Requests gesendet.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+import httpx
+
+from benchmarks.loadtest.stubs import PRODUCTS
+
+USERS = [f"loadtest-{i}@example.com" for i in range(50)]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# --- Requests ---
+
+def chat_request(rng: random.Random) -> Tuple[str, Dict[str, Any]]:
+    size = rng.choice([5, 15, 40])
+    shopping_list = [
+        {"uuid": f"item-{i}", "name": PRODUCTS[i % len(PRODUCTS)], "quantity": 1, "supermarkt": "REWE", "isChecked": False}
+        for i in range(size)
+    ]
+    return "/api/v1/shopping-list-chat", {
+        "message": rng.choice(["Füge Milch hinzu", "Was fehlt noch für Pfannkuchen?", "Entferne die Bananen"]),
+        "shopping_list": shopping_list,
+        "chat_history": [{"role": "user", "content": "Hallo"}, {"role": "assistant", "content": "Hallo! Wie kann ich helfen?"}],
+        "user_email": rng.choice(USERS),
+        "similar_lists": [{"name": "Wocheneinkauf", "items": json.dumps([{"name": "Brot", "quantity": 1}])}],
+    }
+
+
+def generate_request(rng: random.Random) -> Tuple[str, Dict[str, Any]]:
+    return "/api/v1/generate-shopping-list", {
+        "settings": {"personen": rng.choice([1, 2, 4]), "tage": 7, "ernaehrung": rng.choice(["vegetarisch", "alles"])},
+        "user_email": rng.choice(USERS),
+        "context": "Wocheneinkauf",
+    }
+
+
+def embeddings_request(rng: random.Random) -> Tuple[str, List[str]]:
+    return "/api/ai/embeddings/batch", [f"{rng.choice(PRODUCTS)} {i}" for i in range(rng.choice([10, 50, 100]))]
+
+
+REQUEST_BUILDERS = {"chat": chat_request, "generate": generate_request, "embeddings": embeddings_request}
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in REQUEST_BUILDERS:
+            raise SystemExit(f"Unknown endpoint in mix: {name}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+async def drive(base_url: str, duration: float, concurrency: int, weights: Dict[str, float], seed: int) -> Dict[str, Dict[str, Any]]:
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    names = list(weights)
+    deadline = time.perf_counter() + duration
+
+    async def worker(worker_id: int, client: httpx.AsyncClient):
+        rng = random.Random(seed + worker_id)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights=[weights[n] for n in names])[0]
+            path, payload = REQUEST_BUILDERS[name](rng)
+            started = time.perf_counter()
+            try:
+                response = await client.post(path, json=payload)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies[name].append((time.perf_counter() - started) * 1000)
+            if not ok:
+                errors[name] += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i, client) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        name: {
+            "requests": len(values),
+            "errors": errors[name],
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(percentile(values, 0.50), 1),
+            "p95_ms": round(percentile(values, 0.95), 1),
+            "p99_ms": round(percentile(values, 0.99), 1),
+        }
+        for name, values in latencies.items()
+    }
+
+
+def start_stubs(openai_port: int, pinecone_port: int, args: argparse.Namespace, log_file) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "benchmarks.loadtest.stubs",
+        "--openai-port", str(openai_port),
+        "--pinecone-port", str(pinecone_port),
+        "--openai-latency-ms", str(args.openai_latency_ms),
+        "--embedding-latency-ms", str(args.embedding_latency_ms),
+        "--openai-error-rate", str(args.openai_error_rate),
+        "--pinecone-latency-ms", str(args.pinecone_latency_ms),
+        "--pinecone-error-rate", str(args.pinecone_error_rate),
+    ]
+    return subprocess.Popen(command, stdout=log_file, stderr=subprocess.STDOUT)
+
+
+def boot_app(port: int, openai_url: str, pinecone_url: str, args: argparse.Namespace, log_file) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="stub",
+        OPENAI_BASE_URL=openai_url,
+        PINECONE_API_KEY="stub",
+        PINECONE_API_URL=pinecone_url,
+        DATABASE_BACKEND="sqlite",
+        SQLITE_PATH=os.path.join(tempfile.mkdtemp(prefix="shoppiq-loadtest-"), "loadtest.db"),
+        OPENAI_TPM_LIMIT=str(args.tpm_limit),
+        OPENAI_RPM_LIMIT=str(args.rpm_limit),
+    )
+    if args.app_workers > 1:
+        # Multi-Worker Modus wie in Produktion (preload + post_fork)
+        env.update(PORT=str(port), WEB_CONCURRENCY=str(args.app_workers), SHARED_CACHE_PATH=os.path.join(os.path.dirname(env["SQLITE_PATH"]), "cache.db"))
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}", "app.main:app"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    return subprocess.Popen(command, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+
+def wait_until_up(url: str, timeout: float = 30) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"{url} did not come up - see the app log")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline load test against local OpenAI/Pinecone stand-ins")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--mix", default="chat=6,generate=2,embeddings=2")
+    parser.add_argument("--openai-latency-ms", type=float, default=800)
+    parser.add_argument("--embedding-latency-ms", type=float, default=100)
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--pinecone-latency-ms", type=float, default=30)
+    parser.add_argument("--pinecone-error-rate", type=float, default=0.0)
+    parser.add_argument("--app-workers", type=int, default=1, help=">1 startet gunicorn mit N Workern")
+    parser.add_argument("--tpm-limit", type=int, default=10_000_000)
+    parser.add_argument("--rpm-limit", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--app-log", default=os.path.join(tempfile.gettempdir(), "shoppiq-loadtest-app.log"))
+    parser.add_argument("--json", help="Ergebnisse zusätzlich als JSON schreiben")
+    args = parser.parse_args()
+
+    openai_port, pinecone_port, app_port = free_port(), free_port(), free_port()
+    base_url = f"http://127.0.0.1:{app_port}"
+    processes: List[subprocess.Popen] = []
+
+    with open(args.app_log, "w") as log_file:
+        try:
+            processes.append(start_stubs(openai_port, pinecone_port, args, log_file))
+            wait_until_up(f"http://127.0.0.1:{openai_port}/docs")
+            wait_until_up(f"http://127.0.0.1:{pinecone_port}/docs")
+            processes.append(boot_app(app_port, f"http://127.0.0.1:{openai_port}/v1", f"http://127.0.0.1:{pinecone_port}", args, log_file))
+            wait_until_up(f"{base_url}/health")
+
+            print(f"🚀 Driving {args.mix} for {args.duration}s with {args.concurrency} concurrent clients")
+            results = asyncio.run(drive(base_url, args.duration, args.concurrency, parse_mix(args.mix), args.seed))
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    print(f"{'endpoint':12} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, r in sorted(results.items()):
+        print(f"{name:12} {r['requests']:9} {r['errors']:7} {r['throughput_rps']:8} {r['p50_ms']:9} {r['p95_ms']:9} {r['p99_ms']:9}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
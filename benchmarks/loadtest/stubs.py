@@ -0,0 +1,262 @@
+"""
+Lokale Stand-ins für die OpenAI API (Chat + Embeddings) und die Pinecone
+REST API (/query, /vectors/upsert, /vectors/delete, /vectors/fetch) mit
+konfigurierbarer Latenz und Fehlerrate.
+
+Laufen in einem eigenen Prozess, damit sie dem Load-Driver keine CPU wegnehmen:
+
+    python -m benchmarks.loadtest.stubs --openai-port 9001 --pinecone-port 9002
+"""
+import argparse
+import asyncio
+import base64
+import functools
+import hashlib
+import json
+import random
+import struct
+import time
+import uuid
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.core.responses import FastJSONResponse
+
+EMBEDDING_DIMENSION = 1536
+PRODUCTS = ["Milch", "Brot", "Äpfel", "Bananen", "Käse", "Joghurt", "Nudeln", "Reis", "Tomaten", "Kaffee",
+            "Butter", "Eier", "Hähnchen", "Salat", "Gurke", "Mineralwasser", "Spülmittel", "Müsli"]
+
+
+class Faults:
+    """Latenz (lognormal um latency_ms) und zufällige Fehler"""
+
+    def __init__(self, latency_ms: float, error_rate: float, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+    async def apply(self):
+        if self.latency_ms > 0:
+            await asyncio.sleep(self.latency_ms * self.random.lognormvariate(0, 0.35) / 1000)
+        if self.error_rate > 0 and self.random.random() < self.error_rate:
+            status = self.random.choice([429, 500, 503])
+            return JSONResponse({"error": {"message": "stub failure", "type": "server_error"}}, status_code=status)
+        return None
+
+
+@functools.lru_cache(maxsize=4096)
+def _embedding(text: str) -> List[float]:
+    seed = int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    return [rng.uniform(-0.05, 0.05) for _ in range(EMBEDDING_DIMENSION)]
+
+
+@functools.lru_cache(maxsize=4096)
+def _embedding_base64(text: str) -> str:
+    """encoding_format=base64: little-endian float32 wie bei OpenAI"""
+    values = _embedding(text)
+    return base64.b64encode(struct.pack(f"<{len(values)}f", *values)).decode("ascii")
+
+
+def _shopping_items(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "name": PRODUCTS[i % len(PRODUCTS)],
+            "quantity": 1 + i % 3,
+            "unit": "Stück",
+            "category": "Sonstiges",
+            "estimated_price": 1.99,
+            "supermarket": "REWE",
+            "supermarkt": "REWE",
+            "note": "",
+            "uuid": str(uuid.uuid4()),
+        }
+        for i in range(count)
+    ]
+
+
+def create_openai_stub(latency_ms: float = 800, error_rate: float = 0.0, embedding_latency_ms: float = 100) -> FastAPI:
+    app = FastAPI(default_response_class=FastJSONResponse)
+    chat_faults = Faults(latency_ms, error_rate, seed=1)
+    embedding_faults = Faults(embedding_latency_ms, error_rate, seed=2)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        failure = await chat_faults.apply()
+        if failure:
+            return failure
+        body = await request.json()
+        prompt = " ".join(message.get("content", "") for message in body.get("messages", []))
+
+        if "JSON-Array" in prompt:
+            content = json.dumps(_shopping_items(20), ensure_ascii=False)
+        elif "AKTUELLE EINKAUFSLISTE" in prompt:
+            content = "Ich habe Milch hinzugefügt.\n" + json.dumps(_shopping_items(prompt.count("\n- ") + 1), ensure_ascii=False)
+        else:
+            content = "- 🥛 Milch nicht vergessen\n- 🍝 Nudeln mit Tomatensauce"
+
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        failure = await embedding_faults.apply()
+        if failure:
+            return failure
+        body = await request.json()
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        tokens = sum(len(text) // 4 + 1 for text in texts)
+        encode = _embedding_base64 if body.get("encoding_format") == "base64" else _embedding
+        return FastJSONResponse({
+            "object": "list",
+            "data": [{"object": "embedding", "index": i, "embedding": encode(text)} for i, text in enumerate(texts)],
+            "model": body.get("model"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    return app
+
+
+def _matches(metadata: Dict[str, Any], filter_dict: Dict[str, Any]) -> bool:
+    for key, condition in (filter_dict or {}).items():
+        if isinstance(condition, dict):
+            for operator, value in condition.items():
+                if operator == "$exists" and (key in metadata) != value:
+                    return False
+                if operator == "$eq" and metadata.get(key) != value:
+                    return False
+                if operator == "$ne" and metadata.get(key) == value:
+                    return False
+                if operator == "$in" and metadata.get(key) not in value:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def create_pinecone_stub(latency_ms: float = 30, error_rate: float = 0.0) -> FastAPI:
+    app = FastAPI(default_response_class=FastJSONResponse)
+    faults = Faults(latency_ms, error_rate, seed=3)
+    namespaces: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    @app.post("/query")
+    async def query(request: Request):
+        failure = await faults.apply()
+        if failure:
+            return failure
+        body = await request.json()
+        vectors = namespaces.get(body.get("namespace", ""), {})
+        matches = []
+        for vector in vectors.values():
+            if _matches(vector.get("metadata", {}), body.get("filter")):
+                match = {"id": vector["id"], "score": 0.5, "metadata": vector.get("metadata", {})}
+                if body.get("includeValues"):
+                    match["values"] = vector["values"]
+                matches.append(match)
+                if len(matches) >= body.get("topK", 10):
+                    break
+        return FastJSONResponse({"matches": matches, "namespace": body.get("namespace", "")})
+
+    @app.post("/vectors/upsert")
+    async def upsert(request: Request):
+        failure = await faults.apply()
+        if failure:
+            return failure
+        body = await request.json()
+        store = namespaces.setdefault(body.get("namespace", ""), {})
+        for vector in body["vectors"]:
+            store[vector["id"]] = vector
+        return {"upsertedCount": len(body["vectors"])}
+
+    @app.post("/vectors/delete")
+    async def delete(request: Request):
+        failure = await faults.apply()
+        if failure:
+            return failure
+        body = await request.json()
+        store = namespaces.get(body.get("namespace", ""), {})
+        for vector_id in body.get("ids", []):
+            store.pop(vector_id, None)
+        return {}
+
+    @app.get("/vectors/fetch")
+    async def fetch(request: Request):
+        failure = await faults.apply()
+        if failure:
+            return failure
+        namespace = request.query_params.get("namespace", "")
+        store = namespaces.get(namespace, {})
+        ids = request.query_params.getlist("ids")
+        # Direkt rendern - jsonable_encoder über 1536 Floats pro Vektor wäre der Flaschenhals
+        return FastJSONResponse({"vectors": {vector_id: store[vector_id] for vector_id in ids if vector_id in store}, "namespace": namespace})
+
+    @app.get("/vectors/list")
+    async def list_ids(request: Request):
+        failure = await faults.apply()
+        if failure:
+            return failure
+        namespace = request.query_params.get("namespace", "")
+        ids = sorted(namespaces.get(namespace, {}))
+        limit = int(request.query_params.get("limit", 100))
+        start = int(request.query_params.get("paginationToken") or 0)
+        page = ids[start:start + limit]
+        result = {"vectors": [{"id": vector_id} for vector_id in page], "namespace": namespace}
+        if start + limit < len(ids):
+            result["pagination"] = {"next": str(start + limit)}
+        return result
+
+    @app.post("/describe_index_stats")
+    async def describe_index_stats():
+        return {
+            "namespaces": {name: {"vectorCount": len(store)} for name, store in namespaces.items()},
+            "dimension": EMBEDDING_DIMENSION,
+            "totalVectorCount": sum(len(store) for store in namespaces.values()),
+        }
+
+    return app
+
+
+async def serve(args: argparse.Namespace) -> None:
+    servers = [
+        uvicorn.Server(uvicorn.Config(
+            create_openai_stub(args.openai_latency_ms, args.openai_error_rate, args.embedding_latency_ms),
+            host="127.0.0.1", port=args.openai_port, log_level="warning",
+        )),
+        uvicorn.Server(uvicorn.Config(
+            create_pinecone_stub(args.pinecone_latency_ms, args.pinecone_error_rate),
+            host="127.0.0.1", port=args.pinecone_port, log_level="warning",
+        )),
+    ]
+    # uvicorn installiert den Signal-Handler nur für einen Server - bei SIGTERM alle beenden
+    tasks = [asyncio.create_task(server.serve()) for server in servers]
+    await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for server in servers:
+        server.should_exit = True
+    await asyncio.gather(*tasks)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local OpenAI and Pinecone stand-in servers")
+    parser.add_argument("--openai-port", type=int, required=True)
+    parser.add_argument("--pinecone-port", type=int, required=True)
+    parser.add_argument("--openai-latency-ms", type=float, default=800)
+    parser.add_argument("--embedding-latency-ms", type=float, default=100)
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--pinecone-latency-ms", type=float, default=30)
+    parser.add_argument("--pinecone-error-rate", type=float, default=0.0)
+    asyncio.run(serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
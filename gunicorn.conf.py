@@ -0,0 +1,21 @@
+# Multi-Worker Betrieb: gunicorn -c gunicorn.conf.py app.main:app
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+keepalive = 5
+
+# App einmal im Master laden, Worker teilen sich den importierten Code (Copy-on-Write)
+preload_app = True
+
+# Settings lesen WEB_CONCURRENCY beim Import (z.B. Aufteilung der OpenAI-Limits)
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+
+def post_fork(server, worker):
+    # Clients, Caches und Firebase pro Worker neu initialisieren
+    from app.core.workers import reset_after_fork
+    reset_after_fork()